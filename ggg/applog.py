@@ -0,0 +1,146 @@
+"""Журнал приложения: уровни, записи ключ=значение и запись в фоновом потоке
+
+Модули получают журнал через get_logger и пишут сообщение с полями:
+
+    log.info("Загружен каталог", books=len(books), ms=12.5)
+
+Запись в консоль и файл выполняет отдельный поток (QueueHandler и
+QueueListener): вызов в потоке интерфейса только кладёт запись в
+очередь, поля превращаются в текст уже в фоновом потоке. Отладочные
+записи по умолчанию выключены, и выключенный уровень стоит одной
+проверки.
+"""
+import copy
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+ROOT_LOGGER = "library"
+
+FORMAT = "%(asctime)s.%(msecs)03d %(levelname)-7s %(name)s: %(message)s"
+DATE_FORMAT = "%H:%M:%S"
+
+_listener = None
+_exception_formatter = logging.Formatter()
+
+
+class FieldsAdapter(logging.LoggerAdapter):
+    """Журнал, принимающий поля записи именованными аргументами"""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs)
+                  if key not in ('exc_info', 'stack_info', 'stacklevel', 'extra')}
+        kwargs['extra'] = {'fields': fields}
+        return msg, kwargs
+
+
+class FieldsFormatter(logging.Formatter):
+    """Сообщение и поля записи в виде ключ=значение"""
+
+    def format(self, record):
+        record.message = record.getMessage()
+        record.asctime = self.formatTime(record, self.datefmt)
+        text = self.formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += " " + " ".join(f"{key}={format_value(value)}" for key, value in fields.items())
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            text += "\n" + record.exc_text
+        return text
+
+
+class FieldsQueueHandler(QueueHandler):
+    """Передача записи в очередь без форматирования полей
+
+    В потоке, где сделана запись, только подставляются аргументы
+    сообщения и текст исключения (traceback нельзя передать в другой
+    поток), остальное форматирует поток записи.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def format_value(value):
+    """Значение поля: строки с пробелами и пустые - в кавычках"""
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    if isinstance(value, BaseException):
+        value = str(value) or type(value).__name__
+    text = str(value)
+    if not text or any(char.isspace() for char in text) or '=' in text:
+        return repr(text)
+    return text
+
+
+def start_queue(logger, *handlers):
+    """Запись журнала logger обработчиками handlers в фоновом потоке
+
+    Возвращает запущенный QueueListener; остановить его - shutdown_queue.
+    """
+    records = queue.SimpleQueue()
+    logger.addHandler(FieldsQueueHandler(records))
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def shutdown_queue(listener):
+    """Запись оставшихся в очереди записей, остановка потока и закрытие обработчиков"""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def get_logger(name):
+    """Журнал модуля name (дочерний для журнала приложения)"""
+    return FieldsAdapter(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+def setup_logging(level="INFO", path=None, max_bytes=1024 * 1024, backups=3, console=True):
+    """Настройка журнала приложения (повторный вызов заменяет прежнюю)
+
+    path - файл журнала с ротацией (None - только консоль).
+    """
+    global _listener
+    shutdown_logging()
+
+    formatter = FieldsFormatter(FORMAT, DATE_FORMAT)
+    handlers = []
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    if path:
+        try:
+            handlers.append(RotatingFileHandler(path, maxBytes=int(max_bytes),
+                                                backupCount=int(backups), encoding='utf-8'))
+        except OSError as e:
+            print(f"Не удалось открыть файл журнала {path}: {e}", file=sys.stderr)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    level = logging.getLevelName(str(level).strip().upper())
+    logger.setLevel(level if isinstance(level, int) else logging.INFO)
+    logger.propagate = False
+
+    _listener = start_queue(logger, *handlers)
+
+
+def shutdown_logging():
+    """Запись оставшихся в очереди записей и остановка фонового потока"""
+    global _listener
+    if _listener is not None:
+        shutdown_queue(_listener)
+        _listener = None
@@ -0,0 +1,135 @@
+"""Фоновое выполнение запросов к БД, чтобы главный цикл Tk не блокировался"""
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from applog import get_logger
+
+
+log = get_logger("background")
+
+
+class BackgroundTask:
+    """Фоновая задача; результат отменённой задачи в интерфейс не передаётся"""
+
+    def __init__(self, key=None):
+        self.key = key
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        """Отмена задачи; True, если задача ещё не запускалась и уже не запустится"""
+        self.cancelled = True
+        return self.future is not None and self.future.cancel()
+
+
+class BackgroundExecutor:
+    """Пул рабочих потоков и очередь результатов, которую разбирает root.after
+
+    Функции выполняются в рабочих потоках и не должны обращаться к виджетам.
+    Обработчики результата (on_done/on_error) вызываются в главном потоке Tk.
+    Новая задача с тем же ключом key отменяет предыдущую, ещё не завершённую.
+    """
+
+    def __init__(self, root, max_workers=4, poll_interval=20):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._results = queue.Queue()
+        self._current = {}
+        self._pending = 0
+        self._poll_id = None
+
+    def submit(self, func, *args, on_done=None, on_error=None, key=None, **kwargs):
+        """Запуск func(*args, **kwargs) в фоне; возвращает BackgroundTask"""
+        task = BackgroundTask(key)
+        if key is not None:
+            previous = self._current.get(key)
+            if previous is not None:
+                self._cancel_task(previous)
+            self._current[key] = task
+
+        task.future = self._executor.submit(self._run, task, func, args, kwargs, on_done, on_error)
+        self._pending += 1
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+        return task
+
+    def post(self, callback, value=None):
+        """Передача промежуточного результата (например, прогресса) из рабочего
+        потока: callback(value) будет вызван в главном потоке Tk"""
+        self._results.put((None, callback, value))
+
+    def cancel(self, key):
+        """Отмена текущей задачи с заданным ключом"""
+        task = self._current.pop(key, None)
+        if task is not None:
+            self._cancel_task(task)
+
+    def is_busy(self, key=None):
+        """Есть ли незавершённые задачи (с заданным ключом или любые)"""
+        if key is None:
+            return self._pending > 0
+        return key in self._current
+
+    def shutdown(self):
+        """Остановка пула: задачи из очереди отменяются, ожидания нет"""
+        for task in self._current.values():
+            task.cancel()
+        self._current.clear()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel_task(self, task):
+        """Отмена задачи с учётом того, что не запущенная задача не даст результата"""
+        if task.cancel():
+            self._pending -= 1
+
+    def _run(self, task, func, args, kwargs, on_done, on_error):
+        """Выполнение в рабочем потоке; результат кладётся в очередь"""
+        if task.cancelled:
+            self._results.put((task, None, None))
+            return
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._results.put((task, on_error, e))
+        else:
+            self._results.put((task, on_done, result))
+
+    def _poll(self):
+        """Разбор очереди результатов в главном потоке Tk"""
+        self._poll_id = None
+        while True:
+            try:
+                task, callback, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if task is None:
+                # Промежуточный результат выполняющейся задачи
+                self._call(callback, value)
+                continue
+
+            self._pending -= 1
+            if task.key is not None and self._current.get(task.key) is task:
+                del self._current[task.key]
+            if task.cancelled:
+                continue
+
+            if callback is not None:
+                self._call(callback, value)
+            elif isinstance(value, Exception):
+                log.error("Ошибка в фоновой задаче", error=value)
+
+        # Опрашиваем очередь, только пока есть незавершённые задачи
+        if self._pending > 0 and self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def _call(self, callback, value):
+        """Вызов обработчика; его ошибка не должна останавливать разбор очереди"""
+        try:
+            callback(value)
+        except Exception as e:
+            log.exception("Ошибка в обработчике фоновой задачи", error=e)
@@ -0,0 +1,103 @@
+"""Бенчмарк импорта: запись за записью против пакетного LibraryStorage.import_books
+
+Запуск:
+    python bench_import.py [--engines sqlite,mysql] [--count 5000]
+                           [--batch-size 500] [--database library_bench]
+
+Для каждого движка записи добавляются в пустое хранилище дважды:
+по одной (insert_book, транзакция на запись, как было до пакетного
+импорта) и пачками (import_books, как импорт из файла в приложении).
+Хранилища открываются так же, как в bench_suite.py: SQLite - во
+временном файле, MySQL - в отдельной базе из db_config.ini, каталог
+библиотеки не меняется. Если сервер MySQL недоступен, его замер
+пропускается.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from mysql.connector import Error
+
+from bench_suite import open_bench_storage
+from storage import STORAGE_ENGINES
+
+
+def make_books(count):
+    """Записи в формате файла импорта"""
+    return [
+        {
+            'title': f"Книга {i}", 'author': f"Автор {i % 500}", 'year': 1950 + i % 75,
+            'genre': f"Жанр {i % 20}", 'publisher': f"Издательство {i % 40}",
+            'isbn': f"978{i:010d}", 'quantity': 1 + i % 5,
+            'rack': f"A{chr(65 + i % 6)}", 'shelf': str(1 + i % 20)
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def insert_one_by_one(storage, books):
+    """Прежний способ: insert_book, отдельная транзакция на каждую запись"""
+    for book in books:
+        storage.insert_book(book)
+    return len(books)
+
+
+def import_batched(storage, books, batch_size):
+    """Новый способ: import_books, многострочный INSERT и коммит на пачку"""
+    return storage.import_books(books, batch_size=batch_size).added
+
+
+def measure(engine, name, func, count):
+    start = time.perf_counter()
+    added = func()
+    elapsed = time.perf_counter() - start
+    if added != count:
+        print(f"{engine}: {name}: добавлено {added} из {count}")
+    print(f"{engine:<8} {name:<36} {elapsed:8.2f} с {count / elapsed:12,.0f} записей/с")
+    return elapsed
+
+
+def run_engine(args, workdir, engine, books):
+    """Оба способа на одном движке; каждый - в пустом хранилище"""
+    args.engine = engine
+    timings = []
+    for name, func in (
+        ("до: insert_book на запись", insert_one_by_one),
+        ("после: import_books пачками", lambda storage, books: import_batched(storage, books, args.batch_size)),
+    ):
+        storage = open_bench_storage(args, workdir, f"{len(books)}_{len(timings)}")
+        try:
+            timings.append(measure(engine, name, lambda: func(storage, books), len(books)))
+        finally:
+            storage.close()
+    print(f"{engine:<8} ускорение: {timings[0] / timings[1]:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пакетного импорта")
+    parser.add_argument('--engines', default=",".join(STORAGE_ENGINES), help="движки через запятую")
+    parser.add_argument('--count', type=int, default=5000, help="число записей")
+    parser.add_argument('--batch-size', type=int, default=500, help="размер пачки импорта")
+    parser.add_argument('--config', default="db_config.ini")
+    parser.add_argument('--database', default="library_bench", help="база MySQL для замеров")
+    args = parser.parse_args()
+
+    books = make_books(args.count)
+    print(f"Записей: {args.count}, размер пачки: {args.batch_size}")
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    try:
+        for engine in args.engines.split(","):
+            engine = engine.strip()
+            if engine not in STORAGE_ENGINES:
+                parser.error(f"неизвестный движок: {engine}")
+            try:
+                run_engine(args, workdir, engine, books)
+            except Error as e:
+                print(f"{engine:<8} замер пропущен: {e}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Микробенчмарк материализации строк: старый цикл по словарям против rows.py
+
+Запуск: python bench_rows.py [число строк]
+
+Строки генерируются в памяти в том виде, в каком их отдаёт курсор
+(словари для старого способа, кортежи для нового), так что измеряется
+только преобразование, без сети и сервера БД.
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from mysql.connector import FieldType
+
+from rows import materialize_rows
+
+
+DESCRIPTION = [
+    ('id', FieldType.LONG), ('title', FieldType.VAR_STRING), ('author', FieldType.VAR_STRING),
+    ('year', FieldType.LONG), ('genre', FieldType.VAR_STRING), ('publisher', FieldType.VAR_STRING),
+    ('isbn', FieldType.VAR_STRING), ('quantity', FieldType.LONG), ('rack', FieldType.VAR_STRING),
+    ('shelf', FieldType.VAR_STRING), ('created_at', FieldType.TIMESTAMP),
+    ('updated_at', FieldType.TIMESTAMP)
+]
+
+# Колонки, которые показывает таблица каталога
+DISPLAYED = ('title', 'author', 'year', 'genre', 'publisher', 'isbn', 'quantity', 'rack', 'shelf')
+
+# Сколько строк видно в окне таблицы одновременно
+VISIBLE_ROWS = 30
+
+
+def make_rows(count):
+    """Кортежи значений, похожие на строки таблицы books"""
+    created = datetime(2024, 1, 1)
+    return [
+        (i, f"Книга {i}", f"Автор {i % 500}", 1950 + i % 75, f"Жанр {i % 20}",
+         f"Издательство {i % 40}", f"978{i:010d}", 1 + i % 5, f"A{chr(65 + i % 6)}",
+         str(1 + i % 20), created + timedelta(minutes=i), created + timedelta(minutes=i))
+        for i in range(1, count + 1)
+    ]
+
+
+def old_convert(books):
+    """Прежний способ: словарь на строку, hasattr и str для каждой ячейки"""
+    result = []
+    for book in books:
+        book_dict = {}
+        for key, value in book.items():
+            if key == 'id':
+                book_dict[key] = value
+            elif hasattr(value, 'isoformat'):
+                book_dict[key] = value.isoformat()
+            else:
+                book_dict[key] = str(value) if value is not None else ""
+        result.append(book_dict)
+    return result
+
+
+def measure(name, func, count, repeat=3):
+    """Лучшее время из repeat запусков и скорость в строках в секунду"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<48} {best * 1000:9.1f} мс {count / best:14,.0f} строк/с")
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    columns = [column[0] for column in DESCRIPTION]
+    tuples = make_rows(count)
+    dicts = [dict(zip(columns, values)) for values in tuples]
+    print(f"Строк: {count}")
+
+    def before_visible():
+        rows = old_convert(dicts)
+        return [[row[column] for column in DISPLAYED] for row in rows[:VISIBLE_ROWS]]
+
+    def after_visible():
+        rows = materialize_rows(DESCRIPTION, tuples)
+        return [[row[column] for column in DISPLAYED] for row in rows[:VISIBLE_ROWS]]
+
+    def after_all_cells():
+        rows = materialize_rows(DESCRIPTION, tuples)
+        return [[row[column] for column in DISPLAYED] for row in rows]
+
+    before = measure("до: словари + преобразование всех ячеек", lambda: old_convert(dicts), count)
+    after = measure("после: материализация BookRow", lambda: materialize_rows(DESCRIPTION, tuples), count)
+    measure(f"до: + чтение {VISIBLE_ROWS} видимых строк", before_visible, count)
+    measure(f"после: + чтение {VISIBLE_ROWS} видимых строк", after_visible, count)
+    measure("после: + чтение всех видимых колонок всех строк", after_all_cells, count)
+    print(f"Ускорение материализации: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Набор бенчмарков каталога на синтетических данных разного размера
+
+Запуск:
+    python bench_suite.py [--engine sqlite|mysql] [--sizes 10000,100000]
+                          [--repeat 3] [--report bench_report.json]
+                          [--baseline старый_отчёт.json] [--threshold 0.2]
+
+Для каждого размера каталог заполняется генератором synthetic.py (через
+импорт из файла NDJSON, как в import_data), а затем замеряются операции,
+которые выполняет приложение: загрузка каталога (load_data_from_db),
+фильтры в БД и в колоночном индексе (apply_combined_filter), поиск,
+фасеты, добавление, изменение и удаление книг (delete_from_db), экспорт.
+
+SQLite работает во временном файле. Для MySQL нужен сервер из
+db_config.ini; замеры идут в отдельной базе (--database, по умолчанию
+library_bench), её таблицы пересоздаются, каталог библиотеки не
+меняется.
+
+Отчёт - JSON: для каждого размера и сценария лучшее из repeat времён
+(операции записи - один прогон), число обработанных книг и скорость.
+С --baseline сценарии, ставшие медленнее больше чем на threshold,
+печатаются, а код возврата - 1.
+"""
+import argparse
+import configparser
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from catalog_index import CatalogIndex
+from facets import FacetCache
+from json_stream import iter_json_records, write_json_records
+from storage import DEFAULT_POOL_CONFIG, MySQLStorage, load_section, STORAGE_ENGINES
+from sqlite_storage import SQLiteStorage
+from synthetic import DEFAULT_SEED_FILE, SeedProfile, generate_books, load_seed
+from text_index import TextIndex
+
+
+# Число одиночных операций записи в сценариях insert/update/delete
+WRITE_OPERATIONS = 200
+
+# Служебные колонки, которые не попадают в экспорт
+EXPORT_EXCLUDED = ('created_at', 'updated_at', 'isbn13')
+
+# Критерии фильтров: один фасет, два фасета, фасет и год
+FILTER_CASES = {
+    'filter_genre': ('genre',),
+    'filter_genre_rack': ('genre', 'rack'),
+    'filter_author_year': ('author', 'year'),
+}
+
+
+class Report:
+    """Результаты замеров и их запись в JSON"""
+
+    def __init__(self, engine, seed_file):
+        self.meta = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'engine': engine,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed_file': os.path.basename(seed_file),
+        }
+        self.results = []
+
+    def add(self, size, scenario, seconds, items):
+        rate = items / seconds if seconds > 0 else None
+        self.results.append({'size': size, 'scenario': scenario, 'seconds': round(seconds, 6),
+                             'items': items, 'rate': round(rate, 1) if rate else None})
+        print(f"{size:>9,} {scenario:<24} {seconds * 1000:10.1f} мс {items:>9,} {rate or 0:14,.0f} /с")
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(dict(self.meta, results=self.results), file, ensure_ascii=False, indent=2)
+
+
+def best_time(func, repeat):
+    """Лучшее время из repeat запусков и результат последнего"""
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def open_bench_storage(args, workdir, size):
+    """Пустое хранилище для замеров"""
+    if args.engine == 'sqlite':
+        storage = SQLiteStorage(os.path.join(workdir, f"bench_{size}.db"))
+        storage.init_schema()
+        return storage
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    db_config = dict(config['database'])
+    if args.database == db_config.get('database'):
+        raise SystemExit("База для замеров совпадает с базой каталога, укажите другую (--database)")
+    db_config['port'] = int(db_config.get('port', 3306))
+    server = {key: value for key, value in db_config.items() if key != 'database'}
+    connection = mysql.connector.connect(**server)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}` "
+                       f"CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        cursor.execute(f"DROP TABLE IF EXISTS `{args.database}`.books, `{args.database}`.books_deleted")
+        cursor.close()
+    finally:
+        connection.close()
+    db_config['database'] = args.database
+    storage = MySQLStorage(db_config, load_section(config, 'pool', DEFAULT_POOL_CONFIG))
+    storage.init_schema(fulltext=True)
+    return storage
+
+
+def sample_criteria(books, fields, count=5):
+    """Критерии фильтра по значениям книг, равномерно взятых из каталога"""
+    step = max(1, len(books) // count)
+    return [{field: books[i][field] for field in fields} for i in range(0, len(books), step)][:count]
+
+
+def run_size(args, profile, report, workdir, size):
+    """Все сценарии для каталога из size книг"""
+    storage = open_bench_storage(args, workdir, size)
+    try:
+        data_file = os.path.join(workdir, f"books_{size}.ndjson")
+        with open(data_file, 'w', encoding='utf-8') as file:
+            write_json_records(file, generate_books(size, profile, seed=args.seed), ndjson=True)
+
+        # Импорт (пишет каталог, поэтому один прогон)
+        def import_file():
+            with open(data_file, encoding='utf-8') as file:
+                return storage.import_books(iter_json_records(file), batch_size=args.batch_size)
+        start = time.perf_counter()
+        result = import_file()
+        report.add(size, 'import', time.perf_counter() - start, result.added)
+
+        # Загрузка каталога: целиком и страницами
+        seconds, books = best_time(storage.load_books, args.repeat)
+        report.add(size, 'load_full', seconds, len(books))
+        seconds, page = best_time(lambda: storage.fetch_catalog_page(200), args.repeat)
+        report.add(size, 'load_first_page', seconds, len(page))
+        seconds, page = best_time(lambda: storage.fetch_catalog_page(200, offset=size // 2), args.repeat)
+        report.add(size, 'load_middle_page', seconds, len(page))
+
+        # Фильтры: запросом к БД и по колоночному индексу в памяти
+        seconds, index = best_time(lambda: CatalogIndex(books), args.repeat)
+        report.add(size, 'index_build', seconds, len(books))
+        for name, fields in FILTER_CASES.items():
+            cases = sample_criteria(books, fields)
+            seconds, found = best_time(lambda: sum(len(storage.filter_books(criteria)) for criteria in cases),
+                                       args.repeat)
+            report.add(size, f"{name}_db", seconds / len(cases), found // len(cases))
+            seconds, found = best_time(lambda: sum(len(index.filter(criteria)) for criteria in cases),
+                                       args.repeat)
+            report.add(size, f"{name}_index", seconds / len(cases), found // len(cases))
+
+        # Поиск: подстрока, ISBN (точный и по началу), полнотекстовый
+        sample = books[len(books) // 3]
+        word = sample['title'].split()[0]
+        seconds, found = best_time(lambda: storage.search_books('title', word, 'title'), args.repeat)
+        report.add(size, 'search_title', seconds, len(found))
+        seconds, found = best_time(lambda: storage.find_by_isbn(sample['isbn']), args.repeat)
+        report.add(size, 'search_isbn', seconds, len(found))
+        seconds, found = best_time(lambda: storage.find_by_isbn(sample['isbn'][:9]), args.repeat)
+        report.add(size, 'search_isbn_prefix', seconds, len(found))
+        query = f"{word} {sample['author'].split()[-1]}"
+        if storage.fulltext:
+            seconds, found = best_time(lambda: storage.fulltext_search(query), args.repeat)
+            report.add(size, 'search_fulltext_db', seconds, len(found))
+        seconds, text_index = best_time(lambda: TextIndex(books), args.repeat)
+        report.add(size, 'text_index_build', seconds, len(books))
+        seconds, found = best_time(lambda: text_index.search(query), args.repeat)
+        report.add(size, 'search_fulltext_index', seconds, len(found))
+
+        # Фасеты: запрос по каждому фасету, затем с выбранными фильтрами
+        seconds, counts = best_time(storage.facet_counts, args.repeat)
+        report.add(size, 'facet_counts', seconds, sum(len(rows) for rows in counts.values()))
+        facets = FacetCache()
+        facets.load(counts)
+        selected = {'genre': sample['genre'], 'rack': sample['rack']}
+        seconds, counts = best_time(lambda: storage.facet_counts(selected), args.repeat)
+        report.add(size, 'facet_drill_down', seconds, sum(len(rows) for rows in counts.values()))
+
+        # Экспорт потоковым чтением
+        export_file = os.path.join(workdir, f"export_{size}.json")
+
+        def export():
+            with open(export_file, 'w', encoding='utf-8') as file:
+                # Поля, как в export_data: без служебных колонок
+                return write_json_records(file, (
+                    {key: value for key, value in book.items() if key not in EXPORT_EXCLUDED}
+                    for chunk in storage.iter_books() for book in chunk
+                ))
+        seconds, count = best_time(export, args.repeat)
+        report.add(size, 'export', seconds, count)
+
+        # Одиночные изменения, как из формы приложения
+        new_books = list(generate_books(WRITE_OPERATIONS, profile, seed=args.seed + 1, start=size + 1))
+        start = time.perf_counter()
+        new_ids = [storage.insert_book(book) for book in new_books]
+        report.add(size, 'insert', time.perf_counter() - start, len(new_ids))
+
+        start = time.perf_counter()
+        for book_id, book in zip(new_ids, new_books):
+            storage.update_book(book_id, dict(book, quantity=book['quantity'] + 1))
+        report.add(size, 'update', time.perf_counter() - start, len(new_ids))
+
+        start = time.perf_counter()
+        for book_id in new_ids:
+            storage.delete_book(book_id)
+        report.add(size, 'delete', time.perf_counter() - start, len(new_ids))
+
+        if storage.pool.statement_stats is not None:
+            print(f"{size:>9,} {storage.pool.statement_stats.stats()}")
+    finally:
+        storage.close()
+
+
+def compare(report, baseline_path, threshold):
+    """Сценарии, ставшие медленнее базового отчёта больше чем на threshold"""
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {(row['size'], row['scenario']): row['seconds'] for row in json.load(file)['results']}
+    regressions = []
+    for row in report.results:
+        before = baseline.get((row['size'], row['scenario']))
+        if before and row['seconds'] > before * (1 + threshold):
+            regressions.append((row['size'], row['scenario'], before, row['seconds']))
+    for size, scenario, before, after in regressions:
+        print(f"Замедление: {size:,} {scenario}: {before * 1000:.1f} -> {after * 1000:.1f} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки каталога на синтетических данных")
+    parser.add_argument('--engine', choices=STORAGE_ENGINES, default='sqlite')
+    parser.add_argument('--sizes', default='10000,100000', help="размеры каталога через запятую")
+    parser.add_argument('--repeat', type=int, default=3, help="прогонов на сценарий чтения")
+    parser.add_argument('--batch-size', type=int, default=500, help="размер пачки импорта")
+    parser.add_argument('--seed', type=int, default=1, help="seed генератора")
+    parser.add_argument('--seed-file', default=DEFAULT_SEED_FILE, help="скрипт с тестовыми книгами")
+    parser.add_argument('--config', default="db_config.ini")
+    parser.add_argument('--database', default="library_bench", help="база MySQL для замеров")
+    parser.add_argument('--report', default="bench_report.json")
+    parser.add_argument('--baseline', help="отчёт для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое замедление (доля)")
+    args = parser.parse_args()
+
+    profile = SeedProfile(load_seed(args.seed_file))
+    report = Report(args.engine, args.seed_file)
+    workdir = tempfile.mkdtemp(prefix="library_bench_")
+    print(f"Движок: {args.engine}, рабочая папка: {workdir}")
+    try:
+        for size in (int(size) for size in args.sizes.split(',')):
+            run_size(args, profile, report, workdir, size)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report.save(args.report)
+    print(f"Отчёт: {args.report}")
+    if args.baseline and compare(report, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,696 @@
+import bisect
+import time
+
+# Отсчёт этапов запуска - до импорта остальных модулей
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
 from datetime import datetime
 import os
-import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 import configparser
 
+from storage import (open_storage, CatalogPager, catalog_key, catalog_sort_key, load_section,
+                     DEFAULT_STORAGE_CONFIG, DEFAULT_QUERY_LOG_CONFIG, DEFAULT_LOGGING_CONFIG,
+                     DEFAULT_POOL_CONFIG, DEFAULT_CATALOG_CONFIG, DEFAULT_IMPORT_CONFIG,
+                     DEFAULT_SEARCH_CONFIG, DEFAULT_QUERY_CACHE_CONFIG, DEFAULT_REFRESH_CONFIG,
+                     DEFAULT_REPLICA_CONFIG, PRUNE_HOURS)
+from background import BackgroundExecutor
+from virtual_table import VirtualTable
+from json_stream import iter_json_records, write_json_records
+from facets import FACETS, FacetCache
+from catalog_index import CatalogIndex
+from text_index import TextIndex
+from isbn import normalize_isbn
+from query_cache import QueryCache, view_key, key_matches
+from query_log import QueryLog
+from startup import StartupProfile
+from applog import get_logger, setup_logging, shutdown_logging
+
+
+log = get_logger("app")
+
+
 class LibraryApp:
-    def __init__(self, root):
+    def __init__(self, root, startup=None):
         self.root = root
+        # Время этапов запуска (пишется в журнал, когда каталог загружен)
+        self.startup = startup or StartupProfile()
         self.root.title("Библиотекарь - Система учета книг")
         self.root.state('zoomed')
 
          # Инициализация основных атрибутов
         self.config_file = "db_config.ini"
         self.db_config = {}
-        self.connection = None
-        self.cursor = None
+        self.storage_config = dict(DEFAULT_STORAGE_CONFIG)
+        self.pool_config = dict(DEFAULT_POOL_CONFIG)
+        self.catalog_config = dict(DEFAULT_CATALOG_CONFIG)
+        self.import_config = dict(DEFAULT_IMPORT_CONFIG)
+        self.search_config = dict(DEFAULT_SEARCH_CONFIG)
+        self.query_cache_config = dict(DEFAULT_QUERY_CACHE_CONFIG)
+        self.refresh_config = dict(DEFAULT_REFRESH_CONFIG)
+        self.replica_config = dict(DEFAULT_REPLICA_CONFIG)
+        self.query_log_config = dict(DEFAULT_QUERY_LOG_CONFIG)
+        self.logging_config = dict(DEFAULT_LOGGING_CONFIG)
+        self.storage = None
+        # Локальная копия каталога (SQLite); offline - работа с ней без сервера
+        self.replica = None
+        self.offline = False
+        self.catalog_pager = None
+        # Время (monotonic) последней очистки записей об удалениях
+        self.pruned_at = None
+        self.loading_pages = {}
+        self.showing_catalog = True
+        self.current_view = None
+        self.facets = FacetCache()
+        self.catalog_index = None
+        self.text_index = None
+        # Счётчики изменений книг: index_version - любых, внесённых в индексы
+        # (индекс, построенный в фоне, мог устареть), write_version - только
+        # сделанных в приложении (прочитанные изменения могли устареть)
+        self.index_version = 0
+        self.write_version = 0
+        self.last_save_error = None
+        # Время сервера, до которого изменения каталога уже прочитаны
+        self.refresh_watermark = None
         self.books = []
         self.selected_book_id = None
+        self.selected_book = None
         self.entries = {}
         
+        # Запросы к БД выполняются в фоновых потоках, результаты
+        # передаются в главный поток Tk через root.after
+        self.executor = BackgroundExecutor(self.root)
+        
         # Загрузка конфигурации БД
         self.db_config = self.load_db_config()
         
-        # Подключение к БД
-        self.connection = None
-        self.cursor = None
-        self.connect_to_db()
+        # Кэш результатов фильтров и поиска
+        self.query_cache = QueryCache(
+            max_entries=self.query_cache_config['entries'],
+            max_bytes=self.query_cache_config['memory_mb'] * 1024 * 1024
+        )
         
-
-        if not self.connection or not self.connection.is_connected():
-            print("Не удалось подключиться к БД. Работаем в автономном режиме.")
-            self.books = []
-        else:
-            # Инициализация таблицы, если её нет
-            self.init_database()
-            
-            # Загрузка данных из БД
-            self.books = self.load_data_from_db()
+        # Время операций с БД и журнал медленных запросов
+        self.query_log = self.open_query_log()
+        
+        # Постраничный режим каталога: в памяти держится только окно страниц
+        if self.catalog_config['paged']:
+            self.catalog_pager = CatalogPager(
+                page_size=self.catalog_config['page_size'],
+                max_pages=self.catalog_config['max_pages']
+            )
+        self.startup.mark('config')
 
         # Стилизация
         self.setup_styles()
 
-        # Создание интерфейса
+        # Создание интерфейса (вкладки поиска и действий - после первого кадра)
         self.create_widgets()
 
         # Обновление таблицы
         self.update_table()
+        self.startup.mark('widgets')
 
-         # Инициализация фильтров (после создания интерфейса)
-        if hasattr(self, 'genre_menu'):
-            self.root.after(100, self.update_filter_lists)  # Небольшая задержка   
+        # Подключение к БД и загрузка каталога - в фоне, когда окно
+        # уже отрисовано и отвечает
+        self.status_bar.config(text="Подключение к базе данных...")
+        self.root.after_idle(self.show_first_frame)
 
        # Устанавливаем время последнего обновления
         if hasattr(self, 'last_update_label'):
             self.last_update_label.config(text=f"Обновлено: {datetime.now().strftime('%H:%M:%S')}")
+
+        # Периодическое обновление каталога по изменениям
+        self.schedule_refresh()
+
+        # Остановка фоновых потоков при закрытии окна
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def show_first_frame(self):
+        """Первый кадр окна: остальные вкладки и фоновое подключение к БД"""
+        # Отрисовка виджетов, ожидающая в очереди idle, - часть первого кадра
+        self.root.update_idletasks()
+        self.startup.mark('first_frame')
+        first_frame_ms = self.startup.elapsed_ms('first_frame')
+        if first_frame_ms > self.startup.target_ms:
+            log.warning("Первый кадр окна позже цели", ms=first_frame_ms, target_ms=self.startup.target_ms)
+        else:
+            log.info("Окно отрисовано", ms=first_frame_ms)
+        
+        self.create_deferred_tabs()
+        self.startup.mark('tabs')
+        self.start_loading()
+
+    def start_loading(self):
+        """Фоновое открытие локальной копии и хранилища, затем загрузка каталога"""
+        def connect():
+            """Открытие копии и подключение (выполняется в фоне)"""
+            with self.startup.phase('replica'):
+                replica = self.open_replica()
+            with self.startup.phase('connect'):
+                try:
+                    return replica, self.open_storage(), None
+                except (Error, ValueError) as e:
+                    return replica, None, e
+        
+        def connected(result):
+            self.replica, storage, error = result
+            if error is None:
+                self.use_storage(storage)
+            elif not self.connection_failed(error):
+                log.warning("Не удалось подключиться к БД, каталог пуст")
+                self.status_bar.config(text="Нет подключения к базе данных")
+                self.startup.finish(log)
+                return
+            self.status_bar.config(text="Загрузка каталога из базы данных...")
+            self.executor.submit(
+                self.load_initial_data,
+                on_done=self.show_initial_data,
+                on_error=self.initial_load_failed,
+                key="view"
+            )
+        
+        def failed(e):
+            log.error("Ошибка при подключении к базе данных", error=e)
+            self.status_bar.config(text=f"Не удалось подключиться к базе данных: {e}")
+            self.startup.finish(log)
         
-    def get_unique_genres(self):
-        """Получение уникальных жанров из БД"""
+        self.executor.submit(connect, on_done=connected, on_error=failed, key="connect")
+
+    def load_initial_data(self):
+        """Инициализация таблицы и загрузка каталога (выполняется в фоне)"""
+        with self.startup.phase('schema'):
+            self.init_database()
+        with self.startup.phase('catalog'):
+            return self.load_catalog()
+
+    def show_initial_data(self, books):
+        """Отображение каталога, загруженного при запуске"""
+        with self.startup.phase('show'):
+            self.show_catalog(books)
+
+        # Инициализация фильтров (после создания таблицы в БД)
+        if hasattr(self, 'genre_menu'):
+            self.update_filter_lists()
+        self.rebuild_catalog_index()
+        self.sync_replica()
+        
+        if self.offline:
+            self.status_bar.config(
+                text=f"Автономный режим: каталог из локальной копии ({len(self.table)} книг). "
+                     f"Изменения будут отправлены на сервер после подключения."
+            )
+
+    def initial_load_failed(self, e):
+        """Каталог не загрузился с сервера: переход на локальную копию, если она есть"""
+        log.error("Ошибка при загрузке каталога", error=e)
+        if self.offline or not self.go_offline():
+            self.status_bar.config(text=f"Не удалось загрузить каталог: {e}")
+            self.startup.finish(log)
+            return
+        self.status_bar.config(text="Загрузка каталога из локальной копии...")
+        self.executor.submit(self.load_initial_data, on_done=self.show_initial_data, key="view")
+
+    def open_replica(self):
+        """Открытие файла локальной копии рядом с db_config.ini (None - копия выключена)"""
+        if not self.replica_config['enabled']:
+            return None
+        if self.storage_config['engine'].lower() != 'mysql':
+            # Каталог и так в локальном файле
+            return None
+        # Импорт здесь: копия открывается в фоне после первого кадра окна
+        from replica import ReplicaStorage
+        path = os.path.join(self.config_dir(), self.replica_config['file'])
         try:
-            query = "SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND genre != '' ORDER BY genre"
-            self.cursor.execute(query)
-            genres = []
-            for row in self.cursor.fetchall():
-                genre = row['genre']
-                if genre and genre.strip():  # Проверяем, что не пустое
-                    clean_genre = genre.strip()
-                    if clean_genre not in genres:  # Убираем дубликаты
-                        genres.append(clean_genre)
-            print(f"Получено уникальных жанров: {len(genres)}")
-            return genres
+            replica = ReplicaStorage(path)
+            replica.query_log = self.query_log
+            return replica
         except Error as e:
-            print(f"Ошибка при получении жанров: {e}")
-            return []
+            log.error("Не удалось открыть локальную копию каталога", path=path, error=e)
+            return None
 
-    def get_unique_authors(self):
-        """Получение уникальных авторов из БД"""
+    def go_offline(self):
+        """Переход на локальную копию каталога; возвращает время копии или None"""
+        if self.replica is None:
+            return None
         try:
-            query = "SELECT DISTINCT author FROM books WHERE author IS NOT NULL AND author != '' ORDER BY author"
-            self.cursor.execute(query)
-            authors = []
-            for row in self.cursor.fetchall():
-                author = row['author']
-                if author and author.strip():  # Проверяем, что не пустое
-                    clean_author = author.strip()
-                    if clean_author not in authors:  # Убираем дубликаты
-                        authors.append(clean_author)
-            print(f"Получено уникальных авторов: {len(authors)}")
-            return authors
+            synced_at = self.replica.synced_at()
         except Error as e:
-            print(f"Ошибка при получении авторов: {e}")
-            return []
+            log.error("Ошибка чтения локальной копии", error=e)
+            return None
+        if synced_at is None:
+            # Копия ещё ни разу не заполнялась
+            return None
+        if self.storage and self.storage is not self.replica:
+            self.storage.close()
+        self.storage = self.replica
+        self.offline = True
+        self.query_cache.clear()
+        log.warning("Автономный режим: каталог из локальной копии", synced_at=f"{synced_at:%Y-%m-%d %H:%M}")
+        return synced_at
+
+    def sync_replica(self):
+        """Фоновое обновление локальной копии с сервера (по изменениям с прошлого раза)"""
+        if self.replica is None or self.offline or not self.storage:
+            return
+        
+        def failed(e):
+            log.error("Ошибка при обновлении локальной копии каталога", error=e)
+        
+        self.executor.submit(self.replica.sync_from, self.storage, self.refresh_config['overlap'],
+                             on_error=failed, key="replica")
 
-    def get_unique_years(self):
-        """Получение уникальных годов издания из БД"""
+    def try_reconnect(self):
+        """Фоновая попытка подключиться к серверу в автономном режиме"""
+        def connect():
+            return self.open_storage()
+        
+        def connected(storage):
+            if not self.offline:
+                storage.close()
+                return
+            self.storage = storage
+            self.offline = False
+            self.query_cache.clear()
+            log.info("Подключение к серверу БД восстановлено")
+            self.replay_offline_writes()
+        
+        def failed(e):
+            log.warning("Сервер БД по-прежнему недоступен", error=e)
+        
+        self.executor.submit(connect, on_done=connected, on_error=failed, key="reconnect")
+
+    def replay_offline_writes(self):
+        """Отправка изменений, сделанных без сервера, и загрузка каталога с сервера"""
+        storage = self.storage
+        
+        def replay():
+            """Отправка очереди пачками (выполняется в фоне)"""
+            return self.replica.replay_to(storage, self.replica_config['batch_size'])
+        
+        def reload():
+            def reloaded(books):
+                self.show_catalog(books)
+                self.resync_caches()
+                self.sync_replica()
+            self.status_bar.config(text="Загрузка каталога из базы данных...")
+            self.executor.submit(self.load_initial_data, on_done=reloaded, key="view")
+        
+        def replayed(report):
+            if report.applied or report.conflicts:
+                log.info("Отправлены изменения, сделанные без подключения",
+                         applied=report.applied, conflicts=report.conflicts)
+            if report.error:
+                log.error("Ошибка при отправке отложенных изменений", error=report.error)
+            if report.conflicts:
+                messagebox.showwarning(
+                    "Конфликты изменений",
+                    f"Не применено изменений, сделанных без подключения: {report.conflicts}.\n"
+                    f"Эти книги за это время изменили или удалили на сервере, "
+                    f"сохранены версии сервера. Отклонённые изменения записаны "
+                    f"в локальную копию (таблица write_conflicts)."
+                )
+            reload()
+        
+        def failed(e):
+            log.error("Ошибка при отправке отложенных изменений", error=e)
+            reload()
+        
+        if self.replica is None:
+            reload()
+            return
+        self.status_bar.config(text="Отправка изменений, сделанных без подключения...")
+        self.executor.submit(replay, on_done=replayed, on_error=failed, key="replay")
+
+    def resync_caches(self):
+        """Полное обновление кэшей из БД после явного обновления или импорта"""
+        self.update_filter_lists(resync=True)
+        self.rebuild_catalog_index()
+        # Индекс слов перестроится при следующем поиске
+        self.text_index = None
+        self.query_cache.clear()
+        self.show_cache_stats()
+
+    def query_view(self, view, query, show, failed):
+        """Результат вида из кэша запросов или фоновый запрос к БД с сохранением в кэш"""
+        books = self.query_cache.get(view)
+        self.show_cache_stats()
+        if books is not None:
+            # Незавершённый запрос к БД для предыдущего вида больше не нужен
+            self.executor.cancel("view")
+            show(books)
+            return
+        
+        version = self.query_cache.version
+        
+        def fetch():
+            """Запрос к БД и сохранение результата (выполняется в фоне)"""
+            books = query()
+            self.query_cache.put(view, books, version)
+            return books
+        
+        def fetched(books):
+            show(books)
+            self.show_cache_stats()
+        
+        self.executor.submit(fetch, on_done=fetched, on_error=failed, key="view")
+
+    def show_cache_stats(self):
+        """Счётчики запросов и кэша запросов в правой части строки состояния"""
+        if hasattr(self, 'cache_status'):
+            parts = [self.query_log.stats(), self.query_cache.stats()]
+            statement_stats = self.storage.pool.statement_stats if self.storage else None
+            if statement_stats is not None:
+                parts.append(statement_stats.stats())
+            self.cache_status.config(text=" | ".join(parts))
+
+    def rebuild_catalog_index(self):
+        """Фоновое построение колоночного индекса каталога для фильтров в памяти
+
+        Индекс включается параметром column_index в секции [catalog]. Для
+        него один раз читается весь каталог; пока индекс строится, фильтры
+        выполняются запросами к БД.
+        """
+        if not self.storage or not self.catalog_config['column_index']:
+            return
+        
+        self.catalog_index = None
+        version = self.index_version
+        
+        def build():
+            """Построение индекса (выполняется в фоне)"""
+            return CatalogIndex(self.storage.load_books())
+        
+        def built(index):
+            if self.index_version != version:
+                # Пока строился индекс, книги менялись - строим заново
+                self.rebuild_catalog_index()
+                return
+            self.catalog_index = index
+            log.info("Построен индекс каталога в памяти", books=len(index), numpy=index.use_numpy)
+        
+        def failed(e):
+            log.error("Ошибка при построении индекса каталога", error=e)
+        
+        self.executor.submit(build, on_done=built, on_error=failed, key="catalog_index")
+
+    def filter_in_memory(self, criteria, order_by):
+        """Фильтр по индексу каталога в памяти или None, если индекс не построен"""
+        if self.catalog_index is None:
+            return None
+        # Незавершённый запрос к БД для предыдущего фильтра больше не нужен
+        self.executor.cancel("view")
+        return self.catalog_index.filter(criteria, order_by)
+
+    def reload_catalog(self, on_loaded=None, on_error=None):
+        """Фоновая перезагрузка каталога из БД с обновлением таблицы"""
+        def show(books):
+            self.show_catalog(books)
+            if on_loaded:
+                on_loaded()
+
+        return self.executor.submit(self.load_catalog, on_done=show, on_error=on_error, key="view")
+
+    def load_catalog(self):
+        """Загрузка каталога: первая страница в постраничном режиме, иначе все книги"""
+        # Метка для обновления по изменениям - время сервера до чтения каталога
         try:
-            query = "SELECT DISTINCT year FROM books WHERE year IS NOT NULL ORDER BY year DESC"
-            self.cursor.execute(query)
-            years = []
-            for row in self.cursor.fetchall():
-                year = row['year']
-                if year:
-                    year_str = str(year).strip()
-                    if year_str not in years:  # Убираем дубликаты
-                        years.append(year_str)
-            print(f"Получено уникальных годов: {len(years)}")
-            return years
+            self.refresh_watermark = self.storage.server_time() if self.storage else None
         except Error as e:
-            print(f"Ошибка при получении годов: {e}")
-            return []
+            log.warning("Не удалось получить время сервера", error=e)
+            self.refresh_watermark = None
+        if self.catalog_pager and self.storage:
+            return self.load_catalog_page(with_total=True)
+        return self.load_data_from_db()
+
+    def show_catalog(self, books):
+        """Отображение результата load_catalog в таблице"""
+        if isinstance(books, tuple):
+            # Постраничный режим: общее количество и первая страница
+            total, rows, first_key, last_key = books
+            self.cancel_page_requests()
+            self.catalog_pager.reset(total, rows, first_key, last_key)
+            books = self.catalog_pager.rows()
+        self.books = books
+        self.update_table()
+
+    def load_catalog_page(self, after=None, before=None, offset=None, with_total=False):
+        """Загрузка страницы каталога по ключу (выполняется в фоне)"""
+        books = self.storage.fetch_catalog_page(
+            self.catalog_pager.page_size, after=after, before=before, offset=offset
+        )
+        first_key = catalog_key(books[0]) if books else None
+        last_key = catalog_key(books[-1]) if books else None
+        total = self.storage.count_books() if with_total else None
+        return total, books, first_key, last_key
+
+    def schedule_refresh(self):
+        """Планирование следующего фонового обновления по изменениям"""
+        interval = self.refresh_config['interval']
+        if interval > 0:
+            self.root.after(interval * 1000, self.periodic_refresh)
+
+    def periodic_refresh(self):
+        """Фоновое обновление по таймеру (пока каталог не загружен, пропускается)
+
+        В автономном режиме вместо обновления - попытка подключиться к серверу.
+        """
+        if self.offline:
+            self.try_reconnect()
+        elif self.storage and self.refresh_watermark is not None:
+            self.refresh_changes()
+            self.sync_replica()
+            self.prune_deleted()
+        self.schedule_refresh()
+
+    def prune_deleted(self):
+        """Фоновая очистка старых записей об удалениях (не чаще раза в PRUNE_HOURS)"""
+        now = time.monotonic()
+        if self.pruned_at is not None and now - self.pruned_at < PRUNE_HOURS * 3600:
+            return
+        self.pruned_at = now
+        
+        def pruned(count):
+            if count:
+                log.info("Удалены старые записи об удалениях", count=count)
+        
+        def failed(e):
+            log.warning("Не удалось очистить записи об удалениях", error=e)
+        
+        self.executor.submit(self.storage.prune_deleted, on_done=pruned, on_error=failed, key="prune")
+
+    def refresh_changes(self, on_done=None, on_error=None):
+        """Фоновое обновление каталога по изменениям с последней метки
+
+        Читаются только книги с updated_at не раньше метки и id книг,
+        удалённых после неё; они вносятся в каталог в памяти, показанный
+        вид, фасеты, индексы и кэш запросов. Если изменений нет, это два
+        запроса по индексам. Без метки (или со слишком старой) каталог
+        перезагружается целиком. on_done получает (изменено, удалено) или
+        None после полной перезагрузки.
+        """
+        if not self.storage:
+            return
+        since = self.refresh_watermark
+        version = self.write_version
+        
+        def fetch():
+            """Чтение изменений (выполняется в фоне)"""
+            return self.storage.fetch_changes(since, self.refresh_config['overlap'])
+        
+        def fetched(changes):
+            now, rows, deleted_ids, total = changes
+            if rows is None:
+                def reloaded():
+                    self.resync_caches()
+                    if on_done:
+                        on_done(None)
+                self.reload_catalog(on_loaded=reloaded, on_error=on_error)
+                return
+            # Книги менялись в приложении, пока читались изменения: прочитанные
+            # версии могут быть старее показанных, изменения перечитаются позже
+            if self.write_version == version:
+                self.refresh_watermark = now
+                self.merge_changes(rows, deleted_ids, total)
+            if on_done:
+                on_done((len(rows), len(deleted_ids)))
+        
+        def failed(e):
+            log.error("Ошибка при обновлении каталога по изменениям", error=e)
+            if on_error:
+                on_error(e)
+        
+        self.executor.submit(fetch, on_done=fetched, on_error=failed, key="refresh")
+
+    def merge_changes(self, rows, deleted_ids, total):
+        """Внесение изменённых и удалённых книг в данные приложения в памяти"""
+        if not rows and not deleted_ids:
+            return
+        paged = bool(self.catalog_pager and self.storage)
+        deleted_ids = set(deleted_ids)
+        
+        # Прежние версии книг известны, если весь каталог есть в памяти
+        # (список книг или индекс каталога); иначе фасеты пересчитываются в БД
+        catalog_rows = None if paged else {book.get("id"): book for book in self.books}
+        complete = self.catalog_index is not None or not paged
+        
+        def known_book(book_id):
+            if self.catalog_index is not None:
+                position = self.catalog_index.positions.get(book_id)
+                return self.catalog_index.rows[position] if position is not None else None
+            return catalog_rows.get(book_id) if catalog_rows is not None else None
+        
+        pages_valid = paged and total == self.catalog_pager.total
+        for row in rows:
+            book_id = row.get("id")
+            old = known_book(book_id)
+            if complete:
+                if old is None:
+                    self.facets.add(row)
+                else:
+                    self.facets.update(old, row)
+            # update в индексах добавляет книгу, если её ещё нет
+            self.sync_indexes('update', book_id, row, local=False)
+            if catalog_rows is not None:
+                catalog_rows[book_id] = row
+            elif paged and not self.catalog_pager.replace(book_id, row):
+                pages_valid = False
+        
+        for book_id in deleted_ids:
+            old = known_book(book_id)
+            if complete and old is None:
+                # Книги уже нет (например, удалена в этом приложении)
+                continue
+            if old is not None:
+                self.facets.remove(old)
+            self.sync_indexes('remove', book_id, local=False)
+            if catalog_rows is not None:
+                catalog_rows.pop(book_id, None)
+            elif paged and self.catalog_pager.find(book_id) is not None:
+                pages_valid = False
+        
+        # Кэш запросов: одна проверка записей на всю пачку изменений
+        self.query_cache.books_changed(rows, deleted_ids)
+        
+        # Каталог: весь список пересобирается в порядке каталога, у страниц
+        # заменяются строки на месте или страницы перечитываются
+        if catalog_rows is not None:
+            self.books[:] = sorted(catalog_rows.values(), key=catalog_sort_key)
+        elif not pages_valid:
+            self.cancel_page_requests()
+            self.catalog_pager.total = total
+            self.catalog_pager.invalidate()
+            self.books = []
+        else:
+            self.books = self.catalog_pager.rows()
+        
+        # Показанный результат фильтра или поиска
+        if not self.showing_catalog:
+            shown = self.table.rows
+            positions = {book.get("id"): index for index, book in enumerate(shown)}
+            key = view_key(self.current_view) if self.current_view else None
+            # Только для фильтров известно точно, подходит ли книга под вид
+            exact = key is not None and key[0] == 'filter'
+            removed = set(book_id for book_id in deleted_ids if book_id in positions)
+            for row in rows:
+                book_id = row.get("id")
+                index = positions.get(book_id)
+                if exact and not key_matches(key, row):
+                    if index is not None:
+                        removed.add(book_id)
+                elif index is not None:
+                    shown[index] = row
+                elif exact:
+                    shown.append(row)
+            if removed:
+                shown[:] = [book for book in shown if book.get("id") not in removed]
+        
+        if deleted_ids:
+            self.table.clear_selection()
+        self.table.refresh()
+        self.update_counters(len(self.table))
+        self.update_filter_lists(resync=not complete)
+        log.debug("Обновление по изменениям", changed=len(rows), deleted=len(deleted_ids))
+
+    def request_catalog_rows(self, start, stop):
+        """Фоновая загрузка страниц каталога, попавших в видимый диапазон таблицы"""
+        pager = self.catalog_pager
+        if not pager or not self.showing_catalog or not self.storage:
+            return
+
+        needed = pager.missing_pages(start, stop)
+
+        # Страницы, которые уже прокручены мимо, больше не нужны
+        for page_no in list(self.loading_pages):
+            if page_no not in needed:
+                self.executor.cancel(f"page-{page_no}")
+                del self.loading_pages[page_no]
+
+        for page_no in needed:
+            if page_no in self.loading_pages:
+                continue
+            self.loading_pages[page_no] = pager.generation
+
+            def show(page, page_no=page_no, generation=pager.generation):
+                if self.loading_pages.get(page_no) == generation:
+                    del self.loading_pages[page_no]
+                if generation != pager.generation:
+                    return
+                _, rows, first_key, last_key = page
+                pager.add_page(page_no, rows, first_key, last_key)
+                self.books = pager.rows()
+                if self.showing_catalog:
+                    self.table.refresh()
+
+            def failed(e, page_no=page_no):
+                self.loading_pages.pop(page_no, None)
+                log.error("Ошибка при загрузке страницы каталога", error=e)
+
+            self.executor.submit(
+                self.load_catalog_page,
+                on_done=show,
+                on_error=failed,
+                key=f"page-{page_no}",
+                **pager.page_request(page_no)
+            )
 
+    def cancel_page_requests(self):
+        """Отмена загрузки страниц каталога"""
+        for page_no in self.loading_pages:
+            self.executor.cancel(f"page-{page_no}")
+        self.loading_pages.clear()
+
+    def invalidate_catalog_pages(self, delta=0):
+        """Сброс загруженных страниц каталога после изменения данных
+
+        delta - изменение общего числа книг. Видимые страницы будут
+        перечитаны при следующей отрисовке таблицы.
+        """
+        if self.catalog_pager and self.storage:
+            self.cancel_page_requests()
+            self.catalog_pager.total = max(0, self.catalog_pager.total + delta)
+            self.catalog_pager.invalidate()
+            self.books = []
+            return True
+        return False
+
+    def on_close(self):
+        """Закрытие окна: отмена фоновых запросов и выход"""
+        self.executor.shutdown()
+        if self.replica is not None:
+            self.replica.close()
+        for name, count, total, longest in self.query_log.summary()[:10]:
+            log.info("Время операций", operation=name, calls=count, total_s=total,
+                     max_ms=longest * 1000)
+        statement_stats = self.storage.pool.statement_stats if self.storage else None
+        if statement_stats is not None:
+            log.info("Подготовленные запросы", stats=statement_stats.stats())
+        self.query_log.close()
+        self.root.destroy()
+        shutdown_logging()
+        
     def load_db_config(self):
         """Загрузка конфигурации базы данных"""
         config = configparser.ConfigParser()
@@ -124,7 +703,17 @@ class LibraryApp:
                 'password': 'vada/228',
                 'database': 'library_db',
                 'port': '3306'
-            }
+            },
+            'storage': DEFAULT_STORAGE_CONFIG,
+            'pool': DEFAULT_POOL_CONFIG,
+            'catalog': DEFAULT_CATALOG_CONFIG,
+            'import': DEFAULT_IMPORT_CONFIG,
+            'search': DEFAULT_SEARCH_CONFIG,
+            'query_cache': DEFAULT_QUERY_CACHE_CONFIG,
+            'refresh': DEFAULT_REFRESH_CONFIG,
+            'replica': DEFAULT_REPLICA_CONFIG,
+            'query_log': DEFAULT_QUERY_LOG_CONFIG,
+            'logging': DEFAULT_LOGGING_CONFIG
         }
         
         if os.path.exists(self.config_file):
@@ -135,39 +724,116 @@ class LibraryApp:
             with open(self.config_file, 'w') as configfile:
                 config.write(configfile)
         
+        # Журнал приложения настраивается первым: дальше в него пишут все
+        self.logging_config = load_section(config, 'logging', DEFAULT_LOGGING_CONFIG)
+        self.setup_logging()
+        
+        # Движок хранилища (MySQL или файл SQLite)
+        self.storage_config = load_section(config, 'storage', DEFAULT_STORAGE_CONFIG)
+        
+        # Настройки пула соединений (размер, запас, таймаут ожидания)
+        self.pool_config = load_section(config, 'pool', DEFAULT_POOL_CONFIG)
+        
+        # Настройки постраничного каталога
+        self.catalog_config = load_section(config, 'catalog', DEFAULT_CATALOG_CONFIG)
+        
+        # Размер пачки при импорте
+        self.import_config = load_section(config, 'import', DEFAULT_IMPORT_CONFIG)
+        
+        # Полнотекстовый поиск
+        self.search_config = load_section(config, 'search', DEFAULT_SEARCH_CONFIG)
+        
+        # Размер кэша результатов запросов
+        self.query_cache_config = load_section(config, 'query_cache', DEFAULT_QUERY_CACHE_CONFIG)
+        
+        # Обновление каталога по изменениям
+        self.refresh_config = load_section(config, 'refresh', DEFAULT_REFRESH_CONFIG)
+        
+        # Локальная копия каталога для работы без сервера
+        self.replica_config = load_section(config, 'replica', DEFAULT_REPLICA_CONFIG)
+        
+        # Журнал медленных запросов
+        self.query_log_config = load_section(config, 'query_log', DEFAULT_QUERY_LOG_CONFIG)
+        
         return config['database']
 
-    def connect_to_db(self):
-        """Подключение к базе данных MySQL"""
+    def config_dir(self):
+        """Папка файла конфигурации (относительные пути к файлам SQLite - от неё)"""
+        return os.path.dirname(os.path.abspath(self.config_file))
+
+    def open_storage(self):
+        """Хранилище каталога по секции [storage]: сервер MySQL или файл SQLite"""
+        storage = open_storage(self.storage_config, self.db_config, self.pool_config, self.config_dir())
+        storage.query_log = self.query_log
+        return storage
+
+    def setup_logging(self):
+        """Журнал приложения по секции [logging]: уровень, файл рядом с db_config.ini"""
+        settings = self.logging_config
+        setup_logging(
+            level=settings['level'],
+            path=os.path.join(self.config_dir(), settings['file']) if settings['file'] else None,
+            max_bytes=settings['max_kb'] * 1024,
+            backups=settings['backups'],
+            console=settings['console']
+        )
+
+    def open_query_log(self):
+        """Журнал времени операций; медленные пишутся в файл рядом с db_config.ini"""
+        settings = self.query_log_config
+        path = os.path.join(self.config_dir(), settings['file']) if settings['file'] else None
         try:
-            self.connection = mysql.connector.connect(
-                host=self.db_config['host'],
-                user=self.db_config['user'],
-                password=self.db_config['password'],
-                database=self.db_config['database'],
-                port=int(self.db_config.get('port', '3306'))
+            return QueryLog(
+                slow_ms=settings['slow_ms'],
+                path=path,
+                max_bytes=settings['max_kb'] * 1024,
+                backups=settings['backups'],
+                explain=settings['explain']
             )
-            
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor(dictionary=True)
-                print("Успешно подключено к базе данных MySQL")
-                return True
-            else:
-                print("Не удалось подключиться к базе данных")
-                return False
-                
-        except Error as e:
-            print(f"Ошибка подключения к базе данных: {e}")
-            messagebox.showerror(
-                "Ошибка подключения", 
+        except OSError as e:
+            log.error("Не удалось открыть журнал медленных запросов", path=path, error=e)
+            return QueryLog(slow_ms=settings['slow_ms'])
+
+    def use_storage(self, storage):
+        """Работа с открытым хранилищем (подключение удалось)"""
+        self.storage = storage
+        # Результаты, полученные из другой БД, больше не годятся
+        self.query_cache.clear()
+        if self.storage.engine == 'mysql':
+            log.info("Подключено к базе данных MySQL",
+                     pool=self.storage.pool.size, overflow=self.storage.pool.overflow)
+        else:
+            log.info("Каталог открыт из файла SQLite", path=self.storage.pool.path)
+        if self.offline:
+            # Изменения, сделанные без сервера, отправляются сразу
+            self.offline = False
+            self.replay_offline_writes()
+
+    def connection_failed(self, e):
+        """Подключиться не удалось: локальная копия или сообщение об ошибке
+
+        Возвращает True, если каталог открыт из локальной копии.
+        """
+        log.error("Ошибка подключения к базе данных", error=e)
+        # Без сервера каталог открывается из локальной копии
+        synced_at = self.go_offline()
+        if synced_at:
+            messagebox.showwarning(
+                "Автономный режим",
                 f"Не удалось подключиться к базе данных.\nОшибка: {e}\n\n"
-                f"Проверьте настройки подключения в файле {self.config_file}"
+                f"Каталог открыт из локальной копии от {synced_at:%d.%m.%Y %H:%M}. "
+                f"Изменения сохранятся и будут отправлены на сервер после подключения."
             )
-            
-            # Создаем пустые атрибуты, чтобы избежать ошибок
-            self.connection = None
-            self.cursor = None
-            return False
+            return True
+        messagebox.showerror(
+            "Ошибка подключения", 
+            f"Не удалось подключиться к базе данных.\nОшибка: {e}\n\n"
+            f"Проверьте настройки подключения в файле {self.config_file}"
+        )
+        
+        # Работаем без хранилища, чтобы избежать ошибок
+        self.storage = None
+        return False
 
     def open_db_config_dialog(self):
         """Открытие диалогового окна для настройки подключения к БД"""
@@ -205,40 +871,44 @@ class LibraryApp:
             for field_name, entry in entries.items():
                 self.db_config[field_name] = entry.get()
             
-            # Сохраняем конфигурацию
+            # Сохраняем конфигурацию (остальные секции, например [pool], не трогаем)
             config = configparser.ConfigParser()
+            config.read(self.config_file)
             config['database'] = self.db_config
             
             with open(self.config_file, 'w') as configfile:
                 config.write(configfile)
             
-            # Закрываем старое соединение если есть
-            if self.cursor:
-                self.cursor.close()
-            if self.connection and self.connection.is_connected():
-                self.connection.close()
-            
-            # Пытаемся подключиться снова
-            if self.connect_to_db():
-                if self.connection and self.connection.is_connected():
-                    # Инициализируем БД
-                    self.init_database()
-                    # Перезагружаем данные
-                    self.books = self.load_data_from_db()
-                    # Обновляем таблицу
-                    self.update_table()
-                    # Обновляем фильтры
-                    self.update_filter_lists()
-                    
-                    messagebox.showinfo("Успех", "Подключение восстановлено! Данные обновлены.")
+            # Закрываем старый пул соединений если есть (локальная копия остаётся открытой)
+            if self.storage and not self.offline:
+                self.storage.close()
+                self.storage = None
+            
+            def show_reloaded(books):
+                # Обновляем таблицу и фильтры
+                self.show_initial_data(books)
+                messagebox.showinfo("Успех", "Подключение восстановлено! Данные обновлены.")
+            
+            def reload():
+                # Инициализируем БД и перезагружаем данные в фоне
+                self.status_bar.config(text="Загрузка каталога из базы данных...")
+                self.executor.submit(self.load_initial_data, on_done=show_reloaded,
+                                     on_error=self.initial_load_failed, key="view")
+            
+            def connected(storage):
+                self.use_storage(storage)
+                reload()
+            
+            def failed(e):
+                if self.connection_failed(e):
+                    # Каталог открыт из локальной копии
+                    reload()
                 else:
-                    messagebox.showwarning("Предупреждение", 
-                                         "Настройки сохранены, но подключиться не удалось. "
-                                         "Проверьте параметры подключения.")
-            else:
-                messagebox.showwarning("Предупреждение", 
-                                     "Не удалось подключиться с новыми настройками.")
+                    self.status_bar.config(text="Нет подключения к базе данных")
             
+            # Пытаемся подключиться снова (в фоне, окно не блокируется)
+            self.status_bar.config(text="Подключение к базе данных...")
+            self.executor.submit(self.open_storage, on_done=connected, on_error=failed, key="connect")
             config_window.destroy()
         
         tk.Button(config_window, text="Сохранить и переподключиться", 
@@ -248,271 +918,121 @@ class LibraryApp:
     def init_database(self):
         """Инициализация таблиц в базе данных"""
         # Проверяем подключение
-        if not self.connection or not self.connection.is_connected():
-            print("Нет подключения к БД. Пропускаем инициализацию таблицы.")
+        if not self.storage:
+            log.warning("Нет подключения к БД, инициализация таблицы пропущена")
             return
         
         try:
-            # Проверяем существование колонок
-            self.cursor.execute("SHOW COLUMNS FROM books LIKE 'location'")
-            has_location = self.cursor.fetchone()
-            
-            self.cursor.execute("SHOW COLUMNS FROM books LIKE 'shelf'")
-            has_shelf = self.cursor.fetchone()
-            
-            self.cursor.execute("SHOW COLUMNS FROM books LIKE 'rack'")
-            has_rack = self.cursor.fetchone()
-            
-            # Если есть старые колонки, нужно обновить структуру
-            if has_location and (not has_shelf or not has_rack):
-                print("Обновляем структуру таблицы...")
-                
-                # Добавляем новые колонки если их нет
-                if not has_shelf:
-                    self.cursor.execute("ALTER TABLE books ADD COLUMN shelf VARCHAR(10) DEFAULT ''")
-                    print("Добавлена колонка 'shelf'")
-                
-                if not has_rack:
-                    self.cursor.execute("ALTER TABLE books ADD COLUMN rack VARCHAR(10) DEFAULT ''")
-                    print("Добавлена колонка 'rack'")
-                
-                # Переносим данные из location в новые колонки
-                self.cursor.execute("""
-                    UPDATE books 
-                    SET rack = SUBSTRING_INDEX(location, '-', 1),
-                        shelf = SUBSTRING_INDEX(location, '-', -1)
-                    WHERE location LIKE '%-%'
-                """)
-                
-                # Удаляем старую колонку location
-                self.cursor.execute("ALTER TABLE books DROP COLUMN location")
-                print("Удалена колонка 'location'")
-                
-                self.connection.commit()
-                print("Структура таблицы обновлена")
-            
-            # Создаем таблицу если её нет
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS books (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                author VARCHAR(255) NOT NULL,
-                year INT NOT NULL,
-                genre VARCHAR(100),
-                publisher VARCHAR(255),
-                isbn VARCHAR(20),
-                quantity INT DEFAULT 1,
-                rack VARCHAR(10) DEFAULT '',
-                shelf VARCHAR(10) DEFAULT '',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-            """
-            
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
-            print("Таблица 'books' создана или уже существует")
+            self.storage.init_schema(fulltext=self.search_config['fulltext'])
+            log.debug("Таблица books создана или уже существует", fulltext=self.storage.fulltext)
             
         except Error as e:
-            print(f"Ошибка при инициализации БД: {e}")
+            log.error("Ошибка при инициализации БД", error=e)
 
     def check_database_data(self):    
         """Проверка содержимого базы данных"""
-        print("\n" + "="*50)
-        print("ПРОВЕРКА ДАННЫХ В БАЗЕ ДАННЫХ")
-        
         try:
             # 1. Все книги
-            self.cursor.execute("SELECT COUNT(*) as count FROM books")
-            total = self.cursor.fetchone()['count']
-            print(f"Всего книг в БД: {total}")
+            total = self.storage.count_books()
+            log.info("Проверка данных в БД", books=total)
             
             # 2. Несколько примеров книг
-            self.cursor.execute("SELECT title, author, genre, year FROM books LIMIT 10")
-            books = self.cursor.fetchall()
-            print(f"\nПервые {len(books)} книг в БД:")
-            for i, book in enumerate(books, 1):
-                print(f"  {i}. '{book['title']}' - {book['author']} ({book['year']}), жанр: {book['genre']}")
-            
-            # 3. Уникальные жанры
-            self.cursor.execute("SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND genre != ''")
-            genres = [row['genre'] for row in self.cursor.fetchall()]
-            print(f"\nУникальные жанры ({len(genres)}): {genres}")
-            
-            # 4. Уникальные авторы
-            self.cursor.execute("SELECT DISTINCT author FROM books WHERE author IS NOT NULL AND author != ''")
-            authors = [row['author'] for row in self.cursor.fetchall()]
-            print(f"\nУникальные авторы ({len(authors)}): {authors[:10]}{'...' if len(authors) > 10 else ''}")
+            for i, book in enumerate(self.storage.sample_books(10), 1):
+                log.info("Пример книги", n=i, title=book['title'], author=book['author'],
+                         year=book['year'], genre=book['genre'])
             
-            # 5. Уникальные годы
-            self.cursor.execute("SELECT DISTINCT year FROM books WHERE year IS NOT NULL")
-            years = [row['year'] for row in self.cursor.fetchall()]
-            print(f"\nУникальные годы ({len(years)}): {years}")
-            
-            print("="*50 + "\n")
+            # 3-5. Уникальные жанры, авторы и годы
+            for column in ('genre', 'author', 'year'):
+                values = self.storage.distinct_values(column)
+                log.info("Уникальные значения", column=column, count=len(values),
+                         first=", ".join(str(value) for value in values[:10]))
             
         except Error as e:
-            print(f"Ошибка при проверке БД: {e}")
+            log.error("Ошибка при проверке БД", error=e)
 
     def load_data_from_db(self):
         """Загрузка данных из базы данных"""
         # Проверяем, есть ли подключение
-        if not self.connection or not self.connection.is_connected():
-            print("Нет подключения к БД. Возвращаем пустой список.")
+        if not self.storage:
+            log.warning("Нет подключения к БД, каталог пуст")
             return []
         
         try:
-            query = "SELECT * FROM books ORDER BY rack, shelf, title"
-            self.cursor.execute(query)
-            books = self.cursor.fetchall()
-            
-            # Преобразование в список словарей
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            print(f"Загружено книг из БД: {len(result)}")
-            return result
+            # Строки материализуются хранилищем (см. rows.py)
+            books = self.storage.load_books()
+            log.debug("Загружены книги из БД", books=len(books))
+            return books
             
         except Error as e:
-            print(f"Ошибка при загрузке данных: {e}")
+            log.error("Ошибка при загрузке данных", error=e)
             return []
 
-    def save_data_to_db(self, book_data, operation='insert'):
+    def save_data_to_db(self, book_data, operation='insert', book_id=None):
         """Сохранение данных в базу данных"""
         # Проверяем подключение
-        if not self.connection or not self.connection.is_connected():
-            print("Нет подключения к БД. Данные не сохранены.")
+        if not self.storage:
+            log.warning("Нет подключения к БД, данные не сохранены")
             return None
         
+        self.last_save_error = None
         try:
             if operation == 'insert':
-                query = """
-                INSERT INTO books (title, author, year, genre, publisher, isbn, quantity, rack, shelf)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                values = (
-                    book_data['title'],
-                    book_data['author'],
-                    book_data['year'],
-                    book_data.get('genre', ''),
-                    book_data.get('publisher', ''),
-                    book_data.get('isbn', ''),
-                    book_data.get('quantity', 1),
-                    book_data.get('rack', ''),
-                    book_data.get('shelf', '')
-                )
-                self.cursor.execute(query, values)
-                book_id = self.cursor.lastrowid
+                book_id = self.storage.insert_book(book_data)
+                self.query_cache.book_added(book_data)
                 
             elif operation == 'update':
-                query = """
-                UPDATE books 
-                SET title = %s, author = %s, year = %s, genre = %s, 
-                    publisher = %s, isbn = %s, quantity = %s, rack = %s, shelf = %s
-                WHERE id = %s
-                """
-                values = (
-                    book_data['title'],
-                    book_data['author'],
-                    book_data['year'],
-                    book_data.get('genre', ''),
-                    book_data.get('publisher', ''),
-                    book_data.get('isbn', ''),
-                    book_data.get('quantity', 1),
-                    book_data.get('rack', ''),
-                    book_data.get('shelf', ''),
-                    self.selected_book_id
-                )
-                self.cursor.execute(query, values)
-                book_id = self.selected_book_id
+                # id передаётся явно: метод может выполняться в фоновом потоке
+                if book_id is None:
+                    book_id = self.selected_book_id
+                book_id = self.storage.update_book(book_id, book_data)
+                self.query_cache.book_updated(book_id, book_data)
                 
-            self.connection.commit()
             return book_id
             
         except Error as e:
-            print(f"Ошибка при сохранении данных: {e}")
-            self.connection.rollback()
+            log.error("Ошибка при сохранении данных", error=e)
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                self.last_save_error = f"Книга с ISBN {book_data.get('isbn', '')} уже есть в базе данных!"
             return None
 
+    def confirm_isbn(self, isbn, parent=None):
+        """Проверка контрольной цифры ISBN; при ошибке - вопрос, сохранять ли как есть"""
+        if not isbn or normalize_isbn(isbn):
+            return True
+        return messagebox.askyesno(
+            "Проверка ISBN",
+            f"ISBN '{isbn}' не прошёл проверку контрольной цифры.\nСохранить книгу с этим ISBN?",
+            parent=parent
+        )
+
     def delete_from_db(self, book_id):
-        """Удаление книги из базы данных и перенумерация ID"""
+        """Удаление книги из базы данных по её id"""
          # Проверяем подключение
-        if not self.connection or not self.connection.is_connected():
-            print("Нет подключения к БД. Удаление невозможно.")
+        if not self.storage:
+            log.warning("Нет подключения к БД, удаление невозможно")
             return False
 
         try:
-            # Удаляем книгу
-            query = "DELETE FROM books WHERE id = %s"
-            self.cursor.execute(query, (book_id,))
-            
-            # Получаем оставшиеся книги, отсортированные по id
-            select_query = "SELECT id FROM books ORDER BY id"
-            self.cursor.execute(select_query)
-            remaining_books = self.cursor.fetchall()
-            
-            # Перенумерация оставшихся книг
-            for new_id, book in enumerate(remaining_books, start=1):
-                old_id = book['id']
-                if old_id != new_id:
-                    update_query = "UPDATE books SET id = %s WHERE id = %s"
-                    self.cursor.execute(update_query, (new_id, old_id))
-            
-            # Сбрасываем автоинкремент
-            reset_query = "ALTER TABLE books AUTO_INCREMENT = 1"
-            self.cursor.execute(reset_query)
-            
-            self.connection.commit()
-            return True
+            deleted = self.storage.delete_book(book_id)
+            self.query_cache.book_removed(book_id)
+            return deleted
             
         except Error as e:
-            print(f"Ошибка при удалении данных: {e}")
-            self.connection.rollback()
+            log.error("Ошибка при удалении данных", error=e)
             return False
 
     def search_in_db(self, field, value):
         """Поиск книг в базе данных"""
         # Проверяем подключение
-        if not self.connection or not self.connection.is_connected():
-            print("Нет подключения к БД. Поиск невозможен.")
+        if not self.storage:
+            log.warning("Нет подключения к БД, поиск невозможен")
             return []
 
         try:
-            # Безопасное формирование запроса
-            allowed_fields = ['title', 'author', 'genre', 'isbn', 'year']
-            if field not in allowed_fields:
-                field = 'title'
-            
-            query = f"SELECT * FROM books WHERE {field} LIKE %s ORDER BY id"
-            self.cursor.execute(query, (f"%{value}%",))
-            books = self.cursor.fetchall()
-            
-            # Преобразование в список словарей с перенумерацией
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i  # Перенумеровываем ID
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            return result
+            return self.storage.search_books(field, value)
             
         except Error as e:
-            print(f"Ошибка при поиске данных: {e}")
+            log.error("Ошибка при поиске данных", error=e)
             return []
 
     def setup_styles(self):
@@ -651,7 +1171,40 @@ class LibraryApp:
         search_main = tk.Frame(self.search_tab, bg=self.bg_color)
         search_main.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
 
-        # 1. Поиск по ISBN
+        # 1. Полнотекстовый поиск
+        tk.Label(
+            search_main,
+            text="📖 Поиск по названию, автору, издательству:",
+            font=("Arial", 12, "bold"),
+            bg=self.bg_color,
+            fg=self.accent_color
+        ).pack(anchor="w", pady=(0, 10))
+
+        text_row = tk.Frame(search_main, bg=self.bg_color)
+        text_row.pack(fill=tk.X, pady=(0, 20))
+
+        self.text_search_entry = tk.Entry(
+            text_row,
+            font=("Arial", 11),
+            width=25,
+            relief=tk.GROOVE,
+            borderwidth=1
+        )
+        self.text_search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        self.text_search_entry.bind("<Return>", lambda event: self.search_text())
+
+        tk.Button(
+            text_row,
+            text="Найти",
+            command=self.search_text,
+            bg=self.button_color,
+            fg="white",
+            font=("Arial", 10, "bold"),
+            width=10,
+            padx=5
+        ).pack(side=tk.RIGHT)
+
+        # 2. Поиск по ISBN
         tk.Label(
             search_main,
             text="🔎 Поиск по ISBN:",
@@ -683,7 +1236,7 @@ class LibraryApp:
             padx=5
         ).pack(side=tk.RIGHT)
 
-        # 2. Фильтры по категориям
+        # 3. Фильтры по категориям
         tk.Label(
             search_main,
             text="🎯 Фильтры по категориям:",
@@ -709,7 +1262,8 @@ class LibraryApp:
         self.genre_var = tk.StringVar()
         self.genre_var.set("Выберите жанр")
   
-        genres = ["Выберите жанр"] + self.get_unique_genres()
+        # Списки значений фильтров заполняет update_filter_lists (в фоне)
+        genres = ["Выберите жанр"]
         self.genre_menu = ttk.Combobox(
             genre_row,
             textvariable=self.genre_var,
@@ -747,7 +1301,7 @@ class LibraryApp:
         self.author_var = tk.StringVar()
         self.author_var.set("Выберите автора")
         
-        authors = ["Выберите автора"] + sorted(self.get_unique_authors())
+        authors = ["Выберите автора"]
         self.author_menu = ttk.Combobox(
             author_row,
             textvariable=self.author_var,
@@ -785,7 +1339,7 @@ class LibraryApp:
         self.year_var = tk.StringVar()
         self.year_var.set("Выберите год")
         
-        years = ["Выберите год"] + sorted(self.get_unique_years(), reverse=True)
+        years = ["Выберите год"]
         self.year_menu = ttk.Combobox(
             year_row,
             textvariable=self.year_var,
@@ -823,29 +1377,7 @@ class LibraryApp:
         self.rack_var = tk.StringVar()
         self.rack_var.set("Выберите стеллаж")
         
-        racks = ["Выберите стеллаж"] + sorted(self.get_unique_racks())
-        self.rack_menu = ttk.Combobox(
-            rack_row,
-            textvariable=self.rack_var,
-            values=racks,
-            state="readonly",
-            font=("Arial", 10),
-            width=25
-        )
-        self.rack_menu.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-        
-        tk.Button(
-            rack_row,
-            text="×",
-            command=lambda: self.rack_var.set("Выберите стеллаж"),
-            bg="#e74c3c",
-            fg="white",
-            font=("Arial", 9, "bold"),
-            width=3
-        ).pack(side=tk.RIGHT)
-        
-        # Получаем уникальные стеллажи из БД
-        racks = ["Выберите стеллаж"] + sorted(self.get_unique_racks())
+        racks = ["Выберите стеллаж"]
         self.rack_menu = ttk.Combobox(
             rack_row,
             textvariable=self.rack_var,
@@ -866,6 +1398,19 @@ class LibraryApp:
             width=3
         ).pack(side=tk.RIGHT)
 
+        # Фильтры связаны между собой: в каждом списке остаются только значения,
+        # для которых есть книги при остальных выбранных фильтрах (со счётчиками)
+        self.filter_controls = {
+            'genre': (self.genre_var, self.genre_menu, "Выберите жанр"),
+            'author': (self.author_var, self.author_menu, "Выберите автора"),
+            'year': (self.year_var, self.year_menu, "Выберите год"),
+            'rack': (self.rack_var, self.rack_menu, "Выберите стеллаж")
+        }
+        self.filter_labels = {facet: {} for facet in self.filter_controls}
+        for facet, (var, menu, placeholder) in self.filter_controls.items():
+            menu.bind("<<ComboboxSelected>>", lambda event, facet=facet: self.on_filter_selected(facet))
+            var.trace_add("write", lambda *args, facet=facet: self.on_filter_changed(facet))
+
         # Кнопка применения фильтра
         filter_button_row = tk.Frame(search_main, bg=self.bg_color)
         filter_button_row.pack(fill=tk.X, pady=(15, 10))
@@ -1077,14 +1622,34 @@ class LibraryApp:
         h_scrollbar = ttk.Scrollbar(table_container, orient=tk.HORIZONTAL, command=self.tree.xview)
         self.tree.configure(xscrollcommand=h_scrollbar.set)
 
-        # Размещаем таблицу и скроллбар
-        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        # Вертикальный скроллбар отражает полное число строк, а не элементы дерева
+        self.v_scrollbar = ttk.Scrollbar(table_container, orient=tk.VERTICAL)
+
+        # Размещаем таблицу и скроллбары
         h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
         # Привязываем события
         self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", self.on_mousewheel)
+        self.tree.bind("<Button-5>", self.on_mousewheel)
         self.tree.bind("<<TreeviewSelect>>", self.on_book_select)
 
+        # Виртуальная прокрутка: элементы дерева есть только для видимых строк
+        self.table = VirtualTable(
+            self.tree,
+            self.v_scrollbar,
+            row_values=lambda index, book: self.book_row_values(book, index + 1),
+            placeholder=("", "Загрузка..."),
+            on_need_rows=self.request_catalog_rows
+        )
+
+    def create_deferred_tabs(self):
+        """Содержимое вкладок, не видных при запуске (после первого кадра окна)"""
+        self.create_search_tab()
+        self.create_actions_tab()
+
     def create_widgets(self):
         """Создание элементов интерфейса"""
         # Заголовок
@@ -1144,10 +1709,8 @@ class LibraryApp:
         main_container.add(left_panel, minsize=330, width=380)
         main_container.add(right_panel, minsize=600)
 
-        # Создаем содержимое вкладок слева
+        # Создаем содержимое вкладок слева (скрытые вкладки - create_deferred_tabs)
         self.create_data_tab()
-        self.create_search_tab()
-        self.create_actions_tab()
         
         # Создаем каталог книг справа
         self.create_catalog_tab(right_panel)
@@ -1162,6 +1725,15 @@ class LibraryApp:
             fg="white"
         )
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # Счётчики запросов и кэша запросов поверх правого края строки состояния
+        self.cache_status = tk.Label(
+            self.status_bar,
+            text=f"{self.query_log.stats()} | {self.query_cache.stats()}",
+            bg=self.accent_color,
+            fg="#bdc3c7"
+        )
+        self.cache_status.place(relx=1.0, rely=0.5, anchor=tk.E)
 
         self.selected_book_id = None
         
@@ -1242,25 +1814,12 @@ class LibraryApp:
             messagebox.showwarning("Ошибка", "Введите ISBN для поиска!")
             return
         
-        try:
-            query = "SELECT * FROM books WHERE isbn LIKE %s ORDER BY title"
-            self.cursor.execute(query, (f"%{isbn_text}%",))
-            
-            books = self.cursor.fetchall()
-            
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            self.update_table(result)
+        def query():
+            """Запрос к БД (выполняется в фоне)"""
+            return self.storage.find_by_isbn(isbn_text)
+        
+        def show(result):
+            self.update_table(result, view=('isbn', isbn_text, 500))
             
             if result:
                 self.status_bar.config(text=f"Найдено книг по ISBN: {len(result)}")
@@ -1268,36 +1827,129 @@ class LibraryApp:
                 self.tab_control.select(0)
             else:
                 self.status_bar.config(text="Книги с таким ISBN не найдены.")
-                
-        except Error as e:
-            print(f"Ошибка при поиске по ISBN: {e}")
+        
+        def failed(e):
+            log.error("Ошибка при поиске по ISBN", error=e)
+            messagebox.showerror("Ошибка", f"Не удалось выполнить поиск: {str(e)}")
+        
+        self.status_bar.config(text="Поиск по ISBN...")
+        self.query_view(('isbn', isbn_text, 500), query, show, failed)
+
+    def search_text(self):
+        """Полнотекстовый поиск по названию, автору и издательству
+
+        При наличии FULLTEXT-индекса (парсер ngram) поиск и ранжирование
+        выполняет MySQL, иначе - обратный индекс слов в памяти, который
+        строится при первом поиске и затем поддерживается изменениями книг.
+        """
+        text = self.text_search_entry.get().strip()
+        
+        if not text:
+            messagebox.showwarning("Ошибка", "Введите слова для поиска!")
+            return
+        if not self.storage:
+            messagebox.showwarning("Ошибка", "Нет подключения к базе данных!")
+            return
+        
+        limit = self.search_config['limit']
+        
+        def show(result):
+            view = ('fulltext', text, limit) if self.storage.fulltext else None
+            self.update_table(result, view=view)
+            
+            if result:
+                self.status_bar.config(text=f"Найдено книг по запросу '{text}': {len(result)}")
+                self.tab_control.select(0)
+            else:
+                self.status_bar.config(text=f"По запросу '{text}' ничего не найдено.")
+        
+        def failed(e):
+            log.error("Ошибка при полнотекстовом поиске", error=e)
             messagebox.showerror("Ошибка", f"Не удалось выполнить поиск: {str(e)}")
+        
+        if self.storage.fulltext:
+            query = lambda: self.storage.fulltext_search(text, limit)
+            self.status_bar.config(text="Поиск...")
+            self.query_view(('fulltext', text, limit), query, show, failed)
+            return
+        
+        if self.text_index is not None:
+            self.executor.cancel("view")
+            show(self.text_index.search(text, limit))
+            return
+        
+        version = self.index_version
+        
+        def build_and_search():
+            """Построение индекса слов и поиск (выполняется в фоне)"""
+            index = TextIndex(self.storage.load_books())
+            return index, index.search(text, limit)
+        
+        def built(result):
+            index, books = result
+            # Если книги менялись, пока строился индекс, он не сохраняется
+            if self.index_version == version:
+                self.text_index = index
+            show(books)
+        
+        self.status_bar.config(text="Построение индекса для поиска...")
+        self.executor.submit(build_and_search, on_done=built, on_error=failed, key="view")
+
+    def book_row_values(self, book, number=""):
+        """Значения колонок таблицы для книги
+
+        В колонке ID показывается порядковый номер строки в текущем виде,
+        сама книга определяется по своему id в БД.
+        """
+        return (
+            number,
+            book.get("title", ""),
+            book.get("author", ""),
+            book.get("year", ""),
+            book.get("genre", ""),
+            book.get("publisher", ""),
+            book.get("isbn", ""),
+            book.get("quantity", ""),
+            book.get("rack", ""),
+            book.get("shelf", "")
+        )
 
-    def update_table(self, books=None):
-        """Обновление таблицы с книгами"""
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+    def update_table(self, books=None, view=None):
+        """Обновление таблицы с книгами
 
+        view - запрос, результат которого показан (см. LibraryStorage.view_query),
+        по нему экспортируется текущий фильтр.
+        """
+        start = time.perf_counter()
+        
+        # Без аргумента показывается каталог (в постраничном режиме - все
+        # страницы каталога, загружаемые по мере прокрутки)
+        self.showing_catalog = books is None
+        self.current_view = view if books is not None else None
         if books is None:
-            books = self.books
-
-        for book in books:
-            values = (
-                book.get("id", ""),
-                book.get("title", ""),
-                book.get("author", ""),
-                book.get("year", ""),
-                book.get("genre", ""),
-                book.get("publisher", ""),
-                book.get("isbn", ""),
-                book.get("quantity", ""),
-                book.get("rack", ""),
-                book.get("shelf", "")
-            )
-            self.tree.insert("", tk.END, values=values)
+            if self.catalog_pager and self.storage:
+                books = self.catalog_pager
+            else:
+                books = self.books
+        else:
+            self.cancel_page_requests()
 
-        # Обновляем статистику везде
-        total_books = len(books)
+        # Перепривязываются только видимые строки, сколько бы их ни было
+        self.table.set_rows(books)
+        self.selected_book = None
+
+        # Обновляем статистику везде (в постраничном режиме - общее число книг на сервере)
+        self.update_counters(len(books))
+        
+        # Перерисовка выполняется в обработчиках простоя Tk, запланированных
+        # выше, поэтому замер заканчивается в следующем за ними
+        def drawn(rows=len(books)):
+            self.query_log.record_time('update_table', time.perf_counter() - start, rows)
+            self.show_cache_stats()
+        self.root.after_idle(drawn)
+
+    def update_counters(self, total_books):
+        """Обновление счётчиков книг и строки состояния (без обхода таблицы)"""
         current_time = datetime.now().strftime("%H:%M:%S")
         
         self.stats_label.config(text=f"Всего книг: {total_books}")
@@ -1310,6 +1962,125 @@ class LibraryApp:
             
         self.status_bar.config(text=f"Готово. Загружено книг: {total_books} | Время: {current_time}")
 
+    def book_by_id(self, book_id):
+        """Книга с заданным id из строк в памяти (None - её там нет)
+
+        Без просмотра всего каталога: выбранная книга, выделенная строка
+        таблицы, индекс каталога (id -> позиция) и загруженные страницы.
+        """
+        for book in (self.selected_book, self.table.selected_row()):
+            if book is not None and book.get("id") == book_id:
+                return book
+        if self.catalog_index is not None:
+            position = self.catalog_index.positions.get(book_id)
+            if position is not None:
+                return self.catalog_index.rows[position]
+        if self.catalog_pager and self.storage:
+            found = self.catalog_pager.find(book_id)
+            if found is not None:
+                page_no, position = found
+                return self.catalog_pager.pages[page_no][0][position]
+        return None
+
+    def find_row(self, rows, book_id):
+        """Индекс книги с заданным id в списке строк (или None)
+
+        Сначала проверяется выделенная строка таблицы - правка и удаление
+        почти всегда относятся к ней.
+        """
+        hint = self.table.selected_index
+        if hint is not None and hint < len(rows) and rows[hint].get("id") == book_id:
+            return hint
+        for index, row in enumerate(rows):
+            if row.get("id") == book_id:
+                return index
+        return None
+
+    def sync_indexes(self, method, *args, local=True):
+        """Изменение книги в индексах в памяти (колоночном и текстовом)
+
+        local=False - изменение прочитано из БД (обновление по изменениям):
+        оно не делает устаревшими изменения, читаемые в фоне.
+        """
+        self.index_version += 1
+        if local:
+            self.write_version += 1
+        for index in (self.catalog_index, self.text_index):
+            if index is not None:
+                getattr(index, method)(*args)
+
+    def view_insert_book(self, book):
+        """Показ добавленной книги без перестроения таблицы
+
+        book - строка, прочитанная из БД после добавления; она встаёт на
+        своё место в порядке каталога (стеллаж, полка, название).
+        """
+        self.sync_indexes('add', book)
+        if self.invalidate_catalog_pages(+1):
+            # Книга займёт своё место в порядке каталога, видимые страницы перечитаются
+            index = None
+        else:
+            index = bisect.bisect_right(self.books, catalog_sort_key(book), key=catalog_sort_key)
+            self.books.insert(index, book)
+
+        if self.showing_catalog:
+            self.table.refresh()
+            self.update_counters(len(self.table))
+        else:
+            self.update_table()
+        if index is not None:
+            self.table.see(index)
+
+    def view_update_book(self, book_id, book):
+        """Замена строки изменённой книги без перестроения таблицы
+
+        book - строка, прочитанная из БД после изменения. Если изменились
+        стеллаж, полка или название, в каталоге книга переезжает на своё
+        место в порядке каталога.
+        """
+        self.sync_indexes('update', book_id, book)
+        if self.catalog_pager and self.storage:
+            if not self.catalog_pager.replace(book_id, book):
+                self.invalidate_catalog_pages()
+            else:
+                self.books = self.catalog_pager.rows()
+        else:
+            index = self.find_row(self.books, book_id)
+            if index is not None:
+                if catalog_sort_key(self.books[index]) == catalog_sort_key(book):
+                    self.books[index] = book
+                else:
+                    del self.books[index]
+                    index = bisect.bisect_right(self.books, catalog_sort_key(book), key=catalog_sort_key)
+                    self.books.insert(index, book)
+
+        # Показанные результаты поиска/фильтра - отдельный список
+        if not self.showing_catalog:
+            index = self.find_row(self.table.rows, book_id)
+            if index is not None:
+                self.table.rows[index] = book
+
+        self.table.refresh()
+        self.update_counters(len(self.table))
+
+    def view_remove_book(self, book_id):
+        """Удаление строки книги из показанных данных без перестроения таблицы"""
+        self.sync_indexes('remove', book_id)
+        lists = []
+        if not self.invalidate_catalog_pages(-1):
+            lists.append(self.books)
+        if not self.showing_catalog:
+            lists.append(self.table.rows)
+
+        for rows in lists:
+            index = self.find_row(rows, book_id)
+            if index is not None:
+                del rows[index]
+
+        self.table.clear_selection()
+        self.table.refresh()
+        self.update_counters(len(self.table))
+
     def add_book(self):
         """Добавление новой книги в БД"""
         book_data = {}
@@ -1347,6 +2118,10 @@ class LibraryApp:
             
             book_data[field] = value
 
+        if not self.confirm_isbn(book_data.get("isbn")):
+            self.entries["isbn"].focus_set()
+            return
+
         # Валидация года
         try:
             year = int(book_data["year"])
@@ -1372,24 +2147,34 @@ class LibraryApp:
             self.entries["quantity"].focus_set()
             return
 
-        # Сохранение в БД
-        book_id = self.save_data_to_db(book_data, 'insert')
+        def save():
+            """Добавление и чтение новой строки из БД (выполняется в фоне)"""
+            book_id = self.save_data_to_db(book_data, 'insert')
+            if not book_id:
+                return None
+            try:
+                book = self.storage.get_book(book_id)
+            except Error as e:
+                log.warning("Не удалось прочитать добавленную книгу", book_id=book_id, error=e)
+                book = None
+            # Год и ISBN-ключ - в том виде, в каком их сохранила БД
+            return book or dict(book_data, id=book_id)
+        
+        def saved(book):
+            if book:
+                self.view_insert_book(book)
+                self.clear_form()
+                self.status_bar.config(text=f"Книга '{book['title']}' успешно добавлена в БД!")
+                
+                # Обновляем списки фильтров (без запроса к БД)
+                self.facets.add(book)
+                self.update_filter_lists()
+            else:
+                messagebox.showerror("Ошибка", self.last_save_error or "Не удалось добавить книгу в базу данных!")
         
-        if book_id:
-            book_data["id"] = book_id
-            self.books.append(book_data)
-            self.update_table()
-            self.clear_form()
-            self.status_bar.config(text=f"Книга '{book_data['title']}' успешно добавлена в БД!")
-            
-            # Обновляем списки фильтров
-            self.update_filter_lists()
-            
-            # Прокручиваем к новой книге
-            if self.tree.get_children():
-                self.tree.see(self.tree.get_children()[-1])
-        else:
-            messagebox.showerror("Ошибка", "Не удалось добавить книгу в базу данных!")
+        # Сохранение в БД (в фоне)
+        self.status_bar.config(text=f"Сохранение книги '{book_data['title']}'...")
+        self.executor.submit(save, on_done=saved)
 
     def delete_book(self):
         """Удаление книги из БД"""
@@ -1405,24 +2190,27 @@ class LibraryApp:
         if not confirm:
             return
 
-        book_title = ""
-        for book in self.books:
-            if book.get("id") == self.selected_book_id:
-                book_title = book.get("title", "")
-                break
+        book_id = self.selected_book_id
+        deleted_book = self.book_by_id(book_id)
+        book_title = deleted_book.get("title", "") if deleted_book is not None else ""
 
-        # Удаление из БД
-        if self.delete_from_db(self.selected_book_id):
-            # Удаление из локального списка
-            self.books = [book for book in self.books if book.get("id") != self.selected_book_id]
-            
-            self.update_table()
-            self.clear_form()
-            self.status_bar.config(text=f"Книга '{book_title}' успешно удалена из БД!")
-            self.selected_book_id = None
-            self.update_button.config(state=tk.DISABLED)
-        else:
-            messagebox.showerror("Ошибка", "Не удалось удалить книгу из базы данных!")
+        def deleted(success):
+            if success:
+                # Удаление строки из локальных списков
+                self.view_remove_book(book_id)
+                if deleted_book is not None:
+                    self.facets.remove(deleted_book)
+                    self.update_filter_lists()
+                self.clear_form()
+                self.status_bar.config(text=f"Книга '{book_title}' успешно удалена из БД!")
+                self.selected_book_id = None
+                self.update_button.config(state=tk.DISABLED)
+            else:
+                messagebox.showerror("Ошибка", "Не удалось удалить книгу из базы данных!")
+
+        # Удаление из БД (в фоне)
+        self.status_bar.config(text=f"Удаление книги '{book_title}'...")
+        self.executor.submit(self.delete_from_db, book_id, on_done=deleted)
 
     def edit_book(self):
         """Редактирование выбранной книги в отдельном окне"""
@@ -1430,17 +2218,28 @@ class LibraryApp:
             messagebox.showwarning("Ошибка", "Выберите книгу для редактирования!")
             return
 
-        # Найти выбранную книгу
-        selected_book = None
-        for book in self.books:
-            if book.get("id") == self.selected_book_id:
-                selected_book = book
-                break
-        
-        if not selected_book:
+        selected_book = self.book_by_id(self.selected_book_id)
+        if selected_book is not None:
+            self.open_edit_window(selected_book)
+            return
+        if not self.storage:
             messagebox.showwarning("Ошибка", "Книга не найдена!")
             return
         
+        # Книги нет среди строк в памяти - она читается из БД
+        def loaded(book):
+            if book is None:
+                messagebox.showwarning("Ошибка", "Книга не найдена!")
+            else:
+                self.open_edit_window(book)
+        
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось прочитать книгу: {str(e)}")
+        
+        self.executor.submit(self.storage.get_book, self.selected_book_id, on_done=loaded, on_error=failed)
+
+    def open_edit_window(self, selected_book):
+        """Окно редактирования книги"""
         # Создать окно редактирования
         edit_window = tk.Toplevel(self.root)
         edit_window.title(f"Редактирование книги: {selected_book.get('title', '')}")
@@ -1508,6 +2307,9 @@ class LibraryApp:
                 
                 book_data[field] = value
             
+            if not self.confirm_isbn(book_data.get("isbn"), parent=edit_window):
+                return
+            
             # Валидация года
             try:
                 year = int(book_data["year"])
@@ -1529,22 +2331,37 @@ class LibraryApp:
                 messagebox.showwarning("Ошибка", "Количество должно быть числом!")
                 return
             
-            # Обновление в БД
-            if self.save_data_to_db(book_data, 'update'):
-                # Обновление в локальном списке
-                for i, book in enumerate(self.books):
-                    if book.get("id") == self.selected_book_id:
-                        book_data["id"] = self.selected_book_id
-                        self.books[i] = book_data
-                        break
-                
-                self.update_table()
-                edit_window.destroy()
-                self.clear_form()
-                messagebox.showinfo("Успех", "Книга успешно обновлена!")
-                self.status_bar.config(text=f"Книга '{book_data['title']}' успешно обновлена")
-            else:
-                messagebox.showerror("Ошибка", "Не удалось обновить книгу в базе данных!")
+            book_id = selected_book.get("id")
+            
+            def save():
+                """Изменение и чтение новой версии строки из БД (выполняется в фоне)"""
+                if not self.save_data_to_db(book_data, 'update', book_id):
+                    return None
+                try:
+                    book = self.storage.get_book(book_id)
+                except Error as e:
+                    log.warning("Не удалось прочитать изменённую книгу", book_id=book_id, error=e)
+                    book = None
+                # Год, ISBN-ключ и время изменения - в том виде, в каком их сохранила БД
+                return book or dict(selected_book, **book_data, id=book_id)
+            
+            def saved(book):
+                if book:
+                    # Обновление строки в локальных списках
+                    self.view_update_book(book_id, book)
+                    self.facets.update(selected_book, book)
+                    self.update_filter_lists()
+                    if edit_window.winfo_exists():
+                        edit_window.destroy()
+                    self.clear_form()
+                    messagebox.showinfo("Успех", "Книга успешно обновлена!")
+                    self.status_bar.config(text=f"Книга '{book['title']}' успешно обновлена")
+                else:
+                    messagebox.showerror("Ошибка", self.last_save_error or "Не удалось обновить книгу в базе данных!")
+            
+            # Обновление в БД (в фоне)
+            self.status_bar.config(text=f"Сохранение книги '{book_data['title']}'...")
+            self.executor.submit(save, on_done=saved)
         
         # Кнопки
         button_frame = tk.Frame(edit_window)
@@ -1564,8 +2381,7 @@ class LibraryApp:
             else:
                 widget.delete(0, tk.END)
 
-        if self.tree.selection():
-            self.tree.selection_remove(self.tree.selection())
+        self.table.clear_selection()
 
         self.status_bar.config(text="Форма очищена. Готов к вводу новой книги.")
 
@@ -1573,11 +2389,15 @@ class LibraryApp:
         """Обработка выбора книги в таблице"""
         selection = self.tree.selection()
         if selection:
-            item = self.tree.item(selection[0])
-            book_id = int(item["values"][0])
-            self.selected_book_id = book_id
+            # Элементы дерева переиспользуются при прокрутке, поэтому книга
+            # берётся из источника строк виртуальной таблицы
+            book = self.table.row_of(selection[0])
+            if book is None:
+                return
+            self.selected_book = book
+            self.selected_book_id = int(book["id"])
 
-            book_title = item["values"][1]
+            book_title = book.get("title", "")
             self.status_bar.config(text=f"Выбрана книга: '{book_title}'")
 
     def filter_by_genre(self, selected_genre):
@@ -1585,117 +2405,73 @@ class LibraryApp:
         if selected_genre == "Выберите жанр":
             return
         
-        try:
-            query = "SELECT * FROM books WHERE genre = %s ORDER BY title"
-            self.cursor.execute(query, (selected_genre,))
-            books = self.cursor.fetchall()
-            
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            self.update_table(result)
+        def query():
+            """Запрос к БД (выполняется в фоне)"""
+            return self.storage.filter_books({'genre': selected_genre}, order_by='title')
+        
+        def show(result):
+            self.update_table(result, view=('filter', {'genre': selected_genre}, 'title'))
             self.status_bar.config(text=f"Найдено книг в жанре '{selected_genre}': {len(result)}")
-            
-        except Error as e:
-            print(f"Ошибка при фильтрации по жанру: {e}")
+        
+        def failed(e):
+            log.error("Ошибка при фильтрации по жанру", error=e)
             messagebox.showerror("Ошибка", f"Не удалось применить фильтр: {str(e)}")
+        
+        # Без запроса к БД, если построен индекс каталога в памяти
+        books = self.filter_in_memory({'genre': selected_genre}, 'title')
+        if books is not None:
+            show(books)
+            return
+        
+        self.query_view(('filter', {'genre': selected_genre}, 'title'), query, show, failed)
 
     def apply_combined_filter(self):
         """Применение комбинированного фильтра по всем выбранным критериям"""
-        print("\n" + "="*50)
-        print("НАЧАЛО ФИЛЬТРАЦИИ")
-        
         genre = self.genre_var.get()
         author = self.author_var.get()
         year = self.year_var.get()
         rack = self.rack_var.get()  # Добавляем стеллаж
         
-        print(f"Выбранные критерии:")
-        print(f"  Жанр: '{genre}'")
-        print(f"  Автор: '{author}'")
-        print(f"  Год: '{year}'")
-        print(f"  Стеллаж: '{rack}'")
-        
         # Проверяем, что выбрано хотя бы одно значение
         if (genre == "Выберите жанр" and 
             author == "Выберите автора" and 
             year == "Выберите год" and
             rack == "Выберите стеллаж"):
-            print("Нет выбранных критериев - показываем все книги")
-            self.books = self.load_data_from_db()
-            self.update_table()
+            self.reload_catalog()
             return
         
-        try:
-            # Формируем запрос в зависимости от выбранных критериев
-            query_parts = []
-            params = []
-            
-            if genre != "Выберите жанр":
-                query_parts.append("genre = %s")
-                params.append(genre)
-                print(f"Добавлен фильтр по жанру: {genre}")
-            
-            if author != "Выберите автора":
-                query_parts.append("author = %s")
-                params.append(author)
-                print(f"Добавлен фильтр по автору: {author}")
-            
-            if year != "Выберите год":
-                try:
-                    year_int = int(year)
-                    query_parts.append("year = %s")
-                    params.append(year_int)
-                    print(f"Добавлен фильтр по году: {year}")
-                except ValueError:
-                    print(f"Ошибка: некорректный год '{year}'")
-                    messagebox.showwarning("Ошибка", "Укажите корректный год издания!")
-                    return
-            
-            if rack != "Выберите стеллаж":
-                query_parts.append("rack = %s")
-                params.append(rack)
-                print(f"Добавлен фильтр по стеллажу: {rack}")
-            
-            # Собираем полный запрос
-            if query_parts:
-                where_clause = " AND ".join(query_parts)
-                query = f"SELECT * FROM books WHERE {where_clause} ORDER BY rack, shelf, title"
-                print(f"SQL запрос: {query}")
-                print(f"Параметры: {params}")
-            else:
-                query = "SELECT * FROM books ORDER BY rack, shelf, title"
-                print(f"SQL запрос: {query} (без параметров)")
-            
-            # Выполняем запрос
-            self.cursor.execute(query, tuple(params))
-            books = self.cursor.fetchall()
-            print(f"Найдено записей в БД: {len(books)}")
-            
-            # Конвертируем и обновляем таблицу
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            self.update_table(result)
-            print(f"Обновлено строк в таблице: {len(result)}")
+        # Формируем критерии в зависимости от выбранных значений
+        criteria = {}
+        
+        if genre != "Выберите жанр":
+            criteria['genre'] = genre
+        
+        if author != "Выберите автора":
+            criteria['author'] = author
+        
+        if year != "Выберите год":
+            try:
+                criteria['year'] = int(year)
+            except ValueError:
+                messagebox.showwarning("Ошибка", "Укажите корректный год издания!")
+                return
+        
+        if rack != "Выберите стеллаж":
+            criteria['rack'] = rack
+        
+        log.debug("Комбинированный фильтр", **criteria)
+        
+        # Если по кэшу фасетов под фильтр не попадает ни одной книги,
+        # запрос к БД не нужен
+        skip_query = self.facets.loaded and self.facets.count(criteria) == 0
+        
+        def query():
+            """Запрос к БД (выполняется в фоне)"""
+            return self.storage.filter_books(criteria)
+        
+        def show(result):
+            self.update_table(result, view=('filter', criteria, 'rack, shelf, title'))
+            log.debug("Результат фильтра", books=len(result))
             
             # Формируем текст для статусной строки
             filter_texts = []
@@ -1715,7 +2491,6 @@ class LibraryApp:
                 status_text = f"Отображены все книги: {len(result)}"
             
             self.status_bar.config(text=status_text)
-            print(f"Статус: {status_text}")
             
             # Показываем сообщение если ничего не найдено
             if len(result) == 0 and (genre != "Выберите жанр" or author != "Выберите автора" or year != "Выберите год" or rack != "Выберите стеллаж"):
@@ -1726,45 +2501,50 @@ class LibraryApp:
                                   f"{'• Автор: ' + author if author != 'Выберите автора' else ''}\n"
                                   f"{'• Год: ' + year if year != 'Выберите год' else ''}\n"
                                   f"{'• Стеллаж: ' + rack if rack != 'Выберите стеллаж' else ''}")
-                print("НИЧЕГО НЕ НАЙДЕНО!")
-            
-            print("="*50 + "\n")
-            
-        except ValueError as ve:
-            print(f"Ошибка значения: {ve}")
-            messagebox.showwarning("Ошибка", "Укажите корректный год издания!")
-        except Error as e:
-            print(f"Ошибка при комбинированной фильтрации: {e}")
+        
+        def failed(e):
+            log.error("Ошибка при комбинированной фильтрации", error=e)
             messagebox.showerror("Ошибка", f"Не удалось применить фильтр: {str(e)}")
+        
+        self.status_bar.config(text="Применение фильтра...")
+        if skip_query:
+            log.debug("По кэшу фильтров книг нет, запрос к БД не выполняется")
+            self.executor.cancel("view")
+            show([])
+            return
+        
+        # Без запроса к БД, если построен индекс каталога в памяти
+        books = self.filter_in_memory(criteria, 'rack, shelf, title')
+        if books is not None:
+            show(books)
+            return
+        
+        self.query_view(('filter', criteria, 'rack, shelf, title'), query, show, failed)
 
     def filter_by_author(self, selected_author):
         """Фильтрация по выбранному автору"""
         if selected_author == "Выберите автора":
             return
         
-        try:
-            query = "SELECT * FROM books WHERE author = %s ORDER BY title"
-            self.cursor.execute(query, (selected_author,))
-            books = self.cursor.fetchall()
-            
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            self.update_table(result)
+        def query():
+            """Запрос к БД (выполняется в фоне)"""
+            return self.storage.filter_books({'author': selected_author}, order_by='title')
+        
+        def show(result):
+            self.update_table(result, view=('filter', {'author': selected_author}, 'title'))
             self.status_bar.config(text=f"Найдено книг автора '{selected_author}': {len(result)}")
-            
-        except Error as e:
-            print(f"Ошибка при фильтрации по автору: {e}")
+        
+        def failed(e):
+            log.error("Ошибка при фильтрации по автору", error=e)
             messagebox.showerror("Ошибка", f"Не удалось применить фильтр: {str(e)}")
+        
+        # Без запроса к БД, если построен индекс каталога в памяти
+        books = self.filter_in_memory({'author': selected_author}, 'title')
+        if books is not None:
+            show(books)
+            return
+        
+        self.query_view(('filter', {'author': selected_author}, 'title'), query, show, failed)
 
     def filter_by_year(self, selected_year):
         """Фильтрация по выбранному году"""
@@ -1773,162 +2553,271 @@ class LibraryApp:
         
         try:
             year = int(selected_year)
-            query = "SELECT * FROM books WHERE year = %s ORDER BY title"
-            self.cursor.execute(query, (year,))
-            books = self.cursor.fetchall()
-            
-            result = []
-            for i, book in enumerate(books, start=1):
-                book_dict = {}
-                for key, value in book.items():
-                    if key == 'id':
-                        book_dict[key] = i
-                    elif hasattr(value, 'isoformat'):
-                        book_dict[key] = value.isoformat()
-                    else:
-                        book_dict[key] = str(value) if value is not None else ""
-                result.append(book_dict)
-            
-            self.update_table(result)
-            self.status_bar.config(text=f"Найдено книг за {selected_year} год: {len(result)}")
-            
         except ValueError:
             messagebox.showwarning("Ошибка", "Выберите корректный год!")
-        except Error as e:
-            print(f"Ошибка при фильтрации по году: {e}")
+            return
+        
+        def query():
+            """Запрос к БД (выполняется в фоне)"""
+            return self.storage.filter_books({'year': year}, order_by='title')
+        
+        def show(result):
+            self.update_table(result, view=('filter', {'year': year}, 'title'))
+            self.status_bar.config(text=f"Найдено книг за {selected_year} год: {len(result)}")
+        
+        def failed(e):
+            log.error("Ошибка при фильтрации по году", error=e)
             messagebox.showerror("Ошибка", f"Не удалось применить фильтр: {str(e)}")
+        
+        # Без запроса к БД, если построен индекс каталога в памяти
+        books = self.filter_in_memory({'year': year}, 'title')
+        if books is not None:
+            show(books)
+            return
+        
+        self.query_view(('filter', {'year': year}, 'title'), query, show, failed)
 
-    def clear_filters(self):
+    def clear_filters(self, on_loaded=None):
         """Очистка всех фильтров"""
         self.genre_var.set("Выберите жанр")
         self.author_var.set("Выберите автора")
         self.year_var.set("Выберите год")
+        self.rack_var.set("Выберите стеллаж")
         self.isbn_entry.delete(0, tk.END)
         
-        # Перезагружаем данные
-        self.books = self.load_data_from_db()
-        self.update_table()
-        self.status_bar.config(text="Все фильтры очищены. Отображены все книги.")
+        def loaded():
+            self.status_bar.config(text="Все фильтры очищены. Отображены все книги.")
+            if on_loaded:
+                on_loaded()
+        
+        self.show_fresh_catalog(on_loaded=loaded)
 
     def show_all_books(self):
         """Показать все книги"""
-        self.books = self.load_data_from_db()
-        self.update_table()
-        self.clear_filters()
-        self.status_bar.config(text=f"Отображены все книги. Всего: {len(self.books)}")
+        self.clear_filters(on_loaded=lambda: self.status_bar.config(
+            text=f"Отображены все книги. Всего: {len(self.books)}"))
 
     def reset_search_filters(self):
         """Сброс всех фильтров и поиска"""
         self.search_entry.delete(0, tk.END)
         self.filter_entry.delete(0, tk.END)
-        self.books = self.load_data_from_db()
+        self.show_fresh_catalog(on_loaded=lambda: self.status_bar.config(
+            text="Все фильтры сброшены. Отображены все книги."))
+
+    def show_fresh_catalog(self, on_loaded=None):
+        """Показ каталога из памяти с обновлением по изменениям
+
+        Пока каталог не загружен (нет метки), он загружается целиком.
+        """
+        if self.refresh_watermark is None or not self.storage:
+            self.reload_catalog(on_loaded=on_loaded)
+            return
+        
+        def refreshed(changes):
+            if on_loaded:
+                on_loaded()
+        
+        def failed(e):
+            # Показан каталог из памяти, он обновится при следующей попытке
+            if on_loaded:
+                on_loaded()
+        
+        self.executor.cancel("view")
         self.update_table()
-        self.status_bar.config(text="Все фильтры сброшены. Отображены все книги.")
+        self.refresh_changes(on_done=refreshed, on_error=failed)
 
     def refresh_catalog(self):
-        """Обновление каталога книг из базы данных"""
-        try:
-            # Перезагружаем данные из базы
-            self.books = self.load_data_from_db()
-            self.update_table()
+        """Обновление каталога книг из базы данных
+
+        Явное обновление всегда загружает каталог целиком и заново
+        синхронизирует фасеты, индексы и кэш запросов; изменения с прошлой
+        метки читаются только фоновым обновлением и при сбросе фильтров.
+        """
+        self.executor.cancel("refresh")
+        
+        def loaded():
             self.clear_form()
             self.status_bar.config(text=f"Каталог обновлен. Всего книг: {len(self.books)}")
             messagebox.showinfo("Обновление", "Каталог книг успешно обновлен из базы данных!")
-        except Exception as e:
+        
+        def failed(e):
             messagebox.showerror("Ошибка", f"Не удалось обновить каталог: {str(e)}")
+        
+        # Перезагружаем данные и списки фильтров из базы (в фоне)
+        self.status_bar.config(text="Обновление каталога...")
+        self.reload_catalog(on_loaded=loaded, on_error=failed)
+        self.resync_caches()
 
     def export_data(self):
         """Экспорт данных в файл"""
-        if not self.books:
+        if not self.storage and not self.books:
             messagebox.showwarning("Ошибка", "Нет данных для экспорта!")
             return
 
+        # Если показан результат фильтра, можно выгрузить только его
+        view = None
+        if self.storage and not self.showing_catalog and self.current_view is not None:
+            answer = messagebox.askyesnocancel(
+                "Экспорт",
+                "Экспортировать только книги текущего фильтра?\n\n"
+                "Да - текущий фильтр, Нет - весь каталог"
+            )
+            if answer is None:
+                return
+            if answer:
+                view = self.current_view
+
         file_path = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("JSON Lines (компактно)", "*.jsonl *.ndjson"),
+                       ("All files", "*.*")]
         )
 
-        if file_path:
-            try:
-                # Убираем поля created_at и updated_at для экспорта
-                export_books = []
-                for book in self.books:
-                    export_book = {k: v for k, v in book.items() 
-                                 if k not in ['created_at', 'updated_at']}
-                    export_books.append(export_book)
-                
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    json.dump(export_books, file, ensure_ascii=False, indent=2)
-                
-                messagebox.showinfo("Успех", f"Данные успешно экспортированы в файл:\n{file_path}")
-                self.status_bar.config(text=f"Данные экспортированы в: {os.path.basename(file_path)}")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось экспортировать данные: {str(e)}")
+        if not file_path:
+            return
+
+        file_name = os.path.basename(file_path)
+        ndjson = file_path.lower().endswith((".jsonl", ".ndjson"))
+
+        def export_records(books):
+            # Убираем служебные поля created_at, updated_at и isbn13 для экспорта
+            for book in books:
+                yield {k: v for k, v in book.items() if k not in ['created_at', 'updated_at', 'isbn13']}
+
+        def show_progress(count):
+            self.status_bar.config(text=f"Экспорт в {file_name}: записано {count} книг...")
+
+        def stream_books():
+            """Книги из БД пачками по небуферизованному курсору"""
+            count = 0
+            for chunk in self.storage.iter_books(view):
+                yield from chunk
+                count += len(chunk)
+                self.executor.post(show_progress, count)
+
+        def write_all():
+            """Запись файла (выполняется в фоне)"""
+            books = stream_books() if self.storage else list(self.books)
+            with open(file_path, 'w', encoding='utf-8') as file:
+                return write_json_records(file, export_records(books), ndjson=ndjson)
+
+        def exported(count):
+            messagebox.showinfo("Успех", f"Экспортировано книг: {count}\nФайл:\n{file_path}")
+            self.status_bar.config(text=f"Данные экспортированы в: {file_name}")
+
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось экспортировать данные: {str(e)}")
+
+        self.status_bar.config(text=f"Экспорт в: {file_name}...")
+        self.executor.submit(write_all, on_done=exported, on_error=failed)
 
     def import_data(self):
         """Импорт данных из файла в БД"""
         file_path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("JSON Lines", "*.jsonl *.ndjson"),
+                       ("All files", "*.*")]
         )
 
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    imported_books = json.load(file)
+        if not file_path:
+            return
 
-                if not isinstance(imported_books, list):
-                    messagebox.showerror("Ошибка", "Некорректный формат данных в файле!")
-                    return
+        file_name = os.path.basename(file_path)
+        confirm = messagebox.askyesno(
+            "Подтверждение импорта",
+            f"Добавить записи из файла '{file_name}' в существующие данные?"
+        )
+        if not confirm:
+            return
 
-                confirm = messagebox.askyesno(
-                    "Подтверждение импорта",
-                    f"Найдено {len(imported_books)} записей. Добавить в существующие данные?"
+        # Сколько записей уже в БД (на случай ошибки в середине файла)
+        progress = {'added': 0}
+
+        def show_progress(added_count):
+            self.status_bar.config(text=f"Импорт из {file_name}: добавлено {added_count} записей...")
+
+        def on_batch(report):
+            """Вызывается в рабочем потоке после каждой пачки"""
+            progress['added'] = report.added
+            self.executor.post(show_progress, report.added)
+
+        def insert_all():
+            """Потоковое чтение файла и сохранение записей пачками (выполняется в фоне)"""
+            if not self.storage:
+                raise Error(msg="Нет подключения к БД")
+            # Файл (JSON-массив или NDJSON) разбирается по одной записи, в
+            # памяти держится только текущая пачка. Записи без обязательных
+            # полей пропускаются, каждая пачка - один INSERT и один коммит
+            with open(file_path, 'r', encoding='utf-8') as file:
+                return self.storage.import_books(
+                    iter_json_records(file),
+                    batch_size=self.import_config['batch_size'],
+                    on_batch=on_batch
                 )
 
-                if confirm:
-                    added_count = 0
-                    for book in imported_books:
-                        # Проверка обязательных полей
-                        if 'title' in book and 'author' in book and 'year' in book:
-                            # Сохранение в БД
-                            book_id = self.save_data_to_db(book, 'insert')
-                            if book_id:
-                                added_count += 1
-                    
-                    # Перезагружаем все данные с обновленными ID
-                    self.books = self.load_data_from_db()
-                    self.update_table()
-                    messagebox.showinfo("Успех", f"Успешно импортировано {added_count} записей!")
-                    self.status_bar.config(
-                        text=f"Импортировано {added_count} записей из: {os.path.basename(file_path)}")
-                    
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось импортировать данные: {str(e)}")
+        def imported(report):
+            # Каталог перезагружается один раз после всех пачек
+            self.reload_catalog(on_loaded=lambda: self.status_bar.config(
+                text=f"Импортировано {report.added} записей из: {file_name}"))
+            # После массового добавления фильтры и индексы перечитываются из БД
+            self.resync_caches()
+            self.show_import_report(report)
+
+        def failed(e):
+            # Уже добавленные пачки остаются в БД
+            if progress['added']:
+                self.reload_catalog()
+                self.resync_caches()
+            messagebox.showerror(
+                "Ошибка",
+                f"Не удалось импортировать данные: {str(e)}\n\n"
+                f"До ошибки добавлено записей: {progress['added']}"
+            )
+
+        self.status_bar.config(text=f"Импорт записей из: {file_name}...")
+        self.executor.submit(insert_all, on_done=imported, on_error=failed)
+
+    def show_import_report(self, report):
+        """Сообщение об итогах импорта с ошибками по пачкам"""
+        message = f"Успешно импортировано {report.added} записей!"
+        if report.skipped:
+            message += f"\nПропущено записей без обязательных полей: {report.skipped}"
+        if not report.errors:
+            messagebox.showinfo("Успех", message)
+            return
+
+        message += f"\nНе импортировано из-за ошибок: {report.failed} записей"
+        for batch_no, count, error in report.errors[:5]:
+            message += f"\n  пачка {batch_no} ({count} записей): {error}"
+        if len(report.errors) > 5:
+            message += f"\n  ... и ещё пачек с ошибками: {len(report.errors) - 5}"
+        for batch_no, count, error in report.errors:
+            log.error("Ошибка импорта пачки", batch=batch_no, records=count, error=error)
+        messagebox.showwarning("Импорт завершён с ошибками", message)
 
     def __del__(self):
-        """Закрытие соединения с БД при удалении объекта"""
-        if hasattr(self, 'cursor') and self.cursor:
-            self.cursor.close()
-        if hasattr(self, 'connection') and self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("Соединение с базой данных закрыто")
+        """Закрытие пула соединений с БД при удалении объекта"""
+        if hasattr(self, 'storage') and self.storage:
+            self.storage.close()
+            log.debug("Соединения с базой данных закрыты")
 
     def on_mousewheel(self, event):
-        """Прокрутка таблицы колесиком мыши"""
+        """Прокрутка таблицы колесиком мыши (виртуальная, по строкам каталога)"""
         try:
             # Попытка 1: Для Windows и большинства Linux
-            if event.delta:
-                self.tree.yview_scroll(int(-1 * (event.delta / 120)), "units")
-                return
+            if event.delta and event.state != 0x0100:
+                self.table.scroll(int(-1 * (event.delta / 120)) * 3)
+                return "break"
         except AttributeError:
             pass
         
         try:
             # Попытка 2: Для macOS и некоторых Linux
             if event.num == 4:
-                self.tree.yview_scroll(-1, "units")
+                self.table.scroll(-3)
+                return "break"
             elif event.num == 5:
-                self.tree.yview_scroll(1, "units")
+                self.table.scroll(3)
+                return "break"
         except AttributeError:
             pass
         
@@ -1937,47 +2826,130 @@ class LibraryApp:
             if event.state == 0x0100:  # Shift+колесико = горизонтальная прокрутка
                 self.tree.xview_scroll(-1 if event.delta > 0 else 1, "units")
             else:
-                self.tree.yview_scroll(-1 if event.delta > 0 else 1, "units")
+                self.table.scroll(-1 if event.delta > 0 else 1)
         except:
             # Если ничего не работает, просто игнорируем
             pass
+        return "break"
 
-    def update_filter_lists(self):
-        """Обновление списков в фильтрах"""
-        # Обновляем жанры
-        genres = ["Выберите жанр"] + sorted(self.get_unique_genres())
-        self.genre_menu['values'] = genres
+    def update_filter_lists(self, resync=False):
+        """Обновление списков в фильтрах
+
+        Списки берутся из кэша фасетов, который приложение само поддерживает
+        при добавлении, изменении и удалении книг. Запрос к БД выполняется
+        только при первой загрузке и при явном обновлении (resync=True).
+        """
+        if self.facets.loaded and not resync:
+            self.show_filter_lists()
+            return
+        if not self.storage:
+            return
+        
+        version = self.facets.version
         
-        # Обновляем авторов
-        authors = ["Выберите автора"] + sorted(self.get_unique_authors())
-        self.author_menu['values'] = authors
+        def query():
+            """Счётчики значений каждого фасета (выполняется в фоне)"""
+            with self.startup.phase('facets'):
+                return self.storage.facet_counts()
         
-        # Обновляем годы
-        years = ["Выберите год"] + sorted(self.get_unique_years(), reverse=True)
-        self.year_menu['values'] = years
+        def show(rows):
+            if self.facets.version != version:
+                # Пока шёл запрос, книги менялись - результат мог устареть
+                self.update_filter_lists(resync=True)
+                return
+            self.facets.load(rows)
+            log.debug("Загружены фильтры", genres=len(self.facets.counts['genre']),
+                      authors=len(self.facets.counts['author']), years=len(self.facets.counts['year']),
+                      racks=len(self.facets.counts['rack']))
+            self.show_filter_lists()
+            # Фильтры загружаются последними: запуск завершён
+            self.startup.finish(log)
+        
+        def failed(e):
+            log.error("Ошибка при загрузке фильтров", error=e)
+            self.startup.finish(log)
+        
+        self.executor.submit(query, on_done=show, on_error=failed, key="filter_lists")
+
+    def show_filter_lists(self):
+        """Заполнение списков фильтров со счётчиками
+
+        Без выбранных фильтров счётчики берутся из кэша фасетов. С ними
+        счётчики с учётом остальных выбранных значений считает индекс
+        каталога в памяти, а пока его нет - БД одним запросом в фоне;
+        списки заполняются по готовности ответа.
+        """
+        if not hasattr(self, 'filter_controls'):
+            return
+        selected = self.selected_filters()
+        counts = self.facets.drill_down(selected)
+        if counts is None and self.catalog_index is not None:
+            counts = self.facets.store(selected, self.facets.version,
+                                       self.catalog_index.facet_counts(selected, FACETS))
+        if counts is not None:
+            self.executor.cancel("drill_down")
+            self.fill_filter_lists(counts)
+            return
+        if not self.storage:
+            return
+        
+        version = self.facets.version
+        
+        def query():
+            """Счётчики фасетов при выбранных фильтрах (выполняется в фоне)"""
+            return self.storage.facet_counts(selected)
+        
+        def show(rows):
+            counts = self.facets.store(selected, version, rows)
+            if self.selected_filters() == selected:
+                self.fill_filter_lists(counts)
+        
+        def failed(e):
+            log.error("Ошибка при подсчёте фильтров", error=e)
+        
+        self.executor.submit(query, on_done=show, on_error=failed, key="drill_down")
+
+    def fill_filter_lists(self, counts):
+        """Значения списков фильтров: {фасет: [(значение, количество), ...]}"""
+        for facet, (var, menu, placeholder) in self.filter_controls.items():
+            labels = {f"{value} ({count})": value for value, count in counts[facet]}
+            self.filter_labels[facet] = labels
+            menu['values'] = [placeholder] + list(labels)
+
+    def selected_filters(self):
+        """Значения, выбранные в фильтрах поиска: {фасет: значение}"""
+        selected = {}
+        for facet, (var, menu, placeholder) in self.filter_controls.items():
+            value = var.get()
+            if value and value != placeholder:
+                selected[facet] = value
+        return selected
+
+    def on_filter_changed(self, facet):
+        """Изменение значения фильтра (trace_add): пересчёт остальных списков
+
+        При выборе из списка в поле сначала попадает подпись со счётчиком;
+        по ней не считается ничего - on_filter_selected заменит её значением.
+        """
+        if self.filter_controls[facet][0].get() in self.filter_labels[facet]:
+            return
+        self.show_filter_lists()
 
-    def get_unique_racks(self):
-        """Получение уникальных стеллажей из БД"""
-        try:
-            query = "SELECT DISTINCT rack FROM books WHERE rack IS NOT NULL AND rack != '' ORDER BY rack"
-            self.cursor.execute(query)
-            racks = []
-            for row in self.cursor.fetchall():
-                rack = row['rack']
-                if rack and rack.strip():
-                    clean_rack = rack.strip().upper()
-                    if clean_rack not in racks:
-                        racks.append(clean_rack)
-            print(f"Получено уникальных стеллажей: {len(racks)}")
-            return racks
-        except Error as e:
-            print(f"Ошибка при получении стеллажей: {e}")
-            return []
+    def on_filter_selected(self, facet):
+        """Выбор значения в списке фильтра: в поле остаётся значение без счётчика"""
+        var = self.filter_controls[facet][0]
+        value = self.filter_labels[facet].get(var.get())
+        if value is not None:
+            # Установка значения пересчитывает остальные списки (trace_add)
+            var.set(value)
 
 
 def main():
+    startup = StartupProfile(STARTED)
+    startup.mark('imports')
     root = tk.Tk()
-    app = LibraryApp(root)
+    startup.mark('window')
+    app = LibraryApp(root, startup)
     root.mainloop()
 
 
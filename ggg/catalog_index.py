@@ -0,0 +1,257 @@
+"""Колоночный индекс каталога в памяти для фильтрации без запросов к БД
+
+Колонки фильтров хранятся со словарным кодированием: каждое значение
+заменяется номером в словаре колонки. Если установлен NumPy, коды лежат
+в массивах int32, а комбинированный фильтр - это побитовое И масок
+сравнения массивов с кодами. Без NumPy для каждого кода хранится
+множество позиций строк; фильтр берёт самое короткое из них и проверяет
+остальные условия по спискам кодов.
+
+NumPy импортируется при построении первого индекса, а не при импорте
+модуля: индекс строится в фоне, и импорт не задерживает запуск окна.
+"""
+from facets import facet_value
+
+
+# Модуль numpy после load_numpy (None - не установлен или ещё не загружен)
+np = None
+_numpy_loaded = False
+
+
+INDEX_COLUMNS = ('genre', 'author', 'rack', 'shelf', 'year', 'quantity')
+
+
+def index_key(column, value):
+    """Ключ значения в словаре колонки
+
+    Сравнение, как у MySQL с регистронезависимой сортировкой: без учёта
+    регистра и пробелов по краям.
+    """
+    if column in ('genre', 'author', 'rack', 'year'):
+        value = facet_value(column, value)
+    elif value is not None:
+        value = str(value).strip() or None
+    return value.casefold() if value is not None else None
+
+
+def sort_key(value):
+    """Ключ сортировки значения, как ORDER BY с utf8mb4_unicode_ci: без учёта регистра"""
+    return str(value or "").casefold()
+
+
+def load_numpy():
+    """Импорт NumPy при первом обращении; None, если он не установлен"""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_loaded = True
+    return np
+
+
+class ArrayColumn:
+    """Коды значений в массиве NumPy (ёмкость растёт удвоением)"""
+
+    def __init__(self, codes):
+        self.data = np.full(max(16, len(codes) * 2), -1, dtype=np.int32)
+        self.data[:len(codes)] = codes
+
+    def set(self, position, code, old_code=None):
+        if position >= len(self.data):
+            grown = np.full(max(position + 1, len(self.data) * 2), -1, dtype=np.int32)
+            grown[:len(self.data)] = self.data
+            self.data = grown
+        self.data[position] = code
+
+    def clear(self, position, code):
+        self.data[position] = -1
+
+    def mask(self, code, size):
+        return self.data[:size] == code
+
+
+class PostingColumn:
+    """Множество позиций строк для каждого кода значения"""
+
+    def __init__(self, codes):
+        self.postings = {}
+        for position, code in enumerate(codes):
+            self.postings.setdefault(code, set()).add(position)
+
+    def set(self, position, code, old_code=None):
+        if old_code is not None:
+            self.clear(position, old_code)
+        self.postings.setdefault(code, set()).add(position)
+
+    def clear(self, position, code):
+        self.postings.get(code, set()).discard(position)
+
+    def positions(self, code):
+        return self.postings.get(code, ())
+
+
+class CatalogIndex:
+    """Строки каталога и закодированные колонки фильтров
+
+    Удалённая строка только помечается (позиция освобождается), при
+    большом числе удалённых строк индекс уплотняется. Приложение
+    поддерживает индекс своими изменениями (add/update/remove).
+    """
+
+    def __init__(self, rows=(), use_numpy=None):
+        self.use_numpy = (use_numpy is None or bool(use_numpy)) and load_numpy() is not None
+        self.rows = list(rows)
+        self.positions = {row.get('id'): position for position, row in enumerate(self.rows)}
+        self.dictionaries = {column: {} for column in INDEX_COLUMNS}
+        # Значение, под которым код впервые встретился: код -> значение
+        self.labels = {column: [] for column in INDEX_COLUMNS}
+        self.codes = {
+            column: [self._encode(column, row.get(column)) for row in self.rows]
+            for column in INDEX_COLUMNS
+        }
+        column_class = ArrayColumn if self.use_numpy else PostingColumn
+        self.columns = {column: column_class(self.codes[column]) for column in INDEX_COLUMNS}
+        if self.use_numpy:
+            self.live = np.zeros(max(16, len(self.rows) * 2), dtype=bool)
+            self.live[:len(self.rows)] = True
+        self.deleted = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, row):
+        """Добавление строки книги"""
+        position = len(self.rows)
+        self.rows.append(row)
+        self.positions[row.get('id')] = position
+        for column in INDEX_COLUMNS:
+            code = self._encode(column, row.get(column))
+            self.codes[column].append(code)
+            self.columns[column].set(position, code)
+        if self.use_numpy:
+            if position >= len(self.live):
+                grown = np.zeros(len(self.live) * 2, dtype=bool)
+                grown[:len(self.live)] = self.live
+                self.live = grown
+            self.live[position] = True
+
+    def update(self, book_id, row):
+        """Замена строки книги с перекодированием изменившихся колонок"""
+        position = self.positions.get(book_id)
+        if position is None:
+            self.add(row)
+            return
+        self.rows[position] = row
+        for column in INDEX_COLUMNS:
+            code = self._encode(column, row.get(column))
+            old_code = self.codes[column][position]
+            if code != old_code:
+                self.columns[column].set(position, code, old_code)
+                self.codes[column][position] = code
+
+    def remove(self, book_id):
+        """Удаление строки книги"""
+        position = self.positions.pop(book_id, None)
+        if position is None:
+            return
+        self.rows[position] = None
+        for column in INDEX_COLUMNS:
+            self.columns[column].clear(position, self.codes[column][position])
+        if self.use_numpy:
+            self.live[position] = False
+        self.deleted += 1
+        if self.deleted > 1000 and self.deleted > len(self.positions):
+            self._compact()
+
+    def filter(self, criteria, order_by=None):
+        """Строки, у которых колонки равны значениям criteria
+
+        order_by - колонки сортировки через запятую, как в ORDER BY;
+        без него строки идут в порядке индекса.
+        """
+        conditions = []
+        for column, value in criteria.items():
+            code = self.dictionaries[column].get(index_key(column, value))
+            if code is None:
+                return []
+            conditions.append((column, code))
+
+        if self.use_numpy:
+            positions = np.flatnonzero(self._mask(conditions)).tolist()
+        else:
+            positions = sorted(self._positions(conditions))
+
+        result = [self.rows[position] for position in positions]
+        if order_by:
+            columns = [column.strip() for column in order_by.split(',')]
+            result.sort(key=lambda row: tuple(sort_key(row.get(column)) for column in columns))
+        return result
+
+    def facet_counts(self, selected, facets):
+        """Счётчики значений фасетов среди строк, подходящих под остальные выбранные
+
+        selected - {колонка: значение}. Возвращает {фасет: [(значение,
+        количество), ...]}, значение - в том виде, в каком оно впервые
+        встретилось в каталоге (как строки COUNT(*) ... GROUP BY).
+        """
+        conditions = {}
+        for column, value in selected.items():
+            code = self.dictionaries[column].get(index_key(column, value))
+            if code is None:
+                return {facet: [] for facet in facets}
+            conditions[column] = code
+
+        counts = {}
+        for facet in facets:
+            others = [(column, code) for column, code in conditions.items() if column != facet]
+            labels = self.labels[facet]
+            if self.use_numpy:
+                codes = self.columns[facet].data[:len(self.rows)][self._mask(others)]
+                counted = enumerate(np.bincount(codes, minlength=len(labels)).tolist())
+            else:
+                facet_codes = self.codes[facet]
+                counter = {}
+                for position in self._positions(others):
+                    code = facet_codes[position]
+                    counter[code] = counter.get(code, 0) + 1
+                counted = counter.items()
+            counts[facet] = [(labels[code], count) for code, count in counted if count]
+        return counts
+
+    def _mask(self, conditions):
+        """Маска живых строк, у которых совпадают все коды условий (NumPy)"""
+        size = len(self.rows)
+        mask = self.live[:size]
+        for column, code in conditions:
+            mask = mask & self.columns[column].mask(code, size)
+        return mask
+
+    def _positions(self, conditions):
+        """Позиции строк, у которых совпадают все коды условий (без NumPy)"""
+        if not conditions:
+            return self.positions.values()
+        # Самое короткое множество позиций, остальные условия - по кодам
+        column, code = min(conditions, key=lambda item: len(self.columns[item[0]].positions(item[1])))
+        others = [(self.codes[other], other_code) for other, other_code in conditions
+                  if (other, other_code) != (column, code)]
+        return [position for position in self.columns[column].positions(code)
+                if all(codes[position] == other_code for codes, other_code in others)]
+
+    def _encode(self, column, value):
+        """Код значения в словаре колонки (новые значения добавляются)"""
+        dictionary = self.dictionaries[column]
+        key = index_key(column, value)
+        code = dictionary.get(key)
+        if code is None:
+            code = len(dictionary)
+            dictionary[key] = code
+            self.labels[column].append(value)
+        return code
+
+    def _compact(self):
+        """Перестроение без удалённых строк"""
+        compacted = CatalogIndex([row for row in self.rows if row is not None], self.use_numpy)
+        self.__dict__.update(compacted.__dict__)
@@ -0,0 +1,154 @@
+"""Кэш фасетов каталога: значения жанров, авторов, годов и стеллажей для фильтров"""
+from collections import Counter
+
+
+FACETS = ('genre', 'author', 'year', 'rack')
+
+
+def facet_value(facet, value):
+    """Значение фасета в том виде, в каком оно показывается в фильтре (None - пустое)"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or (facet == 'year' and text == '0'):
+        return None
+    if facet == 'rack':
+        return text.upper()
+    return text
+
+
+def selected_values(selected):
+    """Выбранные значения фасетов в виде фильтра: {фасет: значение}"""
+    values = {}
+    for facet in FACETS:
+        if facet in selected:
+            value = facet_value(facet, selected[facet])
+            if value is not None:
+                values[facet] = value
+    return values
+
+
+def ordered(facet, counter):
+    """Непустые значения со счётчиками в порядке списка фильтра (годы - по убыванию)"""
+    items = [(value, count) for value, count in counter.items() if value is not None and count > 0]
+    return sorted(items, reverse=(facet == 'year'))
+
+
+def counted(facet, rows):
+    """Счётчик из строк (значение, количество); значения приводятся к виду фильтра"""
+    counter = Counter()
+    for value, count in rows:
+        counter[facet_value(facet, value)] += count
+    return counter
+
+
+class FacetCache:
+    """Счётчики книг по значениям каждого фасета
+
+    Загружается запросами по каждому фасету (LibraryStorage.facet_counts),
+    а затем поддерживается изменениями, которые делает само приложение:
+    add/remove/update книги меняют счётчики без обращения к БД. Полная
+    пересинхронизация нужна только при явном обновлении каталога.
+
+    Счётчики с учётом выбранных фильтров считает БД (тот же facet_counts
+    с выбранными значениями); последний результат хранится, пока книги
+    не менялись.
+
+    version увеличивается при каждом изменении, по нему видно, что данные,
+    загруженные в фоне, могли устареть за время запроса.
+    """
+
+    def __init__(self):
+        self.counts = {facet: Counter() for facet in FACETS}
+        self.loaded = False
+        self.version = 0
+        # (выбранные значения, версия, {фасет: [(значение, количество), ...]})
+        self.drilled = None
+
+    def load(self, counts):
+        """Полная загрузка из {фасет: [(значение, количество), ...]}"""
+        for facet in FACETS:
+            self.counts[facet] = counted(facet, counts.get(facet, ()))
+        self.loaded = True
+        self.version += 1
+
+    def book_key(self, book):
+        """Значения фасетов книги"""
+        return tuple(facet_value(facet, book.get(facet)) for facet in FACETS)
+
+    def add(self, book):
+        """Учёт добавленной книги"""
+        self._change(self.book_key(book), 1)
+        self.version += 1
+
+    def remove(self, book):
+        """Учёт удалённой книги"""
+        self._change(self.book_key(book), -1)
+        self.version += 1
+
+    def update(self, old_book, new_book):
+        """Учёт изменения книги"""
+        old_key = self.book_key(old_book)
+        new_key = self.book_key(new_book)
+        if old_key != new_key:
+            self._change(old_key, -1)
+            self._change(new_key, 1)
+            self.version += 1
+
+    def values(self, facet):
+        """Непустые значения фасета в порядке списка фильтра"""
+        return [value for value, _ in ordered(facet, self.counts[facet])]
+
+    def drill_down(self, selected):
+        """Значения каждого фасета со счётчиками с учётом выбранных фильтров
+
+        selected - {фасет: значение}. Без выбранных значений счётчики берутся
+        из кэша, с ними - из последнего результата запроса с теми же
+        значениями (store), если книги с тех пор не менялись. None - без
+        запроса к БД счётчики неизвестны.
+        Возвращает {фасет: [(значение, количество), ...]}.
+        """
+        values = selected_values(selected)
+        if not values:
+            return {facet: ordered(facet, counter) for facet, counter in self.counts.items()}
+        if self.drilled is not None and self.drilled[:2] == (values, self.version):
+            return self.drilled[2]
+        return None
+
+    def store(self, selected, version, counts):
+        """Результат запроса счётчиков для выбранных значений, начатого при version
+
+        Возвращает счётчики в виде drill_down; в кэше результат остаётся,
+        только если книги за время запроса не менялись.
+        """
+        result = {facet: ordered(facet, counted(facet, counts.get(facet, ())))
+                  for facet in FACETS}
+        if version == self.version:
+            self.drilled = (selected_values(selected), version, result)
+        return result
+
+    def count(self, selected):
+        """Число книг, подходящих под все выбранные значения фасетов
+
+        None - без запроса к БД неизвестно. Ноль известен сразу, если
+        какого-то из выбранных значений нет ни у одной книги.
+        """
+        values = selected_values(selected)
+        if not values:
+            return None
+        if any(self.counts[facet][value] <= 0 for facet, value in values.items()):
+            return 0
+        counts = self.drill_down(values)
+        if counts is None:
+            return None
+        # Счётчик выбранного значения посчитан при всех остальных выбранных
+        facet, value = next(iter(values.items()))
+        return dict(counts[facet]).get(value, 0)
+
+    def _change(self, key, delta):
+        """Изменение счётчиков значений книги"""
+        for facet, value in zip(FACETS, key):
+            counter = self.counts[facet]
+            counter[value] += delta
+            if counter[value] <= 0:
+                del counter[value]
@@ -0,0 +1,76 @@
+"""Нормализация ISBN: ключ ISBN-13 для уникального индекса и поиска
+
+В колонке isbn хранится значение в том виде, в каком его ввели
+(с дефисами, ISBN-10 или ISBN-13), а в isbn13 - 13 цифр без
+разделителей. ISBN-10 переводится в ISBN-13 с префиксом 978.
+"""
+import re
+
+
+_separators_re = re.compile(r"[\s\-‐‑–—.]")
+
+
+def clean_isbn(text):
+    """ISBN без пробелов и дефисов, X - в верхнем регистре"""
+    return _separators_re.sub("", str(text or "")).upper()
+
+
+def isbn10_check_digit(first9):
+    """Контрольная цифра ISBN-10 (0-9 или X)"""
+    total = sum((10 - i) * int(digit) for i, digit in enumerate(first9))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def isbn13_check_digit(first12):
+    """Контрольная цифра ISBN-13"""
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(text):
+    """Ключ ISBN-13 или None, если это не ISBN с верной контрольной цифрой"""
+    isbn = clean_isbn(text)
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == "X"):
+        if isbn10_check_digit(isbn[:9]) != isbn[9]:
+            return None
+        first12 = "978" + isbn[:9]
+        return first12 + isbn13_check_digit(first12)
+    if len(isbn) == 13 and isbn.isdigit() and isbn[:3] in ("978", "979"):
+        if isbn13_check_digit(isbn[:12]) != isbn[12]:
+            return None
+        return isbn
+    return None
+
+
+def isbn_key(text):
+    """Значение колонки isbn13 для введённого ISBN (или None)
+
+    Ключ есть только у ISBN с верной контрольной цифрой: номер с ошибкой
+    не должен совпасть по ключу с другой книгой и запретить её
+    добавление. Такие номера из старых данных ищутся по колонке isbn.
+    """
+    return normalize_isbn(text)
+
+
+def isbn_lookup(text, min_prefix=3):
+    """Как искать введённый ISBN: (точный ключ, [префиксы ключа])
+
+    Полный ISBN даёт точный ключ. Начало ISBN (только цифры) даёт
+    префиксы: как начало ISBN-13 (если оно начинается с 978 или 979) и,
+    если цифр не больше девяти, как начало ISBN-10 (ключ такой книги
+    начинается с 978). Если ни то ни
+    другое не подходит, возвращается (None, []).
+    """
+    key = isbn_key(text)
+    if key:
+        return key, []
+    digits = clean_isbn(text)
+    if len(digits) < min_prefix or not digits.isdigit():
+        return None, []
+    prefixes = []
+    if len(digits) < 13 and digits[:3] in ("978", "979"):
+        prefixes.append(digits)
+    if len(digits) <= 9:
+        prefixes.append("978" + digits)
+    return None, prefixes
@@ -0,0 +1,160 @@
+"""Потоковые чтение и запись JSON: записи по одной, без загрузки всего файла в память
+
+Поддерживаются два формата файлов импорта и экспорта:
+  - JSON-массив [ {...}, {...}, ... ] - элементы разбираются по мере чтения;
+  - JSON Lines / NDJSON - по одному объекту на строку (и вообще любая
+    последовательность JSON-значений, разделённых пробелами).
+В памяти одновременно находится только текущий блок файла и одна запись.
+"""
+import json
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Наибольший размер одной записи: буфер не растёт дальше этого
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+# Ошибка разбора ближе этого к концу буфера может означать, что
+# значение оборвалось на границе блока (\uXXXX, false, 1e-5 и т.п.)
+_TAIL_MARGIN = 16
+
+_decoder = json.JSONDecoder()
+
+
+class JSONStreamError(ValueError):
+    """Ошибка формата в потоке JSON (с позицией от начала файла)"""
+
+
+class _Reader:
+    """Буфер поверх файла: текст подчитывается блоками по мере надобности"""
+
+    def __init__(self, file, chunk_size, max_record_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.max_record_size = max_record_size
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def fill(self):
+        """Подчитывание следующего блока; False, если файл закончился"""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Уже разобранная часть буфера отбрасывается
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Следующий значащий символ (пробелы пропускаются) или '' в конце файла"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def near_end(self, pos):
+        """Позиция так близко к концу буфера, что значение могло оборваться"""
+        return not self.eof and pos >= len(self.buffer) - _TAIL_MARGIN
+
+    def grow(self):
+        """Подчитывание блока для недочитанного значения (с ограничением размера)"""
+        if len(self.buffer) - self.pos > self.max_record_size:
+            raise self.error(f"Запись длиннее {self.max_record_size} символов")
+        return self.fill()
+
+    def value(self):
+        """Разбор одного JSON-значения с текущей позиции
+
+        Если значение оборвалось на границе блока, подчитывается следующий
+        блок и разбор повторяется. Ошибка в середине буфера - это ошибка в
+        самом файле, о ней сообщается сразу.
+        """
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Незакрытая строка указывает на своё начало, а не на конец буфера
+                truncated = self.near_end(e.pos) or e.msg.startswith("Unterminated string")
+                if truncated and self.grow():
+                    continue
+                raise JSONStreamError(f"Ошибка JSON в позиции {self.offset + e.pos}: {e.msg}") from None
+            # Число в конце буфера может продолжаться в следующем блоке
+            if self.near_end(end) and self.grow():
+                continue
+            self.pos = end
+            return value
+
+    def error(self, message):
+        return JSONStreamError(f"{message} (позиция {self.offset + self.pos})")
+
+
+def iter_json_records(file, chunk_size=CHUNK_SIZE, max_record_size=MAX_RECORD_SIZE):
+    """Записи из открытого текстового файла: элементы массива или строки NDJSON
+
+    Запись длиннее max_record_size символов считается ошибкой формата.
+    """
+    reader = _Reader(file, chunk_size, max_record_size)
+    first = reader.peek()
+    if first == "[":
+        reader.pos += 1
+        yield from _iter_array(reader)
+    else:
+        yield from _iter_sequence(reader)
+
+
+def _iter_array(reader):
+    """Элементы JSON-массива верхнего уровня"""
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        if reader.peek() == "":
+            raise reader.error("Файл закончился внутри массива")
+        yield reader.value()
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "]":
+            break
+        if separator != ",":
+            reader.pos -= 1
+            raise reader.error("Ожидалась ',' или ']'")
+    if reader.peek() != "":
+        raise reader.error("Лишние данные после массива")
+
+
+def _iter_sequence(reader):
+    """Значения, разделённые пробелами и переводами строк (NDJSON)"""
+    while reader.peek() != "":
+        yield reader.value()
+
+
+def write_json_records(file, records, ndjson=False):
+    """Запись записей в файл по одной; возвращает их количество
+
+    JSON-массив записывается в том же виде, что и json.dump(..., indent=2),
+    NDJSON - компактно, по одной записи на строку.
+    """
+    count = 0
+    if ndjson:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            file.write("\n")
+            count += 1
+        return count
+
+    for record in records:
+        file.write(",\n  " if count else "[\n  ")
+        # Переводы строк внутри значений экранированы, поэтому сдвиг безопасен
+        file.write(json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+        count += 1
+    file.write("\n]" if count else "[]")
+    return count
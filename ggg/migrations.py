@@ -0,0 +1,343 @@
+"""Версии схемы каталога в MySQL и их применение
+
+Изменения схемы - пронумерованные миграции (MIGRATIONS), каждая
+применяется один раз. Номера применённых хранятся в таблице
+schema_version. При запуске схему проверяет один запрос (schema_state):
+он возвращает версию и наличие необязательных объектов (триггер
+удалений, полнотекстовый индекс).
+
+Если версия отстаёт, миграции выполняются под именованной блокировкой
+сервера (GET_LOCK на имя базы). Приложения, запущенные одновременно на
+нескольких рабочих местах, ждут того, кто начал первым. Получив
+блокировку, они видят уже новую версию, и DDL над одной таблицей
+наперегонки не выполняется.
+
+DDL в MySQL фиксирует транзакцию сразу, поэтому миграция и запись о ней
+не атомарны. Миграции проверяют, что уже сделано, и прерванную можно
+выполнить заново. Это же даёт версию базам, созданным до schema_version:
+первые миграции повторяют прежние проверки схемы при запуске.
+"""
+import time
+from contextlib import contextmanager
+
+from mysql.connector import Error, errorcode
+
+from applog import get_logger
+from isbn import isbn_key, normalize_isbn
+from query_log import TimedCursor
+
+
+log = get_logger("migrations")
+
+# Имя блокировки изменения схемы (к нему добавляется имя базы)
+SCHEMA_LOCK = "library_schema."
+
+# Сколько секунд ждать, пока схему изменяет другое приложение
+LOCK_TIMEOUT = 120
+
+# Запись в schema_version о неудачной попытке создать FULLTEXT-индекс
+# (номер меньше любой миграции и не влияет на версию схемы). Пока она
+# есть, при запуске индекс не создаётся заново; чтобы повторить попытку
+# (например, после установки парсера ngram), запись нужно удалить
+FULLTEXT_ATTEMPT = -1
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Версия схемы и необязательные объекты одним запросом
+SCHEMA_STATE_QUERY = """
+SELECT
+    (SELECT MAX(version) FROM schema_version) AS version,
+    EXISTS(SELECT 1 FROM information_schema.TRIGGERS
+           WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = 'trg_books_deleted') AS has_trigger,
+    EXISTS(SELECT 1 FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'books'
+             AND INDEX_NAME = 'ft_books_text') AS has_fulltext,
+    EXISTS(SELECT 1 FROM schema_version WHERE version = %s) AS fulltext_failed
+"""
+
+
+def create_books(cursor):
+    """Таблица книг"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS books (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        author VARCHAR(255) NOT NULL,
+        year INT NOT NULL,
+        genre VARCHAR(100),
+        publisher VARCHAR(255),
+        isbn VARCHAR(20),
+        quantity INT DEFAULT 1,
+        rack VARCHAR(10) DEFAULT '',
+        shelf VARCHAR(10) DEFAULT '',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def split_location(cursor):
+    """Старая колонка location ("стеллаж-полка") делится на rack и shelf"""
+    cursor.execute("SHOW COLUMNS FROM books LIKE 'location'")
+    if not cursor.fetchall():
+        return
+
+    cursor.execute("SHOW COLUMNS FROM books LIKE 'shelf'")
+    if not cursor.fetchall():
+        cursor.execute("ALTER TABLE books ADD COLUMN shelf VARCHAR(10) DEFAULT ''")
+        log.info("Добавлена колонка", column='shelf')
+
+    cursor.execute("SHOW COLUMNS FROM books LIKE 'rack'")
+    if not cursor.fetchall():
+        cursor.execute("ALTER TABLE books ADD COLUMN rack VARCHAR(10) DEFAULT ''")
+        log.info("Добавлена колонка", column='rack')
+
+    # Переносим данные из location в новые колонки
+    cursor.execute("""
+        UPDATE books
+        SET rack = SUBSTRING_INDEX(location, '-', 1),
+            shelf = SUBSTRING_INDEX(location, '-', -1)
+        WHERE location LIKE '%-%'
+    """)
+    cursor.execute("ALTER TABLE books DROP COLUMN location")
+    log.info("Удалена колонка", column='location')
+
+
+def add_catalog_index(cursor):
+    """Индекс для постраничной загрузки каталога в порядке CATALOG_ORDER
+
+    id входит в любой вторичный индекс InnoDB неявно.
+    """
+    cursor.execute("SHOW INDEX FROM books WHERE Key_name = 'idx_books_catalog'")
+    if cursor.fetchall():
+        return
+    # Сравнение кортежей ключа не работает с NULL
+    cursor.execute("UPDATE books SET rack = '' WHERE rack IS NULL")
+    cursor.execute("UPDATE books SET shelf = '' WHERE shelf IS NULL")
+    cursor.execute("CREATE INDEX idx_books_catalog ON books (rack, shelf, title)")
+    log.info("Создан индекс", index='idx_books_catalog')
+
+
+def add_isbn_key(cursor):
+    """Колонка isbn13 с уникальным индексом и её заполнение для старых книг
+
+    Если один ISBN записан у нескольких книг, ключ получает только
+    книга с меньшим id, у остальных isbn13 остаётся NULL. Уникальный
+    индекс заменяет миграция 7 (relax_isbn_key).
+    """
+    cursor.execute("SHOW COLUMNS FROM books LIKE 'isbn13'")
+    if not cursor.fetchall():
+        cursor.execute("ALTER TABLE books ADD COLUMN isbn13 CHAR(13) NULL")
+        log.info("Добавлена колонка", column='isbn13')
+
+    cursor.execute("SHOW INDEX FROM books WHERE Key_name = 'uq_books_isbn13'")
+    if cursor.fetchall():
+        return
+
+    cursor.execute("SELECT id, isbn FROM books WHERE isbn IS NOT NULL AND isbn != '' ORDER BY id")
+    keys = {}
+    duplicates = 0
+    for row in cursor.fetchall():
+        key = isbn_key(row['isbn'])
+        if key is None:
+            continue
+        if key in keys:
+            duplicates += 1
+        else:
+            keys[key] = row['id']
+    cursor.execute("UPDATE books SET isbn13 = NULL")
+    cursor.executemany("UPDATE books SET isbn13 = %s WHERE id = %s", list(keys.items()))
+    cursor.execute("CREATE UNIQUE INDEX uq_books_isbn13 ON books (isbn13)")
+    log.info("Создан индекс", index='uq_books_isbn13', keys=len(keys), duplicates=duplicates)
+
+
+def relax_isbn_key(cursor):
+    """Неуникальный индекс isbn13 и ключ у всех книг, в том числе с повтором ISBN
+
+    С уникальным индексом изменение старой копии книги с тем же ISBN
+    (у неё isbn13 был NULL, а UPDATE вычисляет ключ заново) нарушало
+    ключ, а поиск по ISBN находил только одну из копий. Повтор ISBN у
+    новых книг запрещает приложение (LibraryStorage.check_new_isbns).
+    """
+    cursor.execute("SHOW INDEX FROM books WHERE Key_name = 'idx_books_isbn13'")
+    if not cursor.fetchall():
+        cursor.execute("CREATE INDEX idx_books_isbn13 ON books (isbn13)")
+        log.info("Создан индекс", index='idx_books_isbn13')
+
+    cursor.execute("SHOW INDEX FROM books WHERE Key_name = 'uq_books_isbn13'")
+    if cursor.fetchall():
+        cursor.execute("DROP INDEX uq_books_isbn13 ON books")
+        log.info("Удалён индекс", index='uq_books_isbn13')
+
+    cursor.execute("SELECT id, isbn FROM books WHERE isbn13 IS NULL AND isbn IS NOT NULL AND isbn != ''")
+    keys = [(isbn_key(row['isbn']), row['id']) for row in cursor.fetchall()]
+    keys = [(key, book_id) for key, book_id in keys if key is not None]
+    cursor.executemany("UPDATE books SET isbn13 = %s WHERE id = %s", keys)
+    log.info("Заполнен ключ isbn13 у повторов ISBN", books=len(keys))
+
+
+def drop_invalid_isbn_keys(cursor):
+    """Без ключа isbn13 у ISBN с неверной контрольной цифрой
+
+    Раньше такие тринадцать цифр получали ключ (isbn_key), и книга с
+    опечаткой в ISBN запрещала добавить книгу с тем же номером. Теперь
+    ключ есть только у верных ISBN.
+    """
+    cursor.execute("SELECT id, isbn13 FROM books WHERE isbn13 IS NOT NULL")
+    invalid = [(row['id'],) for row in cursor.fetchall() if normalize_isbn(row['isbn13']) != row['isbn13']]
+    cursor.executemany("UPDATE books SET isbn13 = NULL WHERE id = %s", invalid)
+    log.info("Удалён ключ isbn13 у ISBN с неверной контрольной цифрой", books=len(invalid))
+
+
+def add_change_log(cursor):
+    """Индекс по updated_at и таблица удалённых книг для обновления по изменениям
+
+    Изменённые книги находятся по updated_at, удалённые - по записям
+    (id, deleted_at) в books_deleted.
+    """
+    cursor.execute("SHOW INDEX FROM books WHERE Key_name = 'idx_books_updated'")
+    if not cursor.fetchall():
+        cursor.execute("CREATE INDEX idx_books_updated ON books (updated_at)")
+        log.info("Создан индекс", index='idx_books_updated')
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS books_deleted (
+        id INT PRIMARY KEY,
+        deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_books_deleted_at (deleted_at)
+    )
+    """)
+
+
+def add_delete_trigger(cursor):
+    """Триггер, записывающий удаления в books_deleted
+
+    С триггером видны и удаления не из приложения. Если прав на создание
+    триггера нет, миграция всё равно считается применённой, а удаления
+    записывает delete_book (наличие триггера показывает schema_state).
+    """
+    try:
+        cursor.execute("SHOW TRIGGERS LIKE 'books'")
+        if any(row['Trigger'] == 'trg_books_deleted' for row in cursor.fetchall()):
+            return
+        cursor.execute("""
+        CREATE TRIGGER trg_books_deleted AFTER DELETE ON books FOR EACH ROW
+        REPLACE INTO books_deleted (id) VALUES (OLD.id)
+        """)
+        log.info("Создан триггер", trigger='trg_books_deleted')
+    except Error as e:
+        log.warning("Триггер удалений недоступен, удаления записывает приложение", error=e)
+
+
+# (версия, описание, функция миграции) - только добавлять в конец
+MIGRATIONS = [
+    (1, "таблица books", create_books),
+    (2, "location -> rack и shelf", split_location),
+    (3, "индекс каталога idx_books_catalog", add_catalog_index),
+    (4, "колонка isbn13 и уникальный индекс", add_isbn_key),
+    (5, "индекс updated_at и таблица books_deleted", add_change_log),
+    (6, "триггер trg_books_deleted", add_delete_trigger),
+    (7, "неуникальный индекс isbn13", relax_isbn_key),
+    (8, "isbn13 только у ISBN с верной контрольной цифрой", drop_invalid_isbn_keys),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_state(pool):
+    """(версия схемы, есть ли триггер удалений, есть ли полнотекстовый индекс,
+    не удалось ли создать полнотекстовый индекс)
+
+    Версия 0 - таблицы schema_version ещё нет.
+    """
+    try:
+        with pool.cursor() as cursor:
+            cursor.execute(SCHEMA_STATE_QUERY, (FULLTEXT_ATTEMPT,))
+            row = cursor.fetchone()
+    except Error as e:
+        if e.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        return 0, False, False, False
+    return (row['version'] or 0, bool(row['has_trigger']), bool(row['has_fulltext']),
+            bool(row['fulltext_failed']))
+
+
+@contextmanager
+def schema_lock(connection, timeout=LOCK_TIMEOUT):
+    """Блокировка изменения схемы базы на время блока with
+
+    Блокировка принадлежит соединению: DDL нужно выполнять им же.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(CONCAT(%s, DATABASE()), %s)", (SCHEMA_LOCK, timeout))
+        if cursor.fetchone()[0] != 1:
+            raise Error(msg=f"Схему БД изменяет другое приложение: блокировка не получена за {timeout} с")
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(CONCAT(%s, DATABASE()))", (SCHEMA_LOCK,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def migrate(connection, migrations=MIGRATIONS):
+    """Применение миграций новее версии схемы (под schema_lock)
+
+    Версия читается заново: пока ждали блокировку, схему мог обновить
+    другой. Возвращает номера применённых миграций.
+    """
+    cursor = TimedCursor(connection.cursor(dictionary=True))
+    try:
+        cursor.execute(CREATE_VERSION_TABLE)
+        cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+        current = cursor.fetchone()['version']
+        applied = []
+        for version, name, apply in migrations:
+            if version <= current:
+                continue
+            start = time.perf_counter()
+            apply(cursor)
+            cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+            connection.commit()
+            applied.append(version)
+            log.info("Применена миграция схемы", version=version, name=name,
+                     ms=(time.perf_counter() - start) * 1000)
+        return applied
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def add_fulltext_index(cursor, columns):
+    """FULLTEXT-индекс ft_books_text с парсером ngram (под schema_lock)
+
+    Индекс необязателен и включается настройкой, поэтому это не
+    миграция. Парсер ngram режет текст на n-граммы, а не на слова по
+    пробелам, и подходит для кириллицы. Неудачная попытка записывается
+    в schema_version (FULLTEXT_ATTEMPT), и следующие запуски её не
+    повторяют. Возвращает True, если индекс есть.
+    """
+    try:
+        cursor.execute("SHOW INDEX FROM books WHERE Key_name = 'ft_books_text'")
+        if cursor.fetchall():
+            return True
+        cursor.execute(f"CREATE FULLTEXT INDEX ft_books_text ON books ({columns}) WITH PARSER ngram")
+        log.info("Создан полнотекстовый индекс", index='ft_books_text')
+        return True
+    except Error as e:
+        log.warning("Полнотекстовый индекс недоступен, поиск будет по индексу в памяти; "
+                    "чтобы повторить попытку, удалите запись из schema_version",
+                    version=FULLTEXT_ATTEMPT, error=e)
+        cursor.execute("REPLACE INTO schema_version (version, name) VALUES (%s, %s)",
+                       (FULLTEXT_ATTEMPT, f"ft_books_text недоступен: {e}"[:255]))
+        return False
@@ -0,0 +1,173 @@
+"""Кэш результатов запросов фильтров и поиска (LRU)
+
+Ключ - нормализованный вид таблицы: значения фильтров приводятся к виду
+сравнения MySQL (без регистра и пробелов по краям), ISBN - к ключу
+isbn13, слова полнотекстового запроса - к отсортированному набору. Так
+«Роман» и «роман » попадают в одну запись кэша.
+
+Записи вытесняются по давности использования при превышении числа
+записей или оценки занимаемой памяти. Изменения книг, сделанные
+приложением, удаляют только те записи, на результат которых они могли
+повлиять: запись, где была изменённая книга, и запись, под условия
+которой подходит новая версия книги.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+from catalog_index import index_key
+from isbn import clean_isbn, isbn_key, isbn_lookup
+from rows import BookRow
+from text_index import words
+
+
+# Оценка накладных расходов на одну строку (объект строки и ссылка в списке)
+ROW_OVERHEAD = 64
+
+
+def view_key(view):
+    """Нормализованный ключ вида таблицы (как в LibraryStorage.view_query)"""
+    kind = view[0]
+    if kind == 'filter':
+        _, criteria, order_by = view
+        return ('filter',
+                tuple(sorted((field, index_key(field, value)) for field, value in criteria.items())),
+                ",".join(column.strip() for column in order_by.split(',')))
+    if kind == 'isbn':
+        _, text, limit = view
+        key, prefixes = isbn_lookup(text)
+        if key or prefixes:
+            return ('isbn', key, tuple(prefixes), int(limit))
+        return ('isbn', None, clean_isbn(text).casefold(), int(limit))
+    if kind == 'fulltext':
+        _, text, limit = view
+        return ('fulltext', tuple(sorted(set(words(text)))), int(limit))
+    if kind == 'search':
+        _, field, value, order_by = view
+        return ('search', field, str(value).strip().casefold(), order_by)
+    raise ValueError(f"Неизвестный вид таблицы: {kind}")
+
+
+def key_matches(key, book):
+    """Может ли книга попасть в результат вида с ключом key"""
+    kind = key[0]
+    if kind == 'filter':
+        return all(index_key(field, book.get(field)) == value for field, value in key[1])
+    if kind == 'isbn':
+        _, exact, prefixes, _ = key
+        if exact is None and isinstance(prefixes, str):
+            return prefixes in clean_isbn(book.get('isbn')).casefold()
+        book_key = isbn_key(book.get('isbn'))
+        if book_key is None:
+            return False
+        return book_key == exact or any(book_key.startswith(prefix) for prefix in prefixes)
+    if kind == 'search':
+        _, field, value, _ = key
+        return value in str(book.get(field) or "").casefold()
+    # Полнотекстовый поиск: слово запроса встречается в тексте книги
+    # (проверка с запасом - лишнее удаление безопасно)
+    text = " ".join(str(book.get(column) or "") for column in ('title', 'author', 'publisher')).casefold()
+    return any(word in text for word in key[1])
+
+
+def rows_size(rows):
+    """Оценка памяти, занимаемой строками результата, в байтах"""
+    total = sys.getsizeof(rows)
+    for row in rows:
+        values = row.values if isinstance(row, BookRow) else row.values()
+        total += ROW_OVERHEAD + sum(sys.getsizeof(value) for value in values)
+    return total
+
+
+class QueryCache:
+    """LRU-кэш результатов видов таблицы с ограничением по числу записей и памяти
+
+    Методы потокобезопасны: запросы выполняются в фоне, а изменения книг
+    приходят и из фоновых потоков. version растёт при каждом изменении
+    книг; результат, запрошенный до изменения, в кэш не попадает.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=32 * 1024 * 1024):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, view):
+        """Копия закэшированного результата вида или None"""
+        key = view_key(view)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+    def put(self, view, rows, version):
+        """Сохранение результата, запрошенного при версии version"""
+        if self.max_entries <= 0:
+            return
+        key = view_key(view)
+        size = rows_size(rows)
+        if size > self.max_bytes:
+            return
+        ids = frozenset(row.get('id') for row in rows)
+        with self.lock:
+            if version != self.version:
+                return
+            self._discard(key)
+            self.entries[key] = (tuple(rows), ids, size)
+            self.size += size
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                self._discard(next(iter(self.entries)))
+
+    def book_added(self, book):
+        """Добавлена книга: удаляются записи, в результат которых она попадает"""
+        self._invalidate(lambda key, ids: key_matches(key, book))
+
+    def book_updated(self, book_id, book):
+        """Изменена книга: удаляются записи со старой или подходящей новой версией"""
+        self._invalidate(lambda key, ids: book_id in ids or key_matches(key, book))
+
+    def book_removed(self, book_id):
+        """Удалена книга: удаляются записи, где она была"""
+        self._invalidate(lambda key, ids: book_id in ids)
+
+    def books_changed(self, books, deleted_ids=()):
+        """Пачка изменений из БД: как book_updated и book_removed для каждой книги"""
+        changed = set(book.get('id') for book in books) | set(deleted_ids)
+        self._invalidate(lambda key, ids: not changed.isdisjoint(ids)
+                         or any(key_matches(key, book) for book in books))
+
+    def clear(self):
+        """Удаление всех записей (после импорта или обновления каталога)"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.version += 1
+
+    def stats(self):
+        """Текст для строки состояния"""
+        with self.lock:
+            return (f"Кэш запросов: {self.hits} попаданий, {self.misses} промахов, "
+                    f"{len(self.entries)} зап., {self.size // 1024} КБ")
+
+    def _invalidate(self, affected):
+        with self.lock:
+            self.version += 1
+            for key in [key for key, entry in self.entries.items() if affected(key, entry[1])]:
+                self._discard(key)
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
@@ -0,0 +1,292 @@
+"""Замер времени операций с БД и журнал медленных запросов
+
+Операции хранилища, помеченные декоратором timed (и обновление таблицы
+в окне), замеряются целиком: время, число прочитанных строк и SQL всех
+выполненных внутри запросов с их временем. По каждой операции
+копится статистика (число вызовов, суммарное и наибольшее время). Операции
+дольше порога записываются в журнал медленных запросов - файл с ротацией,
+одна запись JSON на строку, с оценкой памяти, занятой строками
+результата, и (если включено) планом EXPLAIN медленных SELECT. Файл
+пишет фоновый поток (applog.start_queue), так что запись о медленной
+перерисовке не задерживает поток интерфейса.
+
+Курсоры пулов сообщают о запросах через trace_statement: запрос
+относится к операции, которая выполняется в том же потоке.
+"""
+import functools
+import heapq
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from applog import shutdown_queue, start_queue
+
+
+# Длина SQL и параметров в записи журнала
+MAX_SQL_LENGTH = 2000
+MAX_PARAMS_LENGTH = 500
+
+# Сколько самых долгих запросов операции попадает в запись журнала
+MAX_STATEMENTS = 20
+
+_active = threading.local()
+
+
+class Operation:
+    """Замер одной операции: запросы, выполненные внутри неё, и её результат
+
+    Из запросов хранятся только MAX_STATEMENTS самых долгих (куча по
+    времени) и последний, к которому ещё добавляется время чтения строк;
+    остальные только считаются - импорт из миллиона строк не копит их SQL.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.statement_count = 0
+        self.slowest = []
+        self.last = None
+        self.rows = 0
+        self.result = None
+        self.seconds = 0.0
+
+    def add_statement(self, query, params, seconds):
+        """Учёт выполненного запроса"""
+        self._keep_last()
+        self.statement_count += 1
+        self.last = [query, params, seconds]
+
+    def add_rows(self, rows, seconds):
+        """Учёт прочитанных строк; время чтения относится к последнему запросу"""
+        self.rows += rows
+        if self.last is not None:
+            self.last[2] += seconds
+
+    def statements(self):
+        """Самые долгие запросы [(запрос, параметры, секунды)] по убыванию времени"""
+        self._keep_last()
+        return [(query, params, seconds)
+                for seconds, _, query, params in sorted(self.slowest, reverse=True)]
+
+    def _keep_last(self):
+        """Перенос последнего запроса в кучу самых долгих"""
+        if self.last is None:
+            return
+        query, params, seconds = self.last
+        self.last = None
+        # Номер запроса различает запросы с одинаковым временем
+        item = (seconds, -self.statement_count, query, params)
+        if len(self.slowest) < MAX_STATEMENTS:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+
+def trace_statement(query, params, seconds):
+    """Запрос, выполненный курсором (учитывается в операции текущего потока)"""
+    operation = getattr(_active, 'operation', None)
+    if operation is not None:
+        operation.add_statement(query, params, seconds)
+
+
+def trace_rows(rows, seconds):
+    """Строки, прочитанные курсором; время чтения добавляется к последнему запросу"""
+    operation = getattr(_active, 'operation', None)
+    if operation is not None:
+        operation.add_rows(rows, seconds)
+
+
+class TimedCursor:
+    """Курсор mysql.connector, сообщающий о запросах и прочитанных строках"""
+
+    # Соединение взяло именованные блокировки (GET_LOCK), их снимает
+    # пул после конца транзакции
+    user_locks = False
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, query, params=()):
+        start = time.perf_counter()
+        try:
+            return self.cursor.execute(query, params)
+        finally:
+            trace_statement(query, params, time.perf_counter() - start)
+
+    def executemany(self, query, rows):
+        start = time.perf_counter()
+        try:
+            return self.cursor.executemany(query, rows)
+        finally:
+            trace_statement(query, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self.cursor.fetchone()
+        trace_rows(row is not None, time.perf_counter() - start)
+        return row
+
+    def fetchmany(self, size):
+        start = time.perf_counter()
+        rows = self.cursor.fetchmany(size)
+        trace_rows(len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self.cursor.fetchall()
+        trace_rows(len(rows), time.perf_counter() - start)
+        return rows
+
+
+def timed(method):
+    """Декоратор метода хранилища: замер операции журналом self.query_log
+
+    Вложенные операции (например, insert_books внутри import_books)
+    отдельно не записываются, их запросы относятся к внешней.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        log = self.query_log
+        if log is None or getattr(_active, 'operation', None) is not None:
+            return method(self, *args, **kwargs)
+        with log.operation(name, self) as operation:
+            operation.result = method(self, *args, **kwargs)
+            return operation.result
+    return wrapper
+
+
+class QueryLog:
+    """Статистика операций и журнал медленных запросов
+
+    slow_ms - порог медленной операции в миллисекундах, path - файл
+    журнала (None - журнал не пишется), max_bytes и backups - размер
+    файла и число старых файлов при ротации, explain - сохранять план
+    медленных SELECT.
+    """
+
+    def __init__(self, slow_ms=200, path=None, max_bytes=1024 * 1024, backups=3, explain=False):
+        self.slow_seconds = float(slow_ms) / 1000
+        self.explain = explain
+        self.totals = {}
+        self.slow_count = 0
+        self.lock = threading.Lock()
+        self.logger = None
+        if path:
+            # Отдельный логгер: записи не попадают в общий вывод
+            self.logger = logging.getLogger(f"library.slow_queries.{id(self)}")
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(path, maxBytes=int(max_bytes),
+                                          backupCount=int(backups), encoding='utf-8')
+            self.listener = start_queue(self.logger, handler)
+
+    @contextmanager
+    def operation(self, name, storage=None):
+        """Замер операции в блоке with; storage нужен для EXPLAIN"""
+        operation = Operation(name)
+        _active.operation = operation
+        start = time.perf_counter()
+        try:
+            yield operation
+        finally:
+            operation.seconds = time.perf_counter() - start
+            _active.operation = None
+            self.record(operation, storage)
+
+    def record(self, operation, storage=None):
+        """Учёт завершённой операции в статистике и, если она медленная, в журнале"""
+        with self.lock:
+            count, total, longest = self.totals.get(operation.name, (0, 0.0, 0.0))
+            self.totals[operation.name] = (count + 1, total + operation.seconds,
+                                           max(longest, operation.seconds))
+            slow = operation.seconds >= self.slow_seconds
+            if slow:
+                self.slow_count += 1
+        if slow and self.logger is not None:
+            self.logger.info(json.dumps(self.slow_entry(operation, storage), ensure_ascii=False, default=str))
+
+    def record_time(self, name, seconds, rows=0):
+        """Учёт операции, замеренной снаружи (например, перерисовки таблицы)"""
+        operation = Operation(name)
+        operation.seconds = seconds
+        operation.rows = rows
+        self.record(operation)
+
+    def slow_entry(self, operation, storage=None):
+        """Запись журнала о медленной операции"""
+        entry = {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'operation': operation.name,
+            'ms': round(operation.seconds * 1000, 1),
+            'rows': operation.rows or result_rows(operation.result),
+        }
+        size = result_size(operation.result)
+        if size is not None:
+            entry['bytes'] = size
+        statements = []
+        for query, params, seconds in operation.statements():
+            statement = {
+                'ms': round(seconds * 1000, 1),
+                'sql': " ".join(query.split())[:MAX_SQL_LENGTH],
+                'params': repr(params)[:MAX_PARAMS_LENGTH] if params else None,
+            }
+            if (self.explain and storage is not None and seconds >= self.slow_seconds / 2
+                    and query.lstrip().upper().startswith("SELECT")):
+                statement['explain'] = explain_plan(storage, query, params)
+            statements.append(statement)
+        entry['statement_count'] = operation.statement_count
+        entry['statements'] = statements
+        return entry
+
+    def stats(self):
+        """Текст для строки состояния"""
+        with self.lock:
+            count = sum(total[0] for total in self.totals.values())
+            seconds = sum(total[1] for total in self.totals.values())
+            return f"Запросы: {count}, {seconds:.1f} с, медленных: {self.slow_count}"
+
+    def summary(self):
+        """[(операция, вызовов, всего с, наибольшее с)] по убыванию суммарного времени"""
+        with self.lock:
+            rows = [(name, count, total, longest) for name, (count, total, longest) in self.totals.items()]
+        return sorted(rows, key=lambda row: -row[2])
+
+    def close(self):
+        if self.logger is not None:
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+            shutdown_queue(self.listener)
+            self.logger = None
+
+
+def result_rows(result):
+    """Число строк в результате операции (если это список)"""
+    return len(result) if isinstance(result, list) else 0
+
+
+def result_size(result):
+    """Оценка памяти строк результата в байтах (None - результат не список строк)"""
+    if not isinstance(result, list) or not result or not hasattr(result[0], 'get'):
+        return None
+    # Импорт здесь: оценка нужна только медленным операциям
+    from query_cache import rows_size
+    return rows_size(result)
+
+
+def explain_plan(storage, query, params):
+    """План выполнения запроса (строки EXPLAIN) или текст ошибки"""
+    try:
+        with storage.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(storage.explain_prefix + query, params or ())
+            return [list(row) for row in cursor.fetchall()]
+    except Exception as e:
+        return f"EXPLAIN не выполнен: {e}"
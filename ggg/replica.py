@@ -0,0 +1,306 @@
+"""Локальная копия каталога в SQLite для работы без сервера MySQL
+
+Пока сервер доступен, копия догоняет его по изменениям (fetch_changes,
+та же метка updated_at, что и у каталога в памяти). Если подключиться
+к серверу нельзя, приложение работает с копией как с обычным хранилищем:
+чтение - из файла, а каждое изменение записывается в копию и в очередь
+pending_writes одной транзакцией, поэтому очередь переживает перезапуск.
+После подключения очередь отправляется на сервер пачками; изменение
+книги, которую на сервере за это время изменили или удалили, считается
+конфликтом: на сервере остаётся его версия, а отложенное изменение
+сохраняется в write_conflicts.
+"""
+import json
+from datetime import datetime
+
+from applog import get_logger
+from query_log import timed
+from sqlite_storage import SQLiteStorage, BOOK_COLUMNS, TIMESTAMP_FORMAT
+from storage import UPDATE_BOOK_QUERY, book_values
+
+
+REPLICA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS replica_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS pending_writes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    data TEXT,
+    base_updated_at TEXT,
+    queued_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS write_conflicts (
+    seq INTEGER PRIMARY KEY,
+    operation TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    data TEXT,
+    base_updated_at TEXT,
+    server_updated_at TEXT,
+    reason TEXT,
+    detected_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+log = get_logger("replica")
+
+# Копирование строки сервера с её id и временем изменения
+REPLACE_BOOK_QUERY = (
+    f"INSERT OR REPLACE INTO books ({', '.join(BOOK_COLUMNS)}) "
+    f"VALUES ({', '.join(['%s'] * len(BOOK_COLUMNS))})"
+)
+
+# Добавление книги без сервера (с временным id)
+LOCAL_INSERT_QUERY = """
+INSERT INTO books (id, title, author, year, genre, publisher, isbn, quantity, rack, shelf, isbn13)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def replica_values(book):
+    """Значения колонок строки сервера для копии"""
+    values = []
+    for column in BOOK_COLUMNS:
+        value = book.get(column)
+        if column in ('created_at', 'updated_at') and value:
+            # ISO-формат строк сервера приводится к формату CURRENT_TIMESTAMP
+            value = str(value).replace("T", " ")
+        elif column == 'isbn13' and not value:
+            # Книга без ISBN хранит NULL, как на сервере
+            value = None
+        values.append(value)
+    return tuple(values)
+
+
+def parse_timestamp(value):
+    """Время из текста копии (None - нет значения)"""
+    return datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+
+
+class ReplayReport:
+    """Итог отправки отложенных изменений: применено, конфликты, ошибка"""
+
+    def __init__(self):
+        self.applied = 0
+        self.conflicts = 0
+        self.error = None
+
+
+class ReplicaStorage(SQLiteStorage):
+    """Копия каталога; при работе без сервера - хранилище с очередью изменений"""
+
+    def __init__(self, path, timeout=10.0):
+        super().__init__(path, timeout)
+        self.init_schema()
+
+    def init_schema(self, fulltext=False):
+        """Таблицы каталога, метаданных копии и очереди изменений"""
+        super().init_schema()
+        self.pool.executescript(REPLICA_SCHEMA)
+
+    def get_meta(self, key):
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("SELECT value FROM replica_meta WHERE key = %s", (key,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def synced_at(self):
+        """Время сервера, до которого копия получила изменения (None - копия пуста)"""
+        return parse_timestamp(self.get_meta('watermark'))
+
+    def pending_count(self):
+        """Число изменений, ожидающих отправки на сервер"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pending_writes")
+            return cursor.fetchone()[0]
+
+    # Получение изменений с сервера
+
+    def sync_from(self, storage, overlap=5, chunk_size=1000):
+        """Обновление копии с сервера; возвращает число полученных строк
+
+        Копия обновляется по изменениям с прошлой метки, а без метки (или
+        со слишком старой) - копируется целиком. Пока в очереди есть
+        неотправленные изменения, копия не трогается: они в ней
+        единственный экземпляр.
+        """
+        if self.pending_count():
+            return 0
+        now, rows, deleted_ids, _ = storage.fetch_changes(self.synced_at(), overlap)
+        if rows is None:
+            return self.copy_from(storage, now, chunk_size)
+
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.executemany(REPLACE_BOOK_QUERY, [replica_values(row) for row in rows])
+            cursor.executemany("DELETE FROM books WHERE id = %s", [(book_id,) for book_id in deleted_ids])
+            self._set_watermark(cursor, now)
+        return len(rows) + len(deleted_ids)
+
+    def copy_from(self, storage, now, chunk_size=1000):
+        """Полная копия каталога сервера одной транзакцией (чтение потоковое)"""
+        count = 0
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("DELETE FROM books")
+            for chunk in storage.iter_books(chunk_size=chunk_size):
+                cursor.executemany(REPLACE_BOOK_QUERY, [replica_values(row) for row in chunk])
+                count += len(chunk)
+            # Удаления до полной копии уже не нужны
+            cursor.execute("DELETE FROM books_deleted")
+            self._set_watermark(cursor, now)
+        log.info("Локальная копия каталога обновлена целиком", books=count)
+        return count
+
+    def _set_watermark(self, cursor, now):
+        cursor.execute(
+            "REPLACE INTO replica_meta (key, value) VALUES ('watermark', %s)",
+            (now.strftime(TIMESTAMP_FORMAT),)
+        )
+
+    # Изменения без сервера: копия + очередь одной транзакцией
+
+    @timed
+    def insert_book(self, book_data):
+        """Добавление книги с временным отрицательным id"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            return self._insert_local(cursor, book_data)
+
+    @timed
+    def insert_books(self, books):
+        """Добавление пачки книг одной транзакцией"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            for book in books:
+                self._insert_local(cursor, book)
+        return len(books)
+
+    @timed
+    def update_book(self, book_id, book_data):
+        """Изменение книги с запоминанием версии сервера для проверки конфликта"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            base_updated_at = self._server_version(cursor, book_id)
+            cursor.execute(UPDATE_BOOK_QUERY, book_values(book_data) + (book_id,))
+            self._queue(cursor, 'update', book_id, book_data, base_updated_at)
+            return book_id
+
+    @timed
+    def delete_book(self, book_id):
+        """Удаление книги с запоминанием версии сервера для проверки конфликта"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            base_updated_at = self._server_version(cursor, book_id)
+            cursor.execute("DELETE FROM books WHERE id = %s", (book_id,))
+            self._queue(cursor, 'delete', book_id, None, base_updated_at)
+        return True
+
+    def fetch_changes(self, since, overlap=5):
+        """Без сервера чужих изменений нет, свои уже показаны"""
+        return self.server_time(), [], [], None
+
+    def _insert_local(self, cursor, book_data):
+        # Отрицательные id не пересекаются с id сервера; после отправки
+        # книга получает настоящий id
+        cursor.execute(
+            "SELECT MIN(id) FROM (SELECT MIN(id) AS id FROM books "
+            "UNION ALL SELECT MIN(book_id) FROM pending_writes)"
+        )
+        local_id = min(0, cursor.fetchone()[0] or 0) - 1
+        self.check_new_isbns(cursor, [book_data])
+        cursor.execute(LOCAL_INSERT_QUERY, (local_id,) + book_values(book_data))
+        self._queue(cursor, 'insert', local_id, book_data, None)
+        return local_id
+
+    def _server_version(self, cursor, book_id):
+        """updated_at книги с сервера (для книг, добавленных без сервера, - None)
+
+        Если книгу уже меняли без сервера, версия берётся из первого
+        изменения в очереди: updated_at в копии с тех пор локальный.
+        """
+        if book_id < 0:
+            return None
+        cursor.execute(
+            "SELECT base_updated_at FROM pending_writes WHERE book_id = %s ORDER BY seq LIMIT 1",
+            (book_id,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        cursor.execute("SELECT updated_at FROM books WHERE id = %s", (book_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _queue(self, cursor, operation, book_id, book_data, base_updated_at):
+        cursor.execute(
+            "INSERT INTO pending_writes (operation, book_id, data, base_updated_at) "
+            "VALUES (%s, %s, %s, %s)",
+            (operation, book_id,
+             json.dumps(dict(book_data), ensure_ascii=False) if book_data is not None else None,
+             base_updated_at)
+        )
+
+    # Отправка очереди на сервер
+
+    def replay_to(self, storage, batch_size=100):
+        """Отправка отложенных изменений на сервер пачками по batch_size
+
+        Каждая пачка применяется на сервере одной транзакцией и после этого
+        удаляется из очереди; конфликтующие и отклонённые сервером
+        изменения переносятся в write_conflicts и очередь не держат. При
+        ошибке соединения отправка останавливается, оставшиеся изменения
+        ждут следующего подключения.
+        """
+        report = ReplayReport()
+        while True:
+            writes = self._pending_writes(batch_size)
+            if not writes:
+                break
+            try:
+                new_ids, conflicts, versions = storage.apply_writes(writes)
+            except Exception as e:
+                report.error = str(e)
+                break
+            self._finish_batch(writes, new_ids, conflicts, versions)
+            report.applied += len(writes) - len(conflicts)
+            report.conflicts += len(conflicts)
+        return report
+
+    def _pending_writes(self, limit):
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(
+                "SELECT seq, operation, book_id, data, base_updated_at FROM pending_writes "
+                "ORDER BY seq LIMIT %s", (int(limit),)
+            )
+            return [
+                (seq, operation, book_id, json.loads(data) if data else None, parse_timestamp(base))
+                for seq, operation, book_id, data, base in cursor.fetchall()
+            ]
+
+    def _finish_batch(self, writes, new_ids, conflicts, versions):
+        """Удаление отправленной пачки из очереди и замена временных id настоящими
+
+        Следующие изменения уже изменённых книг проверяются по версии,
+        которую книга получила на сервере после этой пачки.
+        """
+        with self.pool.cursor(dictionary=False) as cursor:
+            for seq, server_updated_at, reason in conflicts:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO write_conflicts "
+                    "(seq, operation, book_id, data, base_updated_at, server_updated_at, reason) "
+                    "SELECT seq, operation, book_id, data, base_updated_at, %s, %s "
+                    "FROM pending_writes WHERE seq = %s",
+                    (server_updated_at, reason, seq)
+                )
+            cursor.executemany("DELETE FROM pending_writes WHERE seq = %s",
+                               [(write[0],) for write in writes])
+            # Книга, которую сервер не принял, в копии остаётся только в write_conflicts
+            rejected = [(book_id,) for seq, operation, book_id, data, base in writes
+                        if operation == 'insert' and book_id not in new_ids]
+            cursor.executemany("DELETE FROM books WHERE id = %s", rejected)
+            for local_id, server_id in new_ids.items():
+                cursor.execute("UPDATE pending_writes SET book_id = %s WHERE book_id = %s",
+                               (server_id, local_id))
+                cursor.execute("UPDATE books SET id = %s WHERE id = %s", (server_id, local_id))
+            for book_id, updated_at in versions.items():
+                cursor.execute("UPDATE pending_writes SET base_updated_at = %s WHERE book_id = %s",
+                               (updated_at, book_id))
@@ -0,0 +1,121 @@
+"""Материализация строк результата запроса в компактные строки книг
+
+Курсор возвращает кортежи, а не словари. Для каждого результата один раз
+по cursor.description выбирается преобразователь каждой колонки; строка
+хранит исходный кортеж и преобразует значение только при обращении к
+колонке, поэтому таблица платит лишь за видимые ячейки.
+"""
+from mysql.connector import FieldType
+
+
+DATE_TYPES = set(FieldType.get_timestamp_types()) | {FieldType.DATE, FieldType.NEWDATE}
+
+# Колонки, значения которых отдаются как есть (id нужен числом)
+RAW_COLUMNS = {'id'}
+
+
+def to_text(value):
+    """Значение ячейки строкой; NULL - пустая строка"""
+    return str(value) if value is not None else ""
+
+
+def to_isoformat(value):
+    """Дата/время в ISO-формате; NULL - пустая строка"""
+    return value.isoformat() if value is not None else ""
+
+
+def column_converter(name, type_code):
+    """Преобразователь значений колонки (None - значение без изменений)"""
+    if name in RAW_COLUMNS:
+        return None
+    if type_code in DATE_TYPES:
+        return to_isoformat
+    return to_text
+
+
+class RowLayout:
+    """Общее описание строк одного результата: колонки, их позиции и преобразователи"""
+
+    __slots__ = ('columns', 'positions', 'converters')
+
+    def __init__(self, columns, converters):
+        self.columns = tuple(columns)
+        self.positions = {column: position for position, column in enumerate(self.columns)}
+        self.converters = tuple(converters)
+
+    @classmethod
+    def from_description(cls, description):
+        """Описание строк по cursor.description"""
+        columns = [column[0] for column in description]
+        converters = [column_converter(column[0], column[1]) for column in description]
+        return cls(columns, converters)
+
+
+class BookRow:
+    """Строка книги: кортеж значений из БД и общее для результата описание
+
+    Ведёт себя как словарь только для чтения значений (row['title'],
+    row.get(...), items()), изменённые поля хранятся отдельно.
+    """
+
+    __slots__ = ('layout', 'values', 'changed')
+
+    def __init__(self, layout, values):
+        self.layout = layout
+        self.values = values
+        self.changed = None
+
+    def __getitem__(self, key):
+        if self.changed is not None and key in self.changed:
+            return self.changed[key]
+        position = self.layout.positions[key]
+        converter = self.layout.converters[position]
+        value = self.values[position]
+        return value if converter is None else converter(value)
+
+    def __setitem__(self, key, value):
+        if self.changed is None:
+            self.changed = {}
+        self.changed[key] = value
+
+    def __contains__(self, key):
+        return key in self.layout.positions or (self.changed is not None and key in self.changed)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = list(self.layout.columns)
+        if self.changed is not None:
+            keys.extend(key for key in self.changed if key not in self.layout.positions)
+        return keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """Обычный словарь со всеми преобразованными значениями"""
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"BookRow({self.to_dict()!r})"
+
+
+def materialize(cursor):
+    """Все строки результата курсора (кортежного) в виде BookRow"""
+    return materialize_rows(cursor.description, cursor.fetchall())
+
+
+def materialize_rows(description, rows):
+    """Строки-кортежи с заданным cursor.description в виде BookRow"""
+    layout = RowLayout.from_description(description)
+    return [BookRow(layout, values) for values in rows]
@@ -0,0 +1,296 @@
+"""Хранилище каталога в файле SQLite (движок sqlite в секции [storage])
+
+Без сервера MySQL на нём работают приложение, локальная копия каталога
+и бенчмарки. Общие запросы LibraryStorage выполняются без изменений: пул SQLite выдаёт
+курсоры, которые принимают параметры %s, как mysql.connector, и
+превращают ошибки sqlite3 в ошибки mysql.connector (повтор уникального
+ключа - IntegrityError с кодом ER_DUP_ENTRY). Свои у SQLite только схема,
+время сервера.
+
+Сравнение текста, как у MySQL, без учёта регистра (в том числе
+кириллицы): колонки объявлены с сопоставлением UNICODE_NOCASE, а LIKE
+заменён функцией с регулярным выражением.
+"""
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from applog import get_logger
+from isbn import isbn_key
+from query_log import TimedCursor
+from storage import LibraryStorage
+
+
+log = get_logger("sqlite")
+
+
+# Колонки таблицы books в порядке схемы
+BOOK_COLUMNS = ('id', 'title', 'author', 'year', 'genre', 'publisher', 'isbn',
+                'quantity', 'rack', 'shelf', 'created_at', 'updated_at', 'isbn13')
+
+# Таблица книг ({table} - books или временное имя при перестройке)
+BOOKS_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL COLLATE UNICODE_NOCASE,
+    author TEXT NOT NULL COLLATE UNICODE_NOCASE,
+    year INTEGER NOT NULL,
+    genre TEXT COLLATE UNICODE_NOCASE,
+    publisher TEXT COLLATE UNICODE_NOCASE,
+    isbn TEXT,
+    quantity INTEGER DEFAULT 1,
+    rack TEXT DEFAULT '' COLLATE UNICODE_NOCASE,
+    shelf TEXT DEFAULT '' COLLATE UNICODE_NOCASE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    isbn13 TEXT
+);
+"""
+
+SCHEMA = BOOKS_TABLE.format(table='books') + """
+CREATE INDEX IF NOT EXISTS idx_books_catalog ON books (rack, shelf, title);
+CREATE INDEX IF NOT EXISTS idx_books_isbn13 ON books (isbn13);
+CREATE INDEX IF NOT EXISTS idx_books_updated ON books (updated_at);
+
+CREATE TABLE IF NOT EXISTS books_deleted (
+    id INTEGER PRIMARY KEY,
+    deleted_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_books_deleted_at ON books_deleted (deleted_at);
+
+-- updated_at, как ON UPDATE CURRENT_TIMESTAMP в MySQL (если его не задали явно)
+CREATE TRIGGER IF NOT EXISTS trg_books_updated AFTER UPDATE ON books
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE books SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_books_deleted AFTER DELETE ON books
+FOR EACH ROW
+BEGIN
+    REPLACE INTO books_deleted (id) VALUES (OLD.id);
+END;
+"""
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def unicode_nocase(left, right):
+    """Сопоставление UNICODE_NOCASE: сравнение без учёта регистра любых букв"""
+    left = left.casefold()
+    right = right.casefold()
+    return (left > right) - (left < right)
+
+
+@lru_cache(maxsize=256)
+def like_pattern(pattern):
+    """Регулярное выражение для шаблона LIKE (% и _)"""
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append(".*")
+        elif char == '_':
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def sql_like(pattern, value):
+    """LIKE без учёта регистра любых букв (встроенный в SQLite - только для латиницы)"""
+    if pattern is None or value is None:
+        return None
+    return like_pattern(pattern).fullmatch(str(value)) is not None
+
+
+def sql_param(value):
+    """Параметр запроса для SQLite (дата/время - текстом, как хранится в таблице)"""
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+@lru_cache(maxsize=256)
+def qmark_query(query):
+    """Запрос с параметрами ? вместо %s"""
+    return query.replace("%s", "?")
+
+
+def database_error(error):
+    """Ошибка sqlite3 в виде ошибки mysql.connector, которую обрабатывает приложение"""
+    if isinstance(error, sqlite3.IntegrityError):
+        errno = errorcode.ER_DUP_ENTRY if "UNIQUE" in str(error) else None
+        return mysql.connector.IntegrityError(msg=str(error), errno=errno)
+    return mysql.connector.DatabaseError(msg=str(error))
+
+
+class SQLiteCursor:
+    """Курсор sqlite3 с интерфейсом курсора mysql.connector"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def execute(self, query, params=()):
+        try:
+            self.cursor.execute(qmark_query(query), tuple(sql_param(value) for value in params))
+        except sqlite3.Error as e:
+            raise database_error(e) from e
+
+    def executemany(self, query, rows):
+        try:
+            self.cursor.executemany(
+                qmark_query(query),
+                (tuple(sql_param(value) for value in row) for row in rows)
+            )
+        except sqlite3.Error as e:
+            raise database_error(e) from e
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+class SQLitePool:
+    """Соединения с файлом SQLite: по одному на поток (WAL допускает параллельное чтение)"""
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = float(timeout)
+        self.size = 1
+        self.overflow = 0
+        # Счётчики подготовленных запросов есть только у пула MySQL
+        self.statement_stats = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """Соединение текущего потока (открывается при первом обращении)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            connection.create_collation("UNICODE_NOCASE", unicode_nocase)
+            connection.create_function("like", 2, sql_like, deterministic=True)
+            connection.execute("PRAGMA journal_mode = WAL")
+            # Отложенные изменения не должны теряться при сбое питания
+            connection.execute("PRAGMA synchronous = FULL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def cursor(self, dictionary=True, prepared=False):
+        """Курсор в отдельной транзакции: commit при успехе, rollback при ошибке
+
+        prepared не нужен: sqlite3 сам держит кэш разобранных запросов
+        каждого соединения.
+        """
+        connection = self.connection()
+        cursor = connection.cursor()
+        if dictionary:
+            cursor.row_factory = sqlite3.Row
+        try:
+            yield TimedCursor(SQLiteCursor(cursor))
+            connection.commit()
+        except sqlite3.Error as e:
+            connection.rollback()
+            raise database_error(e) from e
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def executescript(self, script):
+        """Выполнение нескольких команд (схема)"""
+        try:
+            self.connection().executescript(script)
+        except sqlite3.Error as e:
+            raise database_error(e) from e
+
+    def close(self):
+        """Закрытие соединений всех потоков"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+class SQLiteStorage(LibraryStorage):
+    """Операции с таблицей books в файле SQLite
+
+    Полнотекстового индекса нет (fulltext = False): приложение ищет по
+    индексу слов в памяти. Удаления записывает триггер. Пишущая
+    транзакция SQLite и так блокирует всю базу, поэтому row_lock пуст.
+    """
+
+    engine = 'sqlite'
+    explain_prefix = "EXPLAIN QUERY PLAN "
+
+    def __init__(self, path, timeout=10.0):
+        super().__init__(SQLitePool(path, timeout))
+        self.delete_trigger = True
+
+    def init_schema(self, fulltext=False):
+        """Создание таблиц, индексов и триггеров, если их ещё нет"""
+        self.pool.executescript(SCHEMA)
+        self.relax_isbn_key()
+
+    def relax_isbn_key(self):
+        """Перестройка таблицы, созданной с UNIQUE у isbn13 (как миграция 7 MySQL)
+
+        Ограничение UNIQUE в SQLite не удалить, поэтому строки переносятся
+        в новую таблицу без него. У книг с повтором ISBN заполняется isbn13.
+        """
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("SELECT 1 FROM pragma_index_list('books') WHERE origin = 'u'")
+            if not cursor.fetchall():
+                return
+        columns = ", ".join(BOOK_COLUMNS)
+        self.pool.executescript(
+            "BEGIN;"
+            + BOOKS_TABLE.format(table='books_rebuild')
+            + f"INSERT INTO books_rebuild ({columns}) SELECT {columns} FROM books;"
+            "DROP TABLE books;"
+            "ALTER TABLE books_rebuild RENAME TO books;"
+            "COMMIT;"
+        )
+        # Индексы и триггеры удалены вместе со старой таблицей
+        self.pool.executescript(SCHEMA)
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("SELECT id, isbn FROM books WHERE isbn13 IS NULL AND isbn IS NOT NULL AND isbn != ''")
+            keys = [(isbn_key(isbn), book_id) for book_id, isbn in cursor.fetchall()]
+            keys = [(key, book_id) for key, book_id in keys if key is not None]
+            cursor.executemany("UPDATE books SET isbn13 = %s WHERE id = %s", keys)
+        log.info("Таблица books перестроена без уникального ключа isbn13", keys=len(keys))
+
+    def server_time(self):
+        """Текущее время (UTC, как CURRENT_TIMESTAMP в SQLite)"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("SELECT CURRENT_TIMESTAMP")
+            return datetime.strptime(cursor.fetchone()[0], TIMESTAMP_FORMAT)
@@ -0,0 +1,69 @@
+"""Замер этапов запуска приложения
+
+Этапы интерфейса (импорт модулей, создание окна, настройки, виджеты,
+первый кадр) идут друг за другом в главном потоке и отмечаются вызовом
+mark в конце этапа. Этапы, выполняемые в фоне после первого кадра
+(подключение к БД, загрузка каталога, фасеты), замеряются блоком with
+phase. После завершения запуска (finish) профиль пишется в журнал одной
+записью, а повторные загрузки каталога уже не замеряются.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Цель: окно отрисовано и отвечает не позже чем через 300 мс после запуска
+FIRST_FRAME_TARGET_MS = 300
+
+
+class StartupProfile:
+    """Время этапов запуска; started - время perf_counter() начала запуска"""
+
+    def __init__(self, started=None, target_ms=FIRST_FRAME_TARGET_MS):
+        self.started = time.perf_counter() if started is None else started
+        self.target_ms = float(target_ms)
+        self.last = self.started
+        # [(этап, длительность мс, конец этапа от начала запуска мс)]
+        self.phases = []
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def mark(self, name):
+        """Конец этапа name, начавшегося с предыдущей отметки (главный поток)"""
+        now = time.perf_counter()
+        self.add(name, now - self.last, now)
+        self.last = now
+
+    @contextmanager
+    def phase(self, name):
+        """Замер этапа в блоке with (в том числе в фоновом потоке)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.add(name, now - start, now)
+
+    def add(self, name, seconds, now):
+        with self.lock:
+            if not self.finished:
+                self.phases.append((name, seconds * 1000, (now - self.started) * 1000))
+
+    def elapsed_ms(self, name):
+        """Время от начала запуска до конца этапа name (None - этапа не было)"""
+        with self.lock:
+            for phase, ms, at_ms in self.phases:
+                if phase == name:
+                    return at_ms
+        return None
+
+    def finish(self, log):
+        """Конец запуска: запись профиля в журнал (повторный вызов ничего не делает)"""
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+            phases = list(self.phases)
+            total_ms = (time.perf_counter() - self.started) * 1000
+        log.info("Профиль запуска", total_ms=total_ms,
+                 **{f"{name}_ms": ms for name, ms, at_ms in phases})
@@ -0,0 +1,136 @@
+"""Кэш подготовленных запросов MySQL на каждое соединение пула
+
+Частые запросы (добавление и изменение книги, фильтр, фасеты) каждый раз
+отличаются только параметрами. В текстовом протоколе сервер заново
+разбирает и планирует запрос при каждом вызове. Подготовленный запрос
+(курсор mysql.connector с prepared=True) разбирается один раз, дальше
+серверу передаются только параметры.
+
+Подготовленный запрос живёт в соединении, поэтому кэш у каждого
+соединения пула свой: SQL запроса (его форма с %s вместо значений) ->
+курсор. Курсор готовит запрос заново, если ему передана другая строка
+(сравнивается сама строка, а не текст), поэтому выполняется всегда
+строка из кэша. Самые давние запросы вытесняются, когда их больше
+max_statements.
+
+Время разбора оценивается по первому выполнению формы (подготовка и
+выполнение) и последующим (только выполнение): экономия - число
+повторных выполнений, умноженное на эту разницу.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from mysql.connector import Error, errorcode
+
+
+class StatementStats:
+    """Счётчики подготовленных запросов по формам SQL (общие для всех соединений)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # SQL -> [подготовок, время первых выполнений, повторных, время повторных]
+        self.shapes = {}
+
+    def add(self, query, seconds, prepared):
+        with self.lock:
+            shape = self.shapes.setdefault(query, [0, 0.0, 0, 0.0])
+            if prepared:
+                shape[0] += 1
+                shape[1] += seconds
+            else:
+                shape[2] += 1
+                shape[3] += seconds
+
+    def saved_seconds(self):
+        """Оценка времени разбора, сэкономленного повторными выполнениями"""
+        with self.lock:
+            shapes = list(self.shapes.values())
+        saved = 0.0
+        for prepares, first_total, reuses, reuse_total in shapes:
+            if prepares and reuses:
+                saved += reuses * max(0.0, first_total / prepares - reuse_total / reuses)
+        return saved
+
+    def stats(self):
+        """Текст для строки состояния"""
+        with self.lock:
+            prepares = sum(shape[0] for shape in self.shapes.values())
+            reuses = sum(shape[2] for shape in self.shapes.values())
+        return (f"Подготовлено: {prepares}, повторно: {reuses}, "
+                f"экономия разбора ≈ {self.saved_seconds() * 1000:.0f} мс")
+
+
+class PreparedStatements:
+    """Подготовленные запросы одного соединения: SQL -> курсор
+
+    Само соединение кэш не хранит: пул находит кэш по номеру соединения
+    на сервере, а соединение передаётся в каждый вызов execute.
+    """
+
+    def __init__(self, max_statements, stats):
+        self.max_statements = max_statements
+        self.stats = stats
+        self.cursors = OrderedDict()
+
+    def execute(self, connection, query, params=()):
+        """Выполнение запроса подготовленным курсором; возвращает курсор с результатом"""
+        try:
+            return self._execute(connection, query, params)
+        except Error as e:
+            if e.errno != errorcode.ER_UNKNOWN_STMT_HANDLER:
+                raise
+            # Соединение переподключилось, запросы на сервере потеряны
+            self.cursors.clear()
+            return self._execute(connection, query, params)
+
+    def _execute(self, connection, query, params):
+        entry = self.cursors.get(query)
+        prepared = entry is None
+        if prepared:
+            if len(self.cursors) >= self.max_statements:
+                _, (_, oldest) = self.cursors.popitem(last=False)
+                oldest.close()
+            # Строка запроса хранится вместе с курсором: курсор сравнивает
+            # её с предыдущей по тождеству, а не по тексту
+            entry = (query, connection.cursor(prepared=True))
+        else:
+            self.cursors.move_to_end(query)
+
+        statement, cursor = entry
+        start = time.perf_counter()
+        try:
+            cursor.execute(statement, params)
+        except Error:
+            if prepared:
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+            raise
+        self.stats.add(query, time.perf_counter() - start, prepared)
+        if prepared:
+            self.cursors[query] = entry
+        return cursor
+
+
+class PreparedCursor:
+    """Курсор блока with: запросы выполняются подготовленными курсорами соединения
+
+    Результат (строки, description, lastrowid) - у курсора последнего запроса.
+    """
+
+    def __init__(self, connection, statements):
+        self.connection = connection
+        self.statements = statements
+        self.cursor = None
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, query, params=()):
+        self.cursor = self.statements.execute(self.connection, query, params)
+
+    def close(self):
+        # Курсоры остаются в кэше соединения
+        self.cursor = None
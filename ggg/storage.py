@@ -0,0 +1,1122 @@
+"""Слой доступа к данным библиотеки: хранилище каталога (MySQL или SQLite) и запросы к таблице books"""
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import mysql.connector
+from mysql.connector import Error, errorcode, pooling
+
+from rows import materialize, materialize_rows
+from applog import get_logger
+from facets import FACETS
+from isbn import isbn_key, isbn_lookup
+from migrations import SCHEMA_VERSION, add_fulltext_index, migrate, schema_lock, schema_state
+from query_log import TimedCursor, timed
+from statements import PreparedCursor, PreparedStatements, StatementStats
+
+
+log = get_logger("storage")
+
+# Хранилище по умолчанию (секция [storage] в db_config.ini): engine -
+# mysql (сервер из секции [database]) или sqlite (файл file рядом с
+# db_config.ini)
+DEFAULT_STORAGE_CONFIG = {
+    'engine': 'mysql',
+    'file': 'library.db'
+}
+
+STORAGE_ENGINES = ('mysql', 'sqlite')
+
+# Журнал приложения по умолчанию (секция [logging]): level - DEBUG, INFO,
+# WARNING или ERROR (отладочные записи выключены), file - файл рядом с
+# db_config.ini (пусто - только консоль), max_kb и backups - ротация
+DEFAULT_LOGGING_CONFIG = {
+    'level': 'INFO',
+    'file': 'library.log',
+    'max_kb': 1024,
+    'backups': 3,
+    'console': True
+}
+
+# Журнал медленных запросов по умолчанию (секция [query_log]): slow_ms -
+# порог в миллисекундах, file - файл рядом с db_config.ini (пусто - не
+# писать), max_kb и backups - ротация файла, explain - сохранять план
+# медленных SELECT
+DEFAULT_QUERY_LOG_CONFIG = {
+    'slow_ms': 200,
+    'file': 'slow_queries.log',
+    'max_kb': 1024,
+    'backups': 3,
+    'explain': False
+}
+
+# Настройки пула по умолчанию (секция [pool] в db_config.ini);
+# statements - сколько подготовленных запросов держит каждое соединение
+# пула (0 - запросы не подготавливаются)
+DEFAULT_POOL_CONFIG = {
+    'size': 5,
+    'overflow': 5,
+    'timeout': 10.0,
+    'statements': 32
+}
+
+# Настройки постраничного каталога по умолчанию (секция [catalog])
+DEFAULT_CATALOG_CONFIG = {
+    'paged': True,
+    'page_size': 200,
+    'max_pages': 5,
+    'column_index': False
+}
+
+# Настройки пакетного импорта по умолчанию (секция [import])
+DEFAULT_IMPORT_CONFIG = {
+    'batch_size': 500
+}
+
+# Настройки кэша результатов фильтров и поиска по умолчанию (секция
+# [query_cache]); entries = 0 - кэш отключён
+DEFAULT_QUERY_CACHE_CONFIG = {
+    'entries': 32,
+    'memory_mb': 32
+}
+
+# Настройки обновления каталога по изменениям (секция [refresh]):
+# interval - период фонового обновления в секундах (0 - выключено),
+# overlap - запас в секундах на транзакции, зафиксированные с опозданием
+DEFAULT_REFRESH_CONFIG = {
+    'interval': 60,
+    'overlap': 5
+}
+
+# Настройки локальной копии каталога по умолчанию (секция [replica]):
+# file - файл SQLite рядом с db_config.ini, batch_size - размер пачки
+# при отправке отложенных изменений на сервер
+DEFAULT_REPLICA_CONFIG = {
+    'enabled': True,
+    'file': 'library_replica.db',
+    'batch_size': 100
+}
+
+# Сколько дней хранятся записи об удалённых книгах; каталог, не
+# обновлявшийся дольше, перезагружается целиком
+TOMBSTONE_DAYS = 7
+
+# Как часто (в часах) приложение чистит устаревшие записи об удалениях
+PRUNE_HOURS = 6
+
+# Настройки полнотекстового поиска по умолчанию (секция [search]);
+# fulltext = no - не менять схему и искать по индексу в памяти
+DEFAULT_SEARCH_CONFIG = {
+    'fulltext': True,
+    'limit': 500
+}
+
+# Колонки полнотекстового индекса (FULLTEXT с парсером ngram)
+FULLTEXT_COLUMNS = "title, author, publisher"
+
+# Колонки, по которым разрешены поиск и фильтрация
+SEARCH_FIELDS = ['title', 'author', 'genre', 'isbn', 'year']
+FILTER_FIELDS = ['genre', 'author', 'year', 'rack', 'shelf']
+
+# Порядок каталога и ключ постраничной (keyset) загрузки;
+# id в конце делает ключ уникальным
+CATALOG_ORDER = ('rack', 'shelf', 'title', 'id')
+
+# Сколько секунд ждать блокировку ISBN, который добавляет другое соединение
+ISBN_LOCK_TIMEOUT = 10
+
+# Обязательные поля книги и запрос добавления
+REQUIRED_FIELDS = ('title', 'author', 'year')
+INSERT_BOOK_QUERY = """
+INSERT INTO books (title, author, year, genre, publisher, isbn, quantity, rack, shelf, isbn13)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+UPDATE_BOOK_QUERY = """
+UPDATE books
+SET title = %s, author = %s, year = %s, genre = %s,
+    publisher = %s, isbn = %s, quantity = %s, rack = %s, shelf = %s,
+    isbn13 = %s
+WHERE id = %s
+"""
+
+
+class ConnectionPool:
+    """Пул соединений MySQL с запасом сверх размера пула и таймаутом ожидания"""
+
+    def __init__(self, db_config, size=5, overflow=0, timeout=10.0, statements=0):
+        self.connect_args = {
+            'host': db_config['host'],
+            'user': db_config['user'],
+            'password': db_config['password'],
+            'database': db_config['database'],
+            'port': int(db_config.get('port', '3306'))
+        }
+        self.size = max(1, min(int(size), pooling.CNX_POOL_MAXSIZE))
+        self.overflow = max(0, int(overflow))
+        self.timeout = float(timeout)
+
+        # Подготовленные запросы соединений пула (statements.py), ключ -
+        # номер соединения на сервере. Сброс сессии при возврате соединения
+        # в пул закрыл бы их на сервере, поэтому пул сессию не сбрасывает:
+        # connection сбрасывает её сама у соединений без кэша, а у
+        # соединений с кэшем только откатывает незавершённую транзакцию.
+        # Переменные сессии, временные таблицы и блокировки GET_LOCK у них
+        # переживают возврат в пул - приложение их после операции не
+        # оставляет (schema_lock снимает блокировку сам)
+        self.max_statements = max(0, int(statements))
+        self.statement_stats = StatementStats() if self.max_statements else None
+        self._statements = OrderedDict()
+        self._statements_lock = threading.Lock()
+
+        # Постоянные соединения пула создаются сразу, поэтому ошибка
+        # подключения проявится здесь, а не при первом запросе
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=f"library_pool_{id(self)}",
+            pool_size=self.size,
+            pool_reset_session=not self.max_statements,
+            **self.connect_args
+        )
+        # Общее число одновременно выданных соединений: пул + запас
+        self._slots = threading.BoundedSemaphore(self.size + self.overflow)
+
+    @contextmanager
+    def connection(self):
+        """Выдача соединения из пула на время блока with"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pooling.PoolError(
+                msg=f"Нет свободных соединений с БД в течение {self.timeout:g} с"
+            )
+        try:
+            try:
+                connection = self._pool.get_connection()
+            except pooling.PoolError:
+                # Пул исчерпан - открываем временное соединение из запаса
+                connection = mysql.connector.connect(**self.connect_args)
+            try:
+                yield connection
+            finally:
+                try:
+                    if self.has_statements(connection):
+                        # Снимок чтения не должен достаться следующей операции
+                        if connection.in_transaction:
+                            connection.rollback()
+                    elif self.max_statements and self.pooled(connection):
+                        connection.reset_session()
+                except Error:
+                    pass
+                # Для соединения пула close() возвращает его в пул,
+                # временное соединение закрывается по-настоящему
+                connection.close()
+        finally:
+            self._slots.release()
+
+    def statements(self, connection):
+        """Кэш подготовленных запросов соединения (None - для него кэша нет)
+
+        Кэш есть только у постоянных соединений пула: временное соединение
+        из запаса закрывается после операции. Пул выдаёт каждый раз новую
+        обёртку над соединением, поэтому ключ кэша - номер соединения на
+        сервере: он меняется при переподключении, вместе с которым сервер
+        теряет и подготовленные запросы.
+        """
+        if not self.max_statements or not self.pooled(connection):
+            return None
+        key = connection.connection_id
+        if key is None:
+            return None
+        with self._statements_lock:
+            statements = self._statements.get(key)
+            if statements is None:
+                statements = PreparedStatements(self.max_statements, self.statement_stats)
+                self._statements[key] = statements
+                # Соединений пула не больше size, лишние кэши остались от
+                # соединений до переподключения
+                while len(self._statements) > self.size:
+                    self._statements.popitem(last=False)
+            else:
+                self._statements.move_to_end(key)
+            return statements
+
+    def has_statements(self, connection):
+        """Есть ли у соединения кэш подготовленных запросов"""
+        if not self.max_statements or not self.pooled(connection):
+            return False
+        with self._statements_lock:
+            return connection.connection_id in self._statements
+
+    @staticmethod
+    def pooled(connection):
+        """Соединение выдано пулом (а не открыто из запаса)"""
+        return isinstance(connection, pooling.PooledMySQLConnection)
+
+    @contextmanager
+    def cursor(self, dictionary=True, prepared=False):
+        """Курсор в отдельной транзакции: commit при успехе, rollback при ошибке
+
+        prepared - запросы выполняются подготовленными (строки - кортежи).
+        """
+        with self.connection() as connection:
+            statements = self.statements(connection) if prepared else None
+            if statements is not None:
+                cursor = PreparedCursor(connection, statements)
+            else:
+                cursor = connection.cursor(dictionary=dictionary)
+            timed_cursor = TimedCursor(cursor)
+            try:
+                yield timed_cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                try:
+                    # Блокировки GET_LOCK не снимаются ни commit, ни
+                    # возвратом соединения в пул
+                    if timed_cursor.user_locks:
+                        release_locks(connection)
+                finally:
+                    cursor.close()
+
+    def close(self):
+        """Закрытие всех простаивающих соединений пула"""
+        self._pool._remove_connections()
+        with self._statements_lock:
+            self._statements.clear()
+
+
+class LibraryStorage:
+    """Хранилище каталога: операции, которые выполняет приложение
+
+    Запросы здесь общие для движков (параметры %s, курсоры и ошибки
+    mysql.connector); движок задаёт пул соединений и то, что у него
+    своё: схему, время сервера, полнотекстовый поиск и потоковое чтение
+    (MySQLStorage, SQLiteStorage в sqlite_storage.py). Хранилище по
+    настройкам создаёт open_storage.
+    """
+
+    # Имя движка (для сообщений и отчётов)
+    engine = None
+
+    # Блокировка читаемой строки до конца транзакции
+    row_lock = ""
+
+    # Префикс запроса плана выполнения (для журнала медленных запросов)
+    explain_prefix = "EXPLAIN "
+
+    # Журнал времени операций (QueryLog); None - операции не замеряются
+    query_log = None
+
+    def __init__(self, pool):
+        self.pool = pool
+        # Есть ли полнотекстовый индекс (выясняется в init_schema)
+        self.fulltext = False
+        # Записывает ли удаления в books_deleted триггер (выясняется в init_schema)
+        self.delete_trigger = False
+
+    def close(self):
+        """Закрытие пула соединений"""
+        self.pool.close()
+
+    def init_schema(self, fulltext=True):
+        """Создание таблиц и индексов, если их ещё нет"""
+        raise NotImplementedError
+
+    @timed
+    def count_books(self):
+        """Общее количество книг"""
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS count FROM books")
+            return cursor.fetchone()['count']
+
+    @timed
+    def sample_books(self, limit=10):
+        """Первые книги таблицы (для диагностики)"""
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT title, author, genre, year FROM books LIMIT %s", (limit,))
+            return cursor.fetchall()
+
+    @timed
+    def load_books(self):
+        """Все книги каталога"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(*self.view_query())
+            return materialize(cursor)
+
+    @timed
+    def get_book(self, book_id):
+        """Книга по id в том виде, в каком её хранит БД (None - книги нет)"""
+        with self.pool.cursor(dictionary=False, prepared=True) as cursor:
+            cursor.execute("SELECT * FROM books WHERE id = %s", (book_id,))
+            rows = materialize(cursor)
+        return rows[0] if rows else None
+
+    @timed
+    def fetch_catalog_page(self, limit, after=None, before=None, offset=None):
+        """Страница каталога в порядке CATALOG_ORDER после ключа after или перед ключом before
+
+        Поиск по индексу (keyset), без OFFSET: стоимость не зависит от того,
+        насколько далеко страница от начала каталога. Для перехода к
+        произвольной позиции (offset) сначала ищется ключ строки по
+        покрывающему индексу, а затем страница читается от этого ключа.
+        """
+        columns = ", ".join(CATALOG_ORDER)
+        query = "SELECT * FROM books"
+        params = ()
+        if offset:
+            with self.pool.cursor(dictionary=False) as cursor:
+                cursor.execute(
+                    f"SELECT {columns} FROM books ORDER BY {columns} LIMIT 1 OFFSET %s",
+                    (offset,)
+                )
+                anchor = cursor.fetchone()
+            if anchor is None:
+                return []
+            condition, params = seek_condition(anchor, '>=')
+            query += f" WHERE {condition} ORDER BY {columns}"
+        elif before is not None:
+            condition, params = seek_condition(before, '<')
+            query += f" WHERE {condition}"
+            query += " ORDER BY " + ", ".join(f"{column} DESC" for column in CATALOG_ORDER)
+        else:
+            if after is not None:
+                condition, params = seek_condition(after, '>')
+                query += f" WHERE {condition}"
+            query += f" ORDER BY {columns}"
+        query += " LIMIT %s"
+
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(query, params + (limit,))
+            books = materialize(cursor)
+
+        # Страница перед ключом читается в обратном порядке
+        if before is not None:
+            books.reverse()
+        return books
+
+    @timed
+    def search_books(self, field, value, order_by='id'):
+        """Поиск книг по вхождению подстроки в поле"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(*self.view_query(('search', field, value, order_by)))
+            return materialize(cursor)
+
+    @timed
+    def filter_books(self, criteria, order_by='rack, shelf, title'):
+        """Книги, у которых поля точно совпадают с заданными критериями"""
+        with self.pool.cursor(dictionary=False, prepared=True) as cursor:
+            cursor.execute(*self.view_query(('filter', criteria, order_by)))
+            return materialize(cursor)
+
+    @timed
+    def find_by_isbn(self, text, limit=500):
+        """Книги по ISBN: точное совпадение или начало номера по ключу isbn13
+
+        Поиск по индексу isbn13 (равенство или LIKE 'префикс%' -
+        просмотр диапазона индекса); текст, не похожий на ISBN, ищется по
+        вхождению в колонку isbn.
+        """
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(*self.view_query(('isbn', text, limit)))
+            return materialize(cursor)
+
+    def fulltext_search(self, text, limit=500):
+        """Полнотекстовый поиск (если fulltext = False, приложение ищет по индексу в памяти)"""
+        raise mysql.connector.NotSupportedError(msg=f"Полнотекстовый индекс не поддерживается ({self.engine})")
+
+    def view_query(self, view=None):
+        """SQL и параметры для вида таблицы
+
+        view - None (весь каталог), ('search', поле, подстрока, порядок),
+        ('filter', {поле: значение}, порядок) или ('fulltext', запрос, limit).
+        """
+        if view is None:
+            return "SELECT * FROM books ORDER BY rack, shelf, title", ()
+
+        kind = view[0]
+        if kind == 'isbn':
+            _, text, limit = view
+            key, prefixes = isbn_lookup(text)
+            if key:
+                return "SELECT * FROM books WHERE isbn13 = %s", (key,)
+            if prefixes:
+                condition = " OR ".join(["isbn13 LIKE %s"] * len(prefixes))
+                return (f"SELECT * FROM books WHERE {condition} ORDER BY isbn13 LIMIT %s",
+                        tuple(f"{prefix}%" for prefix in prefixes) + (int(limit),))
+            return self.view_query(('search', 'isbn', text, 'title'))
+
+        if kind == 'fulltext':
+            _, text, limit = view
+            # В логическом режиме каждое слово ищется как фраза из n-грамм
+            # (книга должна содержать слово целиком), а порядок задаёт
+            # релевантность естественного режима
+            query_words = fulltext_words(text)
+            match = f"MATCH({FULLTEXT_COLUMNS}) AGAINST (%s IN {{}} MODE)"
+            return (
+                f"SELECT * FROM books WHERE {match.format('BOOLEAN')} "
+                f"ORDER BY {match.format('NATURAL LANGUAGE')} DESC, title LIMIT %s",
+                (" ".join(f'"{word}"' for word in query_words), " ".join(query_words), int(limit))
+            )
+
+        if kind == 'search':
+            _, field, value, order_by = view
+            if field not in SEARCH_FIELDS:
+                field = 'title'
+            return (f"SELECT * FROM books WHERE {field} LIKE %s ORDER BY {order_by}",
+                    (f"%{value}%",))
+
+        if kind == 'filter':
+            _, criteria, order_by = view
+            query_parts = []
+            params = []
+            for field, value in criteria.items():
+                if field in FILTER_FIELDS:
+                    query_parts.append(f"{field} = %s")
+                    params.append(value)
+
+            query = "SELECT * FROM books"
+            if query_parts:
+                query += " WHERE " + " AND ".join(query_parts)
+            query += f" ORDER BY {order_by}"
+            return query, tuple(params)
+
+        raise ValueError(f"Неизвестный вид таблицы: {kind}")
+
+    def iter_books(self, view=None, chunk_size=1000):
+        """Потоковое чтение книг вида таблицы пачками по chunk_size строк"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(*self.view_query(view))
+            description = cursor.description
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield materialize_rows(description, rows)
+
+    @timed
+    def distinct_values(self, column, descending=False):
+        """Уникальные непустые значения колонки"""
+        if column not in FILTER_FIELDS:
+            raise ValueError(f"Недопустимая колонка: {column}")
+        condition = f"{column} IS NOT NULL"
+        if column != 'year':
+            condition += f" AND {column} != ''"
+        order = "DESC" if descending else "ASC"
+        with self.pool.cursor(dictionary=False, prepared=True) as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT {column} FROM books WHERE {condition} ORDER BY {column} {order}"
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed
+    def facet_counts(self, selected=None):
+        """Количество книг по значениям жанра, автора, года и стеллажа
+
+        Все фасеты считаются одним запросом: группировки по каждому фасету
+        объединены UNION ALL (аналог GROUPING SETS, которого нет в MySQL),
+        в ответе строк столько, сколько у фасетов значений, а не сочетаний.
+        selected - {фасет: значение} выбранных фильтров: значения фасета
+        считаются среди книг, подходящих под остальные выбранные значения.
+        Возвращает {фасет: [(значение, количество), ...]}.
+        """
+        selected = selected or {}
+        for field in selected:
+            if field not in FACETS:
+                raise ValueError(f"Недопустимая колонка: {field}")
+        parts = []
+        params = []
+        for facet in FACETS:
+            others = [field for field in FACETS if field in selected and field != facet]
+            part = f"SELECT '{facet}', {facet}, COUNT(*) FROM books"
+            if others:
+                part += " WHERE " + " AND ".join(f"{field} = %s" for field in others)
+            parts.append(f"{part} GROUP BY {facet}")
+            params.extend(selected[field] for field in others)
+        counts = {facet: [] for facet in FACETS}
+        with self.pool.cursor(dictionary=False, prepared=True) as cursor:
+            cursor.execute(" UNION ALL ".join(parts), tuple(params))
+            for facet, value, count in cursor.fetchall():
+                counts[facet].append((value, count))
+        return counts
+
+    @timed
+    def insert_book(self, book_data):
+        """Добавление книги, возвращает id новой записи"""
+        with self.pool.cursor(dictionary=False, prepared=True) as cursor:
+            self.check_new_isbns(cursor, [book_data])
+            cursor.execute(INSERT_BOOK_QUERY, book_values(book_data))
+            return cursor.lastrowid
+
+    @timed
+    def insert_books(self, books):
+        """Добавление пачки книг одной транзакцией
+
+        executemany для INSERT ... VALUES отправляет один многострочный
+        INSERT, а коммит (и сброс журнала на диск) выполняется один раз.
+        """
+        rows = [book_values(book) for book in books]
+        if rows:
+            with self.pool.cursor(dictionary=False) as cursor:
+                self.check_new_isbns(cursor, books)
+                cursor.executemany(INSERT_BOOK_QUERY, rows)
+        return len(rows)
+
+    def check_new_isbns(self, cursor, books):
+        """Проверка, что ISBN добавляемых книг ещё нет в каталоге и среди них самих
+
+        Индекс isbn13 не уникальный: в старых каталогах один ISBN бывает у
+        нескольких книг, и их изменение не должно нарушать ключ. Поэтому
+        повтор ISBN запрещается только для новых книг - здесь, в той же
+        транзакции, что и добавление. Повтор - IntegrityError с кодом
+        ER_DUP_ENTRY, как от уникального ключа.
+
+        Чтобы два соединения не добавили один ISBN одновременно (каждое
+        не видит незафиксированную книгу другого), ключи сначала
+        блокируются до конца транзакции (lock_isbns).
+        """
+        keys = Counter(key for key in (isbn_key(book.get('isbn', '')) for book in books) if key)
+        if not keys:
+            return
+        duplicate = next((key for key, count in keys.items() if count > 1), None)
+        if duplicate is None:
+            self.lock_isbns(cursor, keys)
+            placeholders = ", ".join(["%s"] * len(keys))
+            cursor.execute(f"SELECT isbn13 FROM books WHERE isbn13 IN ({placeholders}) "
+                           f"LIMIT 1{self.row_lock}", tuple(keys))
+            rows = cursor.fetchall()
+            duplicate = rows[0][0] if rows else None
+        if duplicate is not None:
+            raise mysql.connector.IntegrityError(
+                msg=f"Duplicate entry '{duplicate}' for key 'isbn13'", errno=errorcode.ER_DUP_ENTRY
+            )
+
+    def lock_isbns(self, cursor, keys):
+        """Блокировка ключей ISBN до конца транзакции cursor (по умолчанию не нужна)"""
+
+    @timed
+    def import_books(self, books, batch_size=500, on_batch=None):
+        """Пакетный импорт книг из любого итерируемого источника
+
+        Записи без обязательных полей пропускаются. Если пачка не
+        вставилась (например, из-за повторного ISBN), её записи
+        добавляются по одной, а не прошедшие записываются в отчёт; импорт
+        продолжается. on_batch(report) вызывается после каждой пачки
+        (в том же потоке, что и импорт).
+        """
+        report = ImportReport()
+        for batch in batches(books, batch_size):
+            valid = [book for book in batch if is_importable(book)]
+            report.skipped += len(batch) - len(valid)
+            if valid:
+                try:
+                    report.added += self.insert_books(valid)
+                except Error:
+                    self._import_one_by_one(valid, report)
+            report.batches += 1
+            if on_batch:
+                on_batch(report)
+        return report
+
+    def _import_one_by_one(self, books, report):
+        """Вставка записей неудавшейся пачки по одной"""
+        failed = 0
+        first_error = None
+        for book in books:
+            try:
+                self.insert_book(book)
+                report.added += 1
+            except Error as e:
+                failed += 1
+                first_error = first_error or str(e)
+        if failed:
+            report.errors.append((report.batches + 1, failed, first_error))
+
+    @timed
+    def update_book(self, book_id, book_data):
+        """Изменение книги с заданным id"""
+        with self.pool.cursor(dictionary=False, prepared=True) as cursor:
+            cursor.execute(UPDATE_BOOK_QUERY, book_values(book_data) + (book_id,))
+            return book_id
+
+    @timed
+    def delete_book(self, book_id):
+        """Удаление одной книги по первичному ключу
+
+        id остальных книг не меняются: порядковые номера строк вычисляются
+        при отображении, а действия интерфейса ссылаются на настоящий id.
+        """
+        with self.pool.cursor() as cursor:
+            cursor.execute("DELETE FROM books WHERE id = %s", (book_id,))
+            if not self.delete_trigger:
+                cursor.execute("REPLACE INTO books_deleted (id) VALUES (%s)", (book_id,))
+        return True
+
+    def server_time(self):
+        """Текущее время сервера БД (метка для обновления по изменениям)"""
+        raise NotImplementedError
+
+    @timed
+    def prune_deleted(self):
+        """Удаление записей об удалениях старше TOMBSTONE_DAYS; возвращает их число
+
+        Каталог, не обновлявшийся дольше, всё равно загружается целиком
+        (fetch_changes). Вызывается периодически, а не при запуске.
+        """
+        cutoff = self.server_time() - timedelta(days=TOMBSTONE_DAYS)
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("DELETE FROM books_deleted WHERE deleted_at < %s", (cutoff,))
+            return cursor.rowcount
+
+    @timed
+    def fetch_changes(self, since, overlap=5):
+        """Книги, изменённые с момента since, и id книг, удалённых с того же момента
+
+        Возвращает (now, rows, deleted_ids, total): now - время сервера до
+        чтения изменений, следующая метка; total - число книг (только если
+        изменения есть). Чтение начинается на overlap секунд раньше since:
+        updated_at хранится с точностью до секунды, а транзакция может
+        зафиксироваться позже, чем записала своё время. Повторно прочитанные
+        книги безопасно применяются ещё раз. Если since старше срока
+        хранения удалений, rows и deleted_ids - None: нужна полная загрузка.
+        """
+        now = self.server_time()
+        if since is None or now - since > timedelta(days=TOMBSTONE_DAYS):
+            return now, None, None, None
+
+        with self.pool.cursor(dictionary=False) as cursor:
+            start = since - timedelta(seconds=int(overlap))
+            cursor.execute("SELECT * FROM books WHERE updated_at >= %s ORDER BY id", (start,))
+            rows = materialize(cursor)
+            cursor.execute("SELECT id FROM books_deleted WHERE deleted_at >= %s", (start,))
+            deleted_ids = [row[0] for row in cursor.fetchall()]
+
+            total = None
+            if rows or deleted_ids:
+                cursor.execute("SELECT COUNT(*) FROM books")
+                total = cursor.fetchone()[0]
+            return now, rows, deleted_ids, total
+
+    @timed
+    def apply_writes(self, writes):
+        """Пачка изменений, отложенных без связи с сервером, одной транзакцией
+
+        writes - [(seq, операция, id книги, данные книги, updated_at)],
+        операция - 'insert', 'update' или 'delete'; отрицательный id - книга,
+        добавленная без сервера, updated_at - версия книги на сервере, с
+        которой начиналось изменение. Изменение конфликтует, если книгу на
+        сервере с тех пор изменили или удалили; оно не применяется, версия
+        сервера сохраняется. Изменение, которое сервер отклонил (повтор
+        ISBN, неверные данные), тоже становится конфликтом. Остальные
+        ошибки (например, разрыв соединения) откатывают всю пачку.
+        Возвращает ({локальный id: id на сервере}, [(seq, updated_at на
+        сервере или None, причина)], {id: updated_at после применённых
+        изменений}) - по последнему проверяются следующие изменения книги.
+        """
+        new_ids = {}
+        conflicts = []
+        versions = {}
+        with self.pool.cursor(dictionary=False) as cursor:
+            for write in writes:
+                # Каждое изменение - под своей точкой сохранения: отклонённое
+                # сервером (например, ISBN, уже добавленный с другого места)
+                # откатывается и становится конфликтом, остальные применяются
+                cursor.execute("SAVEPOINT replay_write")
+                try:
+                    self._apply_write(cursor, write, new_ids, conflicts, versions)
+                except (mysql.connector.IntegrityError, mysql.connector.DataError) as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT replay_write")
+                    conflicts.append((write[0], None, f"сервер отклонил изменение: {e}"))
+                    continue
+                cursor.execute("RELEASE SAVEPOINT replay_write")
+        return new_ids, conflicts, versions
+
+    def _apply_write(self, cursor, write, new_ids, conflicts, versions):
+        """Одно изменение пачки apply_writes (результаты - в new_ids, conflicts, versions)"""
+        seq, operation, book_id, book_data, base_updated_at = write
+        if operation == 'insert':
+            self.check_new_isbns(cursor, [book_data])
+            cursor.execute(INSERT_BOOK_QUERY, book_values(book_data))
+            new_ids[book_id] = cursor.lastrowid
+            return
+
+        book_id = new_ids.get(book_id, book_id)
+        if book_id < 0:
+            conflicts.append((seq, None, "книга не была добавлена на сервер"))
+            return
+
+        # Строка блокируется до конца транзакции, чтобы между
+        # проверкой и изменением её не изменили другие
+        cursor.execute(f"SELECT updated_at FROM books WHERE id = %s{self.row_lock}", (book_id,))
+        row = cursor.fetchone()
+        server_updated_at = as_datetime(row[0]) if row else None
+        base_updated_at = versions.get(book_id, base_updated_at)
+        if base_updated_at is not None:
+            if server_updated_at is None:
+                if operation != 'delete':
+                    conflicts.append((seq, None, "книга удалена на сервере"))
+                return
+            if server_updated_at != base_updated_at:
+                conflicts.append((seq, server_updated_at, "книга изменена на сервере"))
+                return
+
+        if operation == 'update':
+            cursor.execute(UPDATE_BOOK_QUERY, book_values(book_data) + (book_id,))
+            cursor.execute("SELECT updated_at FROM books WHERE id = %s", (book_id,))
+            versions[book_id] = as_datetime(cursor.fetchone()[0])
+        elif operation == 'delete':
+            cursor.execute("DELETE FROM books WHERE id = %s", (book_id,))
+            if not self.delete_trigger:
+                cursor.execute("REPLACE INTO books_deleted (id) VALUES (%s)", (book_id,))
+            versions.pop(book_id, None)
+
+
+class MySQLStorage(LibraryStorage):
+    """Хранилище каталога на сервере MySQL; каждая операция берёт своё соединение из пула"""
+
+    engine = 'mysql'
+    row_lock = " FOR UPDATE"
+
+    def __init__(self, db_config, pool_config=None):
+        pool_config = pool_config or DEFAULT_POOL_CONFIG
+        super().__init__(ConnectionPool(
+            db_config,
+            size=pool_config.get('size', DEFAULT_POOL_CONFIG['size']),
+            overflow=pool_config.get('overflow', DEFAULT_POOL_CONFIG['overflow']),
+            timeout=pool_config.get('timeout', DEFAULT_POOL_CONFIG['timeout']),
+            statements=pool_config.get('statements', DEFAULT_POOL_CONFIG['statements'])
+        ))
+
+    def lock_isbns(self, cursor, keys):
+        """Именованные блокировки сервера на ключи ISBN (GET_LOCK) до конца транзакции
+
+        SELECT ... FOR UPDATE по ключу, которого ещё нет в неуникальном
+        индексе, блокирует только промежуток, а при READ COMMITTED не
+        блокирует ничего. Блокировка по имени 'isbn:<ключ>:<база>'
+        работает при любом уровне изоляции. Ключи блокируются в
+        одном порядке, поэтому пачки не ждут друг друга по кругу.
+        """
+        keys = sorted(keys)
+        lock = "GET_LOCK(LEFT(CONCAT('isbn:', %s, ':', DATABASE()), 64), %s)"
+        params = []
+        for key in keys:
+            params.extend((key, ISBN_LOCK_TIMEOUT))
+        cursor.user_locks = True
+        cursor.execute(f"SELECT {', '.join([lock] * len(keys))}", tuple(params))
+        if any(value != 1 for value in cursor.fetchone()):
+            raise mysql.connector.OperationalError(
+                msg=f"ISBN добавляет другое соединение: блокировка не получена за {ISBN_LOCK_TIMEOUT} с"
+            )
+
+    def init_schema(self, fulltext=True):
+        """Проверка версии схемы и, если она отстаёт, применение миграций
+
+        Обычно это один запрос (schema_state) без записи; миграции
+        выполняются под блокировкой сервера (migrations.py). fulltext -
+        создать FULLTEXT-индекс для поиска, если его ещё нет и прежняя
+        попытка не закончилась ошибкой. Старые записи об удалениях чистит
+        prune_deleted, а не запуск.
+        """
+        version, self.delete_trigger, self.fulltext, failed = schema_state(self.pool)
+        create_fulltext = fulltext and not self.fulltext and not failed
+        if version < SCHEMA_VERSION or create_fulltext:
+            with self.pool.connection() as connection:
+                with schema_lock(connection):
+                    migrate(connection)
+                    if create_fulltext:
+                        cursor = connection.cursor(dictionary=True)
+                        try:
+                            add_fulltext_index(cursor, FULLTEXT_COLUMNS)
+                            connection.commit()
+                        finally:
+                            cursor.close()
+            version, self.delete_trigger, self.fulltext, failed = schema_state(self.pool)
+
+    def server_time(self):
+        """Текущее время сервера БД (метка для обновления по изменениям)"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute("SELECT NOW()")
+            return cursor.fetchone()[0]
+
+    @timed
+    def fulltext_search(self, text, limit=500):
+        """Полнотекстовый поиск по названию, автору и издательству с ранжированием"""
+        with self.pool.cursor(dictionary=False) as cursor:
+            cursor.execute(*self.view_query(('fulltext', text, limit)))
+            return materialize(cursor)
+
+    def iter_books(self, view=None, chunk_size=1000):
+        """Потоковое чтение книг вида таблицы пачками по chunk_size строк
+
+        Курсор небуферизованный: сервер отдаёт строки по мере чтения, и в
+        памяти клиента одновременно находится только одна пачка. Соединение
+        занято, пока генератор не дочитан или не закрыт.
+        """
+        with self.pool.connection() as connection:
+            cursor = TimedCursor(connection.cursor(buffered=False))
+            try:
+                cursor.execute(*self.view_query(view))
+                description = cursor.description
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield materialize_rows(description, rows)
+            finally:
+                # Недочитанный результат нужно забрать, иначе соединение
+                # нельзя вернуть в пул
+                if connection.unread_result:
+                    connection.consume_results()
+                cursor.close()
+
+
+class CatalogPager:
+    """Кэш страниц каталога с доступом по индексу строки
+
+    Служит источником строк для виртуальной таблицы: len() - общее число
+    книг на сервере, pager[i] - строка или None, если её страница ещё не
+    загружена. В памяти хранится не больше max_pages страниц (вытесняются
+    давно не использованные), поэтому расход памяти не зависит от размера
+    каталога. Для каждой страницы хранятся ключи её первой и последней
+    строки (см. CATALOG_ORDER), по ним загружаются соседние страницы.
+    """
+
+    def __init__(self, page_size=200, max_pages=5):
+        self.page_size = max(1, int(page_size))
+        self.max_pages = max(3, int(max_pages))
+        self.pages = OrderedDict()
+        self.total = 0
+        self.generation = 0
+
+    def reset(self, total, rows=None, first_key=None, last_key=None):
+        """Новое состояние каталога: общее количество книг и (необязательно) первая страница"""
+        self.invalidate()
+        self.total = total
+        if rows:
+            self.add_page(0, rows, first_key, last_key)
+
+    def invalidate(self):
+        """Сброс загруженных страниц (например, после изменения данных)"""
+        self.generation += 1
+        self.pages.clear()
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        page_no, position = divmod(index, self.page_size)
+        page = self.pages.get(page_no)
+        if page is None:
+            return None
+        self.pages.move_to_end(page_no)
+        rows = page[0]
+        return rows[position] if position < len(rows) else None
+
+    def rows(self):
+        """Все загруженные строки (в порядке номеров страниц)"""
+        return [row for page_no in sorted(self.pages) for row in self.pages[page_no][0]]
+
+    def find(self, book_id):
+        """Номер страницы и позиция загруженной строки с заданным id (или None)"""
+        for page_no, page in self.pages.items():
+            for position, row in enumerate(page[0]):
+                if row.get('id') == book_id:
+                    return page_no, position
+        return None
+
+    def replace(self, book_id, row):
+        """Замена загруженной строки без сброса страниц
+
+        Возможна, только если ключ сортировки строки не изменился, иначе
+        книга переезжает на другое место каталога и страницы нужно сбросить.
+        Возвращает True, если строка заменена.
+        """
+        found = self.find(book_id)
+        if found is None:
+            return False
+        page_no, position = found
+        rows = self.pages[page_no][0]
+        try:
+            if catalog_key(rows[position]) != catalog_key(row):
+                return False
+        except KeyError:
+            return False
+        rows[position] = row
+        return True
+
+    def missing_pages(self, start, stop):
+        """Номера не загруженных страниц для строк start..stop"""
+        if stop <= start:
+            return []
+        first_page = start // self.page_size
+        last_page = (stop - 1) // self.page_size
+        return [page_no for page_no in range(first_page, last_page + 1)
+                if page_no not in self.pages]
+
+    def page_request(self, page_no):
+        """Параметры fetch_catalog_page для страницы: от соседней страницы или по смещению"""
+        previous = self.pages.get(page_no - 1)
+        if previous is not None:
+            return {'after': previous[2]}
+        following = self.pages.get(page_no + 1)
+        if following is not None:
+            return {'before': following[1]}
+        return {'offset': page_no * self.page_size}
+
+    def add_page(self, page_no, rows, first_key, last_key):
+        """Сохранение загруженной страницы с вытеснением давно не использованных"""
+        self.pages[page_no] = (rows, first_key, last_key)
+        self.pages.move_to_end(page_no)
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+
+def release_locks(connection):
+    """Снятие всех именованных блокировок (GET_LOCK) соединения"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT RELEASE_ALL_LOCKS()")
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def catalog_key(book):
+    """Ключ строки каталога в порядке CATALOG_ORDER"""
+    return tuple(book[column] for column in CATALOG_ORDER)
+
+
+def seek_condition(key, op):
+    """Условие WHERE и параметры для строк после (op '>', '>=') или перед ('<') ключом
+
+    Сравнение кортежей (rack, shelf, title, id) > (...) оптимизатор MySQL
+    не всегда превращает в просмотр диапазона индекса, поэтому условие
+    раскрывается: rack > %s OR (rack = %s AND (shelf > %s OR ...)).
+    Первое условие rack >= %s задаёт границу диапазона по индексу.
+    """
+    strict = op[0]
+    columns = list(CATALOG_ORDER)
+    condition = f"{columns[-1]} {op} %s"
+    params = (key[-1],)
+    for column, value in zip(reversed(columns[:-1]), reversed(tuple(key)[:-1])):
+        condition = f"{column} {strict} %s OR ({column} = %s AND ({condition}))"
+        params = (value, value) + params
+    return f"{columns[0]} {strict}= %s AND ({condition})", (key[0],) + params
+
+
+def as_datetime(value):
+    """Время из значения колонки TIMESTAMP (драйвер может вернуть текст)"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def catalog_sort_key(book):
+    """Ключ сортировки каталога в памяти (без учёта регистра, как в MySQL)"""
+    *columns, id_column = CATALOG_ORDER
+    return tuple(str(book.get(column) or "").casefold() for column in columns) + (book.get(id_column) or 0,)
+
+
+class ImportReport:
+    """Итог пакетного импорта: добавлено, пропущено и ошибки по пачкам"""
+
+    def __init__(self):
+        self.added = 0
+        self.skipped = 0
+        self.batches = 0
+        self.errors = []
+
+    @property
+    def failed(self):
+        """Число записей в пачках, завершившихся ошибкой"""
+        return sum(count for _, count, _ in self.errors)
+
+
+def batches(items, size):
+    """Разбиение итерируемого источника на списки не длиннее size"""
+    size = max(1, int(size))
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def is_importable(book):
+    """Есть ли в записи импорта обязательные поля"""
+    return isinstance(book, dict) and all(field in book for field in REQUIRED_FIELDS)
+
+
+def fulltext_words(text):
+    """Слова запроса полнотекстового поиска без операторов логического режима
+
+    Слова короче n-граммы (2 символа) парсер ngram не индексирует.
+    """
+    return [word for word in re.findall(r"\w+", str(text)) if len(word) >= 2]
+
+
+def book_values(book_data):
+    """Значения полей книги в порядке колонок INSERT/UPDATE"""
+    return (
+        book_data['title'],
+        book_data['author'],
+        book_data['year'],
+        book_data.get('genre', ''),
+        book_data.get('publisher', ''),
+        book_data.get('isbn', ''),
+        book_data.get('quantity', 1),
+        book_data.get('rack', ''),
+        book_data.get('shelf', ''),
+        isbn_key(book_data.get('isbn', ''))
+    )
+
+
+def load_section(config, name, defaults):
+    """Настройки секции [name] конфигурации; чего в ней нет - из defaults
+
+    Значения приводятся к типам значений по умолчанию: флаги читаются
+    getboolean (yes/no, true/false, on/off, 1/0), числа - getint и
+    getfloat. Значение, которое не читается, пишется в журнал и заменяется
+    значением по умолчанию.
+    """
+    settings = dict(defaults)
+    if not config.has_section(name):
+        return settings
+    section = config[name]
+    for key, default in defaults.items():
+        if key not in section:
+            continue
+        try:
+            if isinstance(default, bool):
+                settings[key] = section.getboolean(key)
+            elif isinstance(default, int):
+                settings[key] = section.getint(key)
+            elif isinstance(default, float):
+                settings[key] = section.getfloat(key)
+            else:
+                settings[key] = section.get(key).strip()
+        except ValueError as e:
+            log.warning("Недопустимое значение в конфигурации", section=name, key=key,
+                        default=default, error=e)
+    return settings
+
+
+def open_storage(storage_config, db_config=None, pool_config=None, base_dir=""):
+    """Хранилище каталога по настройкам секции [storage]
+
+    Для SQLite относительный путь к файлу отсчитывается от base_dir.
+    """
+    engine = storage_config.get('engine', DEFAULT_STORAGE_CONFIG['engine']).lower()
+    if engine == 'mysql':
+        return MySQLStorage(db_config, pool_config)
+    if engine == 'sqlite':
+        # Модуль SQLite сам импортирует этот модуль
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.path.join(base_dir, storage_config.get('file', DEFAULT_STORAGE_CONFIG['file'])))
+    raise ValueError(f"Неизвестный движок хранилища: {engine} (допустимо: {', '.join(STORAGE_ENGINES)})")
+
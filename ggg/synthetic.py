@@ -0,0 +1,120 @@
+"""Генератор синтетического каталога по распределениям тестовых данных
+
+Распределения берутся из тестовых книг скрипта library_db.sql (папка
+«устонови меня»): авторы - с частотами из скрипта, жанр, издательство,
+год и названия - из книг того же автора, количество экземпляров и полки
+1-20 - с частотами из скрипта, стеллажи AA-FJ - с частотами из скрипта
+(стеллажи, которых там нет, тоже встречаются, но реже). ISBN-13 уникальны
+и с верной контрольной цифрой. При одном и том же seed получаются одни и
+те же книги.
+
+Запуск: python synthetic.py [число книг] [файл] - запись в NDJSON (или
+JSON-массив, если файл .json) для проверки импорта.
+"""
+import os
+import random
+import re
+import sys
+from collections import Counter
+from itertools import accumulate
+
+from isbn import isbn13_check_digit
+from json_stream import write_json_records
+
+
+DEFAULT_SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 os.pardir, "устонови меня", "library_db.sql")
+
+# Стеллажи AA, AB, ... FJ и полки 1-20
+RACKS = [first + second for first in "ABCDEF" for second in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"]
+RACKS = RACKS[:RACKS.index("FJ") + 1]
+SHELVES = [str(shelf) for shelf in range(1, 21)]
+
+# Строка VALUES скрипта: (title, author, year, genre, publisher, isbn, quantity, rack, shelf)
+_text = r"'((?:[^']|'')*)'"
+_seed_row_re = re.compile(
+    rf"\({_text}, {_text}, (\d+), {_text}, {_text}, {_text}, (\d+), {_text}, {_text}\)"
+)
+
+
+def load_seed(path=DEFAULT_SEED_FILE):
+    """Книги из INSERT скрипта тестовых данных"""
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+    books = []
+    for match in _seed_row_re.finditer(text):
+        title, author, year, genre, publisher, isbn, quantity, rack, shelf = (
+            value.replace("''", "'") for value in match.groups()
+        )
+        books.append({
+            'title': title, 'author': author, 'year': int(year), 'genre': genre,
+            'publisher': publisher, 'isbn': isbn, 'quantity': int(quantity),
+            'rack': rack, 'shelf': shelf
+        })
+    if not books:
+        raise ValueError(f"В файле {path} нет строк с тестовыми книгами")
+    return books
+
+
+class SeedProfile:
+    """Распределения значений колонок тестовых книг"""
+
+    def __init__(self, books):
+        self.by_author = {}
+        for book in books:
+            self.by_author.setdefault(book['author'], []).append(book)
+        self.authors = list(self.by_author)
+        # Накопленные веса: random.choices не пересчитывает их на каждую книгу
+        self.author_weights = list(accumulate(len(self.by_author[author]) for author in self.authors))
+        self.quantities, self.quantity_weights = self._weights(Counter(book['quantity'] for book in books))
+        shelves = Counter(book['shelf'] for book in books)
+        self.shelf_weights = list(accumulate(shelves[shelf] + 1 for shelf in SHELVES))
+        racks = Counter(book['rack'] for book in books)
+        self.rack_weights = list(accumulate(racks[rack] + 1 for rack in RACKS))
+
+    @staticmethod
+    def _weights(counter):
+        values = sorted(counter)
+        return values, list(accumulate(counter[value] for value in values))
+
+    def book(self, number, rng):
+        """Книга с порядковым номером number (номер делает уникальными название и ISBN)"""
+        author = rng.choices(self.authors, cum_weights=self.author_weights)[0]
+        sample = rng.choice(self.by_author[author])
+        return {
+            'title': f"{rng.choice(self.by_author[author])['title']}, кн. {number}",
+            'author': author,
+            'year': sample['year'] + rng.randint(-5, 5),
+            'genre': sample['genre'],
+            'publisher': rng.choice(self.by_author[author])['publisher'],
+            'isbn': synthetic_isbn(number),
+            'quantity': rng.choices(self.quantities, cum_weights=self.quantity_weights)[0],
+            'rack': rng.choices(RACKS, cum_weights=self.rack_weights)[0],
+            'shelf': rng.choices(SHELVES, cum_weights=self.shelf_weights)[0]
+        }
+
+
+def synthetic_isbn(number):
+    """ISBN-13 978-5-... с верной контрольной цифрой (уникален для number < 10**8)"""
+    first12 = f"9785{number % 10 ** 8:08d}"
+    return f"{first12[:3]}-{first12[3]}-{first12[4:8]}-{first12[8:]}-{isbn13_check_digit(first12)}"
+
+
+def generate_books(count, profile=None, seed=1, start=1):
+    """count книг с номерами от start (генератор: каталог не держится в памяти)"""
+    profile = profile or SeedProfile(load_seed())
+    rng = random.Random(seed)
+    for number in range(start, start + count):
+        yield profile.book(number, rng)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = sys.argv[2] if len(sys.argv) > 2 else f"books_{count}.ndjson"
+    with open(path, 'w', encoding='utf-8') as file:
+        written = write_json_records(file, generate_books(count), ndjson=not path.endswith(".json"))
+    print(f"Записано книг: {written} -> {path}")
+
+
+if __name__ == "__main__":
+    main()
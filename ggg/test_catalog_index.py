@@ -0,0 +1,62 @@
+"""Тесты колоночного индекса каталога (catalog_index)"""
+import unittest
+
+from catalog_index import CatalogIndex, load_numpy
+
+
+BOOKS = [
+    {'id': 1, 'title': 'яблоко', 'author': 'Пушкин', 'genre': 'Роман', 'rack': 'a', 'shelf': '1', 'year': 1830},
+    {'id': 2, 'title': 'Арбуз', 'author': 'пушкин ', 'genre': 'роман', 'rack': 'A', 'shelf': '2', 'year': 1833},
+    {'id': 3, 'title': 'book', 'author': 'Толстой', 'genre': 'Роман', 'rack': 'B', 'shelf': '1', 'year': 1869},
+    {'id': 4, 'title': 'Book 2', 'author': 'Пушкин', 'genre': 'Поэзия', 'rack': 'B', 'shelf': '', 'year': 1830},
+    {'id': 5, 'title': None, 'author': 'Гоголь', 'genre': '', 'rack': '', 'shelf': '', 'year': 0},
+]
+
+
+class CatalogIndexTest(unittest.TestCase):
+
+    use_numpy = False
+
+    def setUp(self):
+        self.index = CatalogIndex([dict(book) for book in BOOKS], use_numpy=self.use_numpy)
+
+    def ids(self, rows):
+        return [row['id'] for row in rows]
+
+    def test_filter_ignores_case_and_spaces(self):
+        self.assertEqual(self.ids(self.index.filter({'author': 'ПУШКИН'})), [1, 2, 4])
+        self.assertEqual(self.ids(self.index.filter({'author': 'пушкин', 'genre': 'роман'})), [1, 2])
+
+    def test_filter_unknown_value(self):
+        self.assertEqual(self.index.filter({'author': 'Чехов'}), [])
+
+    def test_order_by_ignores_case(self):
+        rows = self.index.filter({'genre': 'Роман'}, order_by='title')
+        self.assertEqual(self.ids(rows), [3, 2, 1])
+        rows = self.index.filter({'year': 1830}, order_by='rack, shelf, title')
+        self.assertEqual(self.ids(rows), [1, 4])
+
+    def test_order_by_empty_value_first(self):
+        books = [dict(BOOKS[0]), dict(BOOKS[4], genre='Роман')]
+        index = CatalogIndex(books, use_numpy=self.use_numpy)
+        self.assertEqual(self.ids(index.filter({'genre': 'роман'}, order_by='title')), [5, 1])
+
+    def test_update_and_remove(self):
+        self.index.update(3, dict(BOOKS[2], author='Пушкин'))
+        self.index.remove(1)
+        self.assertEqual(self.ids(self.index.filter({'author': 'Пушкин'}, order_by='title')), [3, 4, 2])
+
+    def test_facet_counts(self):
+        counts = self.index.facet_counts({'author': 'Пушкин'}, ('genre', 'author'))
+        self.assertEqual(sorted(counts['genre']), [('Поэзия', 1), ('Роман', 2)])
+        self.assertEqual(sorted(counts['author']), [('Гоголь', 1), ('Пушкин', 3), ('Толстой', 1)])
+
+
+@unittest.skipIf(load_numpy() is None, "NumPy не установлен")
+class NumpyCatalogIndexTest(CatalogIndexTest):
+
+    use_numpy = True
+
+
+if __name__ == '__main__':
+    unittest.main()
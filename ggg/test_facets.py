@@ -0,0 +1,93 @@
+"""Тесты кэша фасетов (facets)"""
+import unittest
+
+from facets import FacetCache, facet_value, selected_values
+
+
+BOOKS = [
+    {'id': 1, 'genre': 'Роман', 'author': 'Толстой', 'year': 1869, 'rack': 'a'},
+    {'id': 2, 'genre': 'Роман', 'author': 'Пушкин', 'year': 1833, 'rack': 'A'},
+    {'id': 3, 'genre': 'Поэзия', 'author': 'Пушкин', 'year': 1830, 'rack': 'B'},
+    {'id': 4, 'genre': '', 'author': 'Гоголь', 'year': 0, 'rack': None},
+]
+
+
+def loaded_cache(books=BOOKS):
+    cache = FacetCache()
+    for book in books:
+        cache.add(book)
+    cache.loaded = True
+    return cache
+
+
+class FacetValueTest(unittest.TestCase):
+
+    def test_empty_values(self):
+        for facet, value in (('genre', None), ('genre', '  '), ('year', 0), ('year', '0')):
+            with self.subTest(facet=facet, value=value):
+                self.assertIsNone(facet_value(facet, value))
+
+    def test_rack_upper_case(self):
+        self.assertEqual(facet_value('rack', ' b1 '), 'B1')
+
+    def test_selected_values(self):
+        self.assertEqual(selected_values({'genre': ' Роман ', 'year': 0, 'shelf': '2'}), {'genre': 'Роман'})
+
+
+class FacetCacheTest(unittest.TestCase):
+
+    def test_load(self):
+        cache = FacetCache()
+        cache.load({'genre': [('Роман', 2), ('Поэзия', 1), ('', 1)], 'year': [(1830, 1), (1869, 1)]})
+        self.assertEqual(cache.values('genre'), ['Поэзия', 'Роман'])
+        self.assertEqual(cache.values('year'), ['1869', '1830'])
+        self.assertEqual(cache.values('author'), [])
+
+    def test_add_update_remove(self):
+        cache = loaded_cache()
+        self.assertEqual(cache.values('rack'), ['A', 'B'])
+        version = cache.version
+        cache.update(BOOKS[2], dict(BOOKS[2], rack='C'))
+        cache.remove(BOOKS[0])
+        self.assertEqual(cache.values('rack'), ['A', 'C'])
+        self.assertEqual(cache.values('author'), ['Гоголь', 'Пушкин'])
+        self.assertGreater(cache.version, version)
+
+    def test_update_without_facet_change_keeps_version(self):
+        cache = loaded_cache()
+        version = cache.version
+        cache.update(BOOKS[0], dict(BOOKS[0], title='Война и мир'))
+        self.assertEqual(cache.version, version)
+
+    def test_drill_down_without_selection(self):
+        counts = loaded_cache().drill_down({})
+        self.assertEqual(counts['author'], [('Гоголь', 1), ('Пушкин', 2), ('Толстой', 1)])
+
+    def test_drill_down_uses_stored_result(self):
+        cache = loaded_cache()
+        selected = {'author': 'Пушкин'}
+        self.assertIsNone(cache.drill_down(selected))
+        result = cache.store(selected, cache.version, {'genre': [('Роман', 1), ('Поэзия', 1)],
+                                                       'author': [('Пушкин', 2), ('Толстой', 1)]})
+        self.assertEqual(cache.drill_down({'author': ' Пушкин '}), result)
+        self.assertEqual(result['genre'], [('Поэзия', 1), ('Роман', 1)])
+
+    def test_stale_result_is_not_stored(self):
+        cache = loaded_cache()
+        version = cache.version
+        cache.add({'id': 5, 'author': 'Чехов'})
+        cache.store({'author': 'Пушкин'}, version, {'genre': [('Роман', 1)]})
+        self.assertIsNone(cache.drill_down({'author': 'Пушкин'}))
+
+    def test_count(self):
+        cache = loaded_cache()
+        self.assertIsNone(cache.count({}))
+        self.assertEqual(cache.count({'author': 'Чехов'}), 0)
+        self.assertIsNone(cache.count({'author': 'Пушкин', 'genre': 'Роман'}))
+        cache.store({'author': 'Пушкин', 'genre': 'Роман'}, cache.version,
+                    {'author': [('Пушкин', 1), ('Толстой', 1)], 'genre': [('Роман', 1), ('Поэзия', 1)]})
+        self.assertEqual(cache.count({'author': 'Пушкин', 'genre': 'Роман'}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Тесты нормализации ISBN (isbn)"""
+import unittest
+
+from isbn import clean_isbn, isbn_key, isbn_lookup, normalize_isbn
+
+
+class NormalizeIsbnTest(unittest.TestCase):
+
+    def test_clean(self):
+        self.assertEqual(clean_isbn(" 5-17-090630-x "), "517090630X")
+        self.assertEqual(clean_isbn(None), "")
+
+    def test_isbn13(self):
+        self.assertEqual(normalize_isbn("978-5-17-090630-7"), "9785170906307")
+        self.assertEqual(normalize_isbn("978 5 17 090630 7"), "9785170906307")
+
+    def test_isbn10_converted_to_isbn13(self):
+        self.assertEqual(normalize_isbn("5-17-090630-7"), "9785170906307")
+        self.assertEqual(normalize_isbn("0-8044-2957-x"), "9780804429573")
+
+    def test_bad_check_digit(self):
+        self.assertIsNone(normalize_isbn("978-5-17-090630-8"))
+        self.assertIsNone(normalize_isbn("5-17-090630-3"))
+
+    def test_not_isbn(self):
+        for text in ("", "abc", "12345", "1234567890123", "978517090630"):
+            with self.subTest(text=text):
+                self.assertIsNone(normalize_isbn(text))
+
+
+class IsbnKeyTest(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(isbn_key("978-5-17-090630-7"), "9785170906307")
+        self.assertEqual(isbn_key("5170906307"), "9785170906307")
+
+    def test_bad_check_digit_has_no_key(self):
+        self.assertIsNone(isbn_key("978-5-17-090630-8"))
+        self.assertIsNone(isbn_key("9785170906308"))
+
+    def test_empty(self):
+        self.assertIsNone(isbn_key(""))
+        self.assertIsNone(isbn_key(None))
+
+
+class IsbnLookupTest(unittest.TestCase):
+
+    def test_exact(self):
+        self.assertEqual(isbn_lookup("5-17-090630-7"), ("9785170906307", []))
+
+    def test_isbn13_prefix(self):
+        self.assertEqual(isbn_lookup("978-5-17"), (None, ["978517", "978978517"]))
+
+    def test_short_prefix_as_isbn10_and_isbn13(self):
+        self.assertEqual(isbn_lookup("978"), (None, ["978", "978978"]))
+        self.assertEqual(isbn_lookup("517"), (None, ["978517"]))
+
+    def test_too_short_or_not_digits(self):
+        self.assertEqual(isbn_lookup("97"), (None, []))
+        self.assertEqual(isbn_lookup("abc-1"), (None, []))
+
+    def test_bad_check_digit_is_not_a_key(self):
+        self.assertEqual(isbn_lookup("978-5-17-090630-8"), (None, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
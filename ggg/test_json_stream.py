@@ -0,0 +1,120 @@
+"""Тесты потокового чтения и записи JSON (json_stream)"""
+import io
+import json
+import unittest
+
+from json_stream import JSONStreamError, iter_json_records, write_json_records
+
+
+class CountingFile(io.StringIO):
+    """Файл, считающий вызовы read"""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def records(text, **kwargs):
+    return list(iter_json_records(io.StringIO(text), **kwargs))
+
+
+class IterJsonRecordsTest(unittest.TestCase):
+
+    books = [
+        {"title": "Война и мир", "author": "Толстой Л. Н.", "year": 1869, "price": 12.5},
+        {"title": "Строка с \"кавычками\" и \\u0441", "isbn": "978-5-17-090630-7", "rack": None},
+        {"title": "Логические", "available": True, "deleted": False, "tags": []},
+        {"title": "Числа", "copies": 123456789, "ratio": -1.25e-5},
+    ]
+
+    def test_array(self):
+        text = json.dumps(self.books, ensure_ascii=False, indent=2)
+        self.assertEqual(records(text), self.books)
+
+    def test_ndjson(self):
+        text = "\n".join(json.dumps(book, ensure_ascii=False) for book in self.books) + "\n"
+        self.assertEqual(records(text), self.books)
+
+    def test_empty(self):
+        self.assertEqual(records("[]"), [])
+        self.assertEqual(records("  [ ]\n"), [])
+        self.assertEqual(records(""), [])
+
+    def test_value_split_at_every_chunk_boundary(self):
+        # Значения обрываются на границе блока в любом месте:
+        # внутри строк, \\uXXXX, чисел, true/false/null
+        text = json.dumps(self.books, ensure_ascii=True)
+        for chunk_size in (1, 2, 3, 5, 7, 16, 31):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(records(text, chunk_size=chunk_size), self.books)
+
+    def test_number_split_at_chunk_boundary(self):
+        text = "[1234567, 2.5e-10]"
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(records(text, chunk_size=chunk_size), [1234567, 2.5e-10])
+
+    def test_syntax_error_mid_file_is_reported_at_once(self):
+        good = ",".join(json.dumps({"id": i, "title": "x" * 50}) for i in range(2000))
+        text = '[{"id": 0, "title": "a" "b"},' + good + "]"
+        file = CountingFile(text)
+        with self.assertRaises(JSONStreamError) as raised:
+            list(iter_json_records(file, chunk_size=4096))
+        self.assertIn("позиции 24", str(raised.exception))
+        # Ошибка в начале файла не заставляет дочитывать файл до конца
+        self.assertLessEqual(file.reads, 2)
+
+    def test_truncated_file(self):
+        text = json.dumps(self.books)
+        for cut in (len(text) - 1, len(text) // 2, 1):
+            with self.subTest(cut=cut):
+                with self.assertRaises(JSONStreamError):
+                    records(text[:cut], chunk_size=8)
+
+    def test_unterminated_string_at_end(self):
+        with self.assertRaises(JSONStreamError):
+            records('[{"title": "без конца', chunk_size=4)
+
+    def test_bad_separator(self):
+        with self.assertRaises(JSONStreamError):
+            records('[{"id": 1} {"id": 2}]')
+
+    def test_trailing_data(self):
+        with self.assertRaises(JSONStreamError):
+            records('[{"id": 1}] {"id": 2}')
+
+    def test_record_size_limit(self):
+        text = json.dumps([{"title": "x" * 1000}, {"title": "y"}])
+        with self.assertRaises(JSONStreamError):
+            records(text, chunk_size=64, max_record_size=256)
+        self.assertEqual(len(records(text, chunk_size=64, max_record_size=4096)), 2)
+
+
+class WriteJsonRecordsTest(unittest.TestCase):
+
+    books = [{"title": "Мастер и Маргарита", "year": 1967}, {"title": "Многострочное\nназвание"}]
+
+    def test_array_round_trip(self):
+        file = io.StringIO()
+        self.assertEqual(write_json_records(file, iter(self.books)), 2)
+        self.assertEqual(file.getvalue(), json.dumps(self.books, ensure_ascii=False, indent=2))
+        self.assertEqual(records(file.getvalue()), self.books)
+
+    def test_ndjson_round_trip(self):
+        file = io.StringIO()
+        self.assertEqual(write_json_records(file, self.books, ndjson=True), 2)
+        self.assertEqual(len(file.getvalue().splitlines()), 2)
+        self.assertEqual(records(file.getvalue()), self.books)
+
+    def test_empty(self):
+        file = io.StringIO()
+        self.assertEqual(write_json_records(file, []), 0)
+        self.assertEqual(file.getvalue(), "[]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Тесты кэша результатов запросов (query_cache)"""
+import unittest
+
+from query_cache import QueryCache, key_matches, view_key
+
+
+def book(book_id, **fields):
+    return dict({'id': book_id, 'title': 'Книга', 'author': 'Автор', 'genre': 'Роман',
+                 'isbn': '', 'year': 2000, 'rack': 'A', 'shelf': '1'}, **fields)
+
+
+class ViewKeyTest(unittest.TestCase):
+
+    def test_filter_values_normalised(self):
+        self.assertEqual(view_key(('filter', {'genre': 'Роман'}, 'rack, shelf,title')),
+                         view_key(('filter', {'genre': ' роман '}, 'rack,shelf, title')))
+
+    def test_isbn_forms(self):
+        self.assertEqual(view_key(('isbn', '5-17-090630-7', 500)),
+                         view_key(('isbn', '978-5-17-090630-7', 500)))
+
+    def test_fulltext_words(self):
+        self.assertEqual(view_key(('fulltext', 'Война и мир', 50)),
+                         view_key(('fulltext', 'мир война И', 50)))
+
+    def test_unknown_view(self):
+        with self.assertRaises(ValueError):
+            view_key(('sql', 'SELECT 1'))
+
+    def test_key_matches(self):
+        key = view_key(('filter', {'genre': 'роман', 'year': 2000}, 'title'))
+        self.assertTrue(key_matches(key, book(1)))
+        self.assertFalse(key_matches(key, book(1, year=1999)))
+        key = view_key(('isbn', '978-5-17', 500))
+        self.assertTrue(key_matches(key, book(1, isbn='978-5-17-090630-7')))
+        self.assertFalse(key_matches(key, book(1, isbn='978-0-8044-2957-3')))
+        key = view_key(('search', 'title', 'ВОЙНА', 'title'))
+        self.assertTrue(key_matches(key, book(1, title='Война и мир')))
+
+
+class QueryCacheTest(unittest.TestCase):
+
+    genre = ('filter', {'genre': 'Роман'}, 'title')
+    author = ('filter', {'author': 'Пушкин'}, 'title')
+
+    def test_get_put(self):
+        cache = QueryCache()
+        self.assertIsNone(cache.get(self.genre))
+        rows = [book(1), book(2)]
+        cache.put(self.genre, rows, cache.version)
+        self.assertEqual(cache.get(('filter', {'genre': 'роман'}, 'title')), rows)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_stale_result_is_not_stored(self):
+        cache = QueryCache()
+        version = cache.version
+        cache.book_removed(7)
+        cache.put(self.genre, [book(1)], version)
+        self.assertIsNone(cache.get(self.genre))
+
+    def test_lru_by_entries(self):
+        cache = QueryCache(max_entries=2)
+        views = [('filter', {'year': year}, 'title') for year in (2000, 2001, 2002)]
+        cache.put(views[0], [book(1)], cache.version)
+        cache.put(views[1], [book(2)], cache.version)
+        cache.get(views[0])
+        cache.put(views[2], [book(3)], cache.version)
+        self.assertIsNotNone(cache.get(views[0]))
+        self.assertIsNone(cache.get(views[1]))
+        self.assertIsNotNone(cache.get(views[2]))
+
+    def test_lru_by_size(self):
+        cache = QueryCache(max_bytes=1)
+        cache.put(self.genre, [book(1)], cache.version)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidation_only_affected(self):
+        cache = QueryCache()
+        cache.put(self.genre, [book(1)], cache.version)
+        cache.put(self.author, [book(2, author='Пушкин')], cache.version)
+        cache.book_added(book(3, genre='Поэзия', author='Пушкин'))
+        self.assertIsNotNone(cache.get(self.genre))
+        self.assertIsNone(cache.get(self.author))
+
+    def test_update_removes_old_and_new_views(self):
+        cache = QueryCache()
+        cache.put(self.genre, [book(1)], cache.version)
+        cache.put(self.author, [book(2, author='Пушкин')], cache.version)
+        cache.book_updated(1, book(1, genre='Поэзия', author='Пушкин'))
+        self.assertEqual(len(cache), 0)
+
+    def test_books_changed(self):
+        cache = QueryCache()
+        cache.put(self.genre, [book(1)], cache.version)
+        cache.put(self.author, [book(2, author='Пушкин')], cache.version)
+        cache.books_changed([], deleted_ids=[2])
+        self.assertIsNotNone(cache.get(self.genre))
+        self.assertIsNone(cache.get(self.author))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Обратный индекс слов для полнотекстового поиска без FULLTEXT-индекса MySQL
+
+Запасной вариант для серверов, где схему менять нельзя или парсер ngram
+недоступен. Слова названия, автора и издательства приводятся к нижнему
+регистру; слово запроса совпадает с каждым словом индекса, которое с него
+начинается (так «войн» находит «война» и «войны»). Книги ранжируются по
+сумме idf совпавших слов с весом поля: название важнее автора, автор -
+издательства.
+"""
+import math
+import re
+from bisect import bisect_left
+
+
+TEXT_COLUMNS = {'title': 2.0, 'author': 1.5, 'publisher': 1.0}
+
+# Совпадение по началу слова весит меньше точного
+PREFIX_WEIGHT = 0.5
+
+_word_re = re.compile(r"\w+")
+
+
+def words(text):
+    """Слова текста в нижнем регистре"""
+    return _word_re.findall(str(text).casefold()) if text else []
+
+
+class TextIndex:
+    """Слово -> {id книги: вес поля}; поддерживается изменениями приложения"""
+
+    def __init__(self, rows=()):
+        self.rows = {}
+        self.postings = {}
+        self.terms = []
+        self.terms_dirty = False
+        for row in rows:
+            self.add(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row):
+        """Добавление книги в индекс"""
+        book_id = row.get('id')
+        self.rows[book_id] = row
+        for term, weight in self._terms_of(row).items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self.terms_dirty = True
+            postings[book_id] = weight
+
+    def remove(self, book_id):
+        """Удаление книги из индекса"""
+        row = self.rows.pop(book_id, None)
+        if row is None:
+            return
+        for term in self._terms_of(row):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(book_id, None)
+                if not postings:
+                    del self.postings[term]
+                    self.terms_dirty = True
+
+    def update(self, book_id, row):
+        """Замена книги в индексе"""
+        self.remove(book_id)
+        self.add(row)
+
+    def search(self, text, limit=500):
+        """Книги, подходящие под слова запроса, по убыванию релевантности"""
+        if self.terms_dirty:
+            self.terms = sorted(self.postings)
+            self.terms_dirty = False
+
+        total = max(1, len(self.rows))
+        scores = {}
+        for query_word in set(words(text)):
+            start = bisect_left(self.terms, query_word)
+            for term in self.terms[start:]:
+                if not term.startswith(query_word):
+                    break
+                postings = self.postings[term]
+                idf = math.log(1 + total / len(postings))
+                if term != query_word:
+                    idf *= PREFIX_WEIGHT
+                for book_id, weight in postings.items():
+                    scores[book_id] = scores.get(book_id, 0.0) + idf * weight
+
+        ranked = sorted(scores, key=lambda book_id: (-scores[book_id],
+                                                     str(self.rows[book_id].get('title', ''))))
+        return [self.rows[book_id] for book_id in ranked[:limit]]
+
+    def _terms_of(self, row):
+        """Слова книги с наибольшим весом поля, в котором они встречаются"""
+        terms = {}
+        for column, weight in TEXT_COLUMNS.items():
+            for term in words(row.get(column)):
+                if weight > terms.get(term, 0):
+                    terms[term] = weight
+        return terms
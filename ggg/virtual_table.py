@@ -0,0 +1,204 @@
+"""Виртуальная таблица: в ttk.Treeview живут только видимые строки"""
+import tkinter as tk
+
+
+class VirtualTable:
+    """Виртуальная прокрутка поверх ttk.Treeview
+
+    В дереве создаётся ровно столько элементов, сколько строк помещается
+    в окне, плюс небольшой запас (overscan). При прокрутке элементы не
+    пересоздаются, а получают значения других строк источника, поэтому
+    время прокрутки и обновления не зависит от числа книг.
+
+    Источник строк - любой объект с len() и доступом по индексу; вместо
+    ещё не загруженной строки он может вернуть None, тогда вызывается
+    on_need_rows(start, stop) с диапазоном видимых строк.
+    """
+
+    def __init__(self, tree, scrollbar, row_values, placeholder=None,
+                 on_need_rows=None, overscan=5):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.placeholder = placeholder or ()
+        self.on_need_rows = on_need_rows
+        self.overscan = overscan
+
+        self.rows = []
+        self.top = 0
+        self.items = []
+        self.visible_rows = 20
+        self.selected_index = None
+
+        self.scrollbar.configure(command=self.on_scrollbar)
+        self.tree.configure(yscrollcommand=self.on_tree_yscroll)
+        self.tree.bind("<Configure>", self.on_resize, add="+")
+        self.tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+        for key in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            self.tree.bind(key, self.on_key)
+
+    def set_rows(self, rows, keep_position=False):
+        """Новый источник строк; по умолчанию таблица прокручивается в начало"""
+        self.rows = rows
+        if not keep_position:
+            self.top = 0
+            self.selected_index = None
+            self.tree.selection_remove(self.tree.selection())
+        self.refresh()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def visible_range(self):
+        """Диапазон индексов строк, привязанных к элементам дерева"""
+        return self.top, min(len(self.rows), self.top + len(self.items))
+
+    def refresh(self):
+        """Перепривязка видимых строк к элементам дерева"""
+        total = len(self.rows)
+        self.top = max(0, min(self.top, total - self.visible_rows))
+
+        # Пул элементов: видимые строки + запас, но не дальше конца источника
+        needed = max(0, min(total - self.top, self.visible_rows + self.overscan))
+        while len(self.items) < needed:
+            self.items.append(self.tree.insert("", tk.END))
+        if len(self.items) > needed:
+            self.tree.delete(*self.items[needed:])
+            del self.items[needed:]
+
+        missing = False
+        for offset, item in enumerate(self.items):
+            index = self.top + offset
+            row = self.rows[index]
+            if row is None:
+                missing = True
+                self.tree.item(item, values=self.placeholder)
+            else:
+                self.tree.item(item, values=self.row_values(index, row))
+
+        self.sync_selection()
+        self.tree.yview_moveto(0)
+        self.update_scrollbar()
+
+        if missing and self.on_need_rows:
+            self.on_need_rows(*self.visible_range())
+
+    def update_scrollbar(self):
+        """Положение скроллбара относительно полного числа строк"""
+        total = len(self.rows)
+        if total <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / total, (self.top + self.visible_rows) / total)
+
+    def sync_selection(self):
+        """Выделение следует за строкой, а не за элементом дерева"""
+        start, stop = self.visible_range()
+        if self.selected_index is not None and start <= self.selected_index < stop:
+            item = self.items[self.selected_index - start]
+            if self.tree.selection() != (item,):
+                self.tree.selection_set(item)
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+
+    def scroll_to(self, index):
+        """Прокрутка так, чтобы строка index была первой видимой"""
+        self.top = int(index)
+        self.refresh()
+
+    def scroll(self, delta):
+        """Прокрутка на delta строк"""
+        self.scroll_to(self.top + delta)
+
+    def see(self, index):
+        """Прокрутка к строке, только если она сейчас не видна"""
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible_rows:
+            self.scroll_to(index - self.visible_rows + 1)
+
+    def select(self, index):
+        """Выделение строки по индексу"""
+        if 0 <= index < len(self.rows):
+            self.selected_index = index
+            self.see(index)
+            self.sync_selection()
+
+    def clear_selection(self):
+        self.selected_index = None
+        self.sync_selection()
+
+    def index_of(self, item):
+        """Индекс строки источника для элемента дерева"""
+        try:
+            return self.top + self.items.index(item)
+        except ValueError:
+            return None
+
+    def row_of(self, item):
+        """Строка источника для элемента дерева (None, если не загружена)"""
+        index = self.index_of(item)
+        if index is None or index >= len(self.rows):
+            return None
+        return self.rows[index]
+
+    def selected_row(self):
+        if self.selected_index is None or self.selected_index >= len(self.rows):
+            return None
+        return self.rows[self.selected_index]
+
+    def on_scrollbar(self, *args):
+        """Команда вертикального скроллбара: moveto / scroll units|pages"""
+        total = len(self.rows)
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.visible_rows if args[2] == "pages" else 1
+            self.scroll(int(args[1]) * step)
+
+    def on_tree_yscroll(self, first, last):
+        """Собственная прокрутка дерева (например, при выборе частично видимой
+        строки) переводится в сдвиг окна строк"""
+        first = float(first)
+        if first > 0 and self.items:
+            shift = int(round(first * len(self.items)))
+            self.tree.yview_moveto(0)
+            if shift:
+                self.scroll(shift)
+
+    def on_resize(self, event=None):
+        """Пересчёт числа видимых строк при изменении размера таблицы"""
+        heading_height, row_height = 25, 25
+        if self.items:
+            bbox = self.tree.bbox(self.items[0])
+            if bbox:
+                heading_height, row_height = bbox[1], bbox[3]
+        visible_rows = max(1, (self.tree.winfo_height() - heading_height) // max(1, row_height))
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.refresh()
+
+    def on_select(self, event=None):
+        """Запоминание индекса выбранной строки"""
+        selection = self.tree.selection()
+        if selection:
+            index = self.index_of(selection[0])
+            if index is not None:
+                self.selected_index = index
+
+    def on_key(self, event):
+        """Навигация с клавиатуры по всем строкам, а не только по видимым"""
+        total = len(self.rows)
+        if not total:
+            return "break"
+        current = self.selected_index if self.selected_index is not None else self.top - 1
+        moves = {
+            "Up": current - 1,
+            "Down": current + 1,
+            "Prior": current - self.visible_rows,
+            "Next": current + self.visible_rows,
+            "Home": 0,
+            "End": total - 1
+        }
+        self.select(max(0, min(total - 1, moves[event.keysym])))
+        return "break"